@@ -0,0 +1,101 @@
+# benchmarks/incremental.py
+# make_features --incremental on a log that grows in pieces, with late events (older
+# than a window already emitted) in some pieces: after each run the CSV must hold the
+# closed windows of a full run on the bytes so far, the checkpoint must not be final,
+# and later pieces must still be picked up. After --finalize, CSV and feature store
+# must equal a full run (stream_features) exactly. Exits 1 on a mismatch.
+#
+#   python -m benchmarks.incremental
+#   python -m benchmarks.incremental --hours 1 --pieces 12 --seed 3
+
+import os, sys, shutil, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+from benchmarks.synth import generate_session
+from src.features.computecore import FEATURE_COLUMNS
+from src.features.featurestore import FeatureStore
+from src.features.make_features import (incremental_features, stream_features, session_name,
+                                        load_checkpoint, checkpoint_path, WINDOW_MS)
+from src.features.postprocess import fill_and_clip
+
+def _late_line(lines, rng) -> bytes:
+    """A key_down dated one or two windows before the newest event so far."""
+    t_last = max(int(l.split(b'"t": ', 1)[1].split(b",", 1)[0].rstrip(b"}")) for l in lines[-50:])
+    t = t_last - int(rng.integers(1, 3)) * WINDOW_MS - int(rng.integers(0, WINDOW_MS))
+    return f'{{"t": {t}, "type": "key_down"}}\n'.encode()
+
+def _expected(raw: str) -> pd.DataFrame:
+    feats = stream_features(raw)
+    return fill_and_clip(feats) if not feats.empty else feats
+
+def run_case(work: str, hours: float, pieces: int, seed: int) -> int:
+    """Returns how many late events were injected; raises AssertionError on a mismatch."""
+    rng = np.random.default_rng(seed)
+    src = os.path.join(work, "full.ndjson")
+    generate_session(src, hours, seed)
+    with open(src, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    raw = os.path.join(work, "raw", "events_incr.ndjson")
+    os.makedirs(os.path.dirname(raw), exist_ok=True)
+    open(raw, "wb").close()
+    dirs = dict(features_dir=os.path.join(work, "features"), ckpt_dir=os.path.join(work, "ckpt"),
+                store_dir=os.path.join(work, "store"))
+
+    late = 0
+    bounds = np.linspace(0, len(lines), pieces + 1).astype(int)
+    for k in range(pieces):
+        with open(raw, "ab") as f:
+            piece = lines[bounds[k]:bounds[k + 1]]
+            if k % 3 == 1:   # late event, then the rest of the piece (more data)
+                f.write(_late_line(lines[:bounds[k]], rng))
+                late += 1
+            f.writelines(piece)
+        out_csv = incremental_features(raw, **dirs)
+        ckpt = load_checkpoint(checkpoint_path(raw, dirs["ckpt_dir"]))
+        assert not ckpt["final"], f"piece {k}: checkpoint finalized without --finalize"
+        got = pd.read_csv(out_csv) if os.path.exists(out_csv) else pd.DataFrame(columns=FEATURE_COLUMNS)
+        full = _expected(raw)
+        # Every row so far is a closed window of the full run; only the newest may be open
+        assert len(full) - 2 <= len(got) <= len(full), f"piece {k}: {len(got)} rows, full run has {len(full)}"
+        if len(got):
+            ref = full.iloc[:len(got)].reset_index(drop=True)
+            pd.testing.assert_frame_equal(got, pd.read_csv(_csv(ref, work)), check_dtype=False)
+
+    out_csv = incremental_features(raw, finalize=True, **dirs)
+    ref = pd.read_csv(_csv(_expected(raw), work))
+    pd.testing.assert_frame_equal(pd.read_csv(out_csv), ref, check_dtype=False)
+    stored = FeatureStore(dirs["store_dir"]).read(columns=["session"] + FEATURE_COLUMNS)
+    stored = stored[stored["session"] == session_name(raw)].drop(columns="session").reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_csv(_csv(stored, work)), ref, check_dtype=False)
+    return late
+
+def _csv(df: pd.DataFrame, work: str) -> str:
+    path = os.path.join(work, "ref.csv")
+    df.to_csv(path, index=False)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Check incremental features against a full run, with late events.")
+    parser.add_argument("--hours", type=float, default=0.5)
+    parser.add_argument("--pieces", type=int, default=8)
+    parser.add_argument("--cases", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failed = 0
+    for i in range(args.cases):
+        work = tempfile.mkdtemp(prefix="incremental_")
+        try:
+            late = run_case(work, args.hours, args.pieces, args.seed + i)
+            print(f"[bench] case {i}: {args.pieces} pieces, {late} late events → incremental == full run")
+        except AssertionError as e:
+            failed += 1
+            print(f"[bench] case {i}: FAIL {e}")
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmarks/ingest_load.py
+# Load test for the ingest server (src/inference/ingest.py): starts it in a subprocess
+# on a free port, then simulates --users concurrent EventLoggers, each streaming
+# --minutes of synthetic activity (typing, mouse strokes at 125-1000 Hz, clicks,
+# scrolls) as one batch per --flush-sec, acked batch by batch like IngestClient.
+# --speed paces every user at that many simulated seconds per wall second (1 = real
+# time); 0 sends as fast as the acks come back, i.e. measures the server's ceiling.
+# Reports ack latency, events/s, the server's backpressure (enqueue waits) and
+# window lag, and checks every user's timeline.csv has one row per window it sent.
+# Results go to benchmarks/results/ingest_<stamp>.json.
+#
+#   python -m benchmarks.ingest_load --users 200 --minutes 10
+#   python -m benchmarks.ingest_load --users 500 --minutes 5 --speed 20 --shards 4
+
+import os, sys, csv, json, time, shutil, signal, asyncio, argparse, tempfile, subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from benchmarks.synth import T0, MOUSE_HZ, SCREEN
+from src.utils.io import EVENT_DTYPE, TYPE_CODES, FLAG_BACKSPACE
+from src.inference.ingest import TICK, pack_frame, pack_json, read_frame
+
+RESULTS_DIR = "benchmarks/results"
+USERS = 200
+MINUTES = 10
+FLUSH_SEC = 5
+WINDOW_MS = 60_000
+DRAIN_TIMEOUT_SEC = 60
+
+def synth_batch(rng: np.random.Generator, t: int, span_ms: int, hz: int) -> np.ndarray:
+    """One flush worth of EVENT_DTYPE records in [t, t + span_ms), sorted by time."""
+    span_s = span_ms / 1000.0
+    n_move = int(span_s * hz * rng.uniform(0.1, 0.5)) if rng.random() < 0.7 else 0
+    n_key = int(rng.poisson(span_s * 4))
+    n_click, n_scroll = int(rng.poisson(span_s * 0.3)), int(rng.poisson(span_s * 0.5))
+    n = n_move + n_key + n_click + n_scroll
+    rec = np.zeros(n, dtype=EVENT_DTYPE)
+    rec["t"] = t + np.sort(rng.integers(0, span_ms, n))
+    kinds = np.repeat([TYPE_CODES["mouse_move"], TYPE_CODES["key_down"], TYPE_CODES["mouse_click"],
+                       TYPE_CODES["mouse_scroll"]], [n_move, n_key, n_click, n_scroll])
+    rec["type"] = rng.permutation(kinds)
+    mouse = rec["type"] != TYPE_CODES["key_down"]
+    rec["x"] = np.where(mouse, np.clip(SCREEN[0] / 2 + np.cumsum(rng.normal(0, 4, n)), 0, SCREEN[0]), np.nan)
+    rec["y"] = np.where(mouse, np.clip(SCREEN[1] / 2 + np.cumsum(rng.normal(0, 3, n)), 0, SCREEN[1]), np.nan)
+    rec["flags"] = np.where((rec["type"] == TYPE_CODES["key_down"]) & (rng.random(n) < 0.06), FLAG_BACKSPACE, 0)
+    return rec
+
+async def _expect(reader: asyncio.StreamReader, kind: bytes) -> bytes:
+    got, payload = await read_frame(reader)
+    if got != kind:
+        raise RuntimeError(f"expected {kind!r}, got {got!r}: {payload[:200]!r}")
+    return payload
+
+async def simulate_user(i: int, port: int, args, seed: int, start_delay: float) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    hz = int(rng.choice(MOUSE_HZ))
+    user = f"user{i:04d}"
+    await asyncio.sleep(start_delay)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(pack_json(b"H", {"user": user}))
+    await _expect(reader, b"J")
+    span = int(args.flush_sec * 1000)
+    t = T0 + int(rng.integers(0, WINDOW_MS))     # users out of phase with the window grid
+    windows, events, acks = set(), 0, []
+    wall0 = time.perf_counter()
+    for k in range(int(args.minutes * 60 / args.flush_sec)):
+        if args.speed > 0:   # pace: batch k is due at k * flush_sec / speed
+            delay = wall0 + k * args.flush_sec / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        rec = synth_batch(rng, t, span, hz)
+        t += span
+        if len(rec):
+            windows.update((rec["t"] // WINDOW_MS).tolist())
+            events += len(rec)
+            t0 = time.perf_counter()
+            writer.write(pack_frame(b"B", rec.tobytes()))
+            await _expect(reader, b"A")
+            acks.append(time.perf_counter() - t0)
+        writer.write(pack_frame(b"T", TICK.pack(t)))   # the logger's clock at this flush
+    writer.write(pack_frame(b"E"))
+    await _expect(reader, b"J")
+    writer.close()
+    await writer.wait_closed()
+    return {"user": user, "events": events, "windows": len(windows), "acks": acks}
+
+async def _stats(port: int) -> Dict[str, Any]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(pack_frame(b"S"))
+    out = json.loads(await _expect(reader, b"J"))
+    writer.close()
+    return out
+
+async def run_load(port: int, args) -> Tuple[List[Dict[str, Any]], Dict[str, Any], float]:
+    t0 = time.perf_counter()
+    users = await asyncio.gather(*(simulate_user(i, port, args, args.seed + i, args.ramp_sec * i / args.users)
+                                   for i in range(args.users)))
+    wall = time.perf_counter() - t0
+    expected = sum(u["windows"] for u in users)
+    deadline = time.monotonic() + DRAIN_TIMEOUT_SEC
+    while True:   # windows closed by the E frames are still being scored
+        stats = await _stats(port)
+        if stats["rows"] >= expected or time.monotonic() > deadline:
+            return users, stats, wall
+        await asyncio.sleep(0.2)
+
+def _start_server(args, out_dir: str) -> Tuple[subprocess.Popen, int]:
+    cmd = [sys.executable, "-m", "src.inference.ingest", "--port", "0", "--out", out_dir,
+           "--models-dir", args.models_dir, "--queue", str(args.queue)]
+    if args.shards:
+        cmd += ["--shards", str(args.shards)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        print(line, end="")
+        if "Listening on" in line:
+            return proc, int(line.split()[3].rsplit(":", 1)[1])
+    raise RuntimeError("ingest server exited before listening")
+
+def _timeline_rows(out_dir: str, user: str) -> int:
+    path = os.path.join(out_dir, user, "timeline.csv")
+    if not os.path.exists(path):
+        return 0
+    with open(path, newline="") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+def _pct(a: List[float]) -> Optional[Dict[str, float]]:
+    if not a:
+        return None
+    x = np.array(a) * 1e3
+    return {"p50": float(np.percentile(x, 50)), "p99": float(np.percentile(x, 99)), "max": float(x.max())}
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the multi-user ingest server.")
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--minutes", type=float, default=MINUTES, help="Simulated activity per user")
+    parser.add_argument("--flush-sec", type=float, default=FLUSH_SEC, help="Simulated time per batch")
+    parser.add_argument("--speed", type=float, default=0, help="Simulated seconds per wall second (0 = unpaced)")
+    parser.add_argument("--ramp-sec", type=float, default=2.0, help="Spread connection starts over this long")
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=256)
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="ingest_load_")
+    out_dir = os.path.join(work, "users")
+    proc, port = _start_server(args, out_dir)
+    try:
+        users, stats, wall = asyncio.run(run_load(port, args))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        rest, _ = proc.communicate(timeout=120)
+        print(rest, end="")
+
+    missing = {u["user"]: u["windows"] - n for u in users
+               if (n := _timeline_rows(out_dir, u["user"])) != u["windows"]}
+    events = sum(u["events"] for u in users)
+    result = {"users": args.users, "minutes_per_user": args.minutes, "flush_sec": args.flush_sec,
+              "speed": args.speed, "wall_s": wall, "events": events, "events_per_s": events / wall,
+              "batches": sum(len(u["acks"]) for u in users),
+              "ack_ms": _pct([a for u in users for a in u["acks"]]),
+              "windows_expected": sum(u["windows"] for u in users), "users_incomplete": len(missing),
+              "server": stats}
+    shutil.rmtree(work, ignore_errors=True)
+
+    print(f"[ingest_load] {args.users} users x {args.minutes:g} min: {events:,} events in {wall:.1f} s "
+          f"({result['events_per_s']:,.0f} events/s, {result['batches'] / wall:,.0f} batches/s)")
+    if result["ack_ms"]:
+        print(f"[ingest_load] ack p50 {result['ack_ms']['p50']:.2f} ms, p99 {result['ack_ms']['p99']:.2f} ms, "
+              f"max {result['ack_ms']['max']:.1f} ms; {stats['stalled']} enqueues stalled on a full shard")
+    if stats["row_lag_ms"]:
+        print(f"[ingest_load] window lag (queued → scored) p50 {stats['row_lag_ms']['p50']:.1f} ms, "
+              f"p99 {stats['row_lag_ms']['p99']:.1f} ms")
+    print(f"[ingest_load] timelines: {stats['rows']:,} / {result['windows_expected']:,} windows, "
+          f"{len(missing)} users incomplete")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, "ingest_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[ingest_load] Results → {out}")
+    if missing:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
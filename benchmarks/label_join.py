@@ -0,0 +1,76 @@
+# benchmarks/label_join.py
+# Label → window interval join: check the sweep against the original per-window scan
+# on small inputs, then time it at scale.
+#
+#   python -m benchmarks.label_join                       # 10M windows x 100k labels
+#   python -m benchmarks.label_join --windows 1000000 --labels 10000
+
+import time, argparse
+import numpy as np
+import pandas as pd
+
+from src.features.datasetbuilder import _map_labels_to_windows
+
+WINDOW_MS = 60_000
+T0 = 1_700_000_000_000
+
+def make_inputs(n_windows: int, n_labels: int, seed: int = 0):
+    """Back-to-back 60 s windows and labels of 1-60 min spread over the same span."""
+    rng = np.random.default_rng(seed)
+    t_start = T0 + np.arange(n_windows, dtype=np.int64) * WINDOW_MS
+    feats = pd.DataFrame({"window_id": np.arange(n_windows), "t_start": t_start,
+                          "t_end": t_start + rng.integers(0, WINDOW_MS, n_windows)})
+    span = n_windows * WINDOW_MS
+    to = T0 + rng.integers(0, span, n_labels)
+    # Coarse timestamps so applies_to ties (and their tie-break) actually occur
+    to -= to % (rng.choice([1, 1000, 60_000]) if n_labels < 1000 else 1000)
+    labels = pd.DataFrame({"applies_from": to - rng.integers(1, 60, n_labels) * WINDOW_MS,
+                           "applies_to": to,
+                           "fatigue_score": rng.integers(1, 6, n_labels).astype(float)})
+    return feats, labels
+
+def reference_join(feats: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
+    """The original O(windows x labels) scan (stable sort, so ties resolve like the sweep)."""
+    rows = []
+    labels_sorted = labels.sort_values("applies_to", kind="mergesort")
+    for _, w in feats[["window_id","t_start","t_end"]].iterrows():
+        wid, ws, we = int(w["window_id"]), int(w["t_start"]), int(w["t_end"])
+        mask = (labels_sorted["applies_to"] >= ws) & (labels_sorted["applies_from"] <= we)
+        overlaps = labels_sorted.loc[mask]
+        if overlaps.empty:
+            continue
+        rows.append({"window_id": wid, "t_start": ws, "fatigue_score": float(overlaps.iloc[-1]["fatigue_score"])})
+    return pd.DataFrame(rows, columns=["window_id", "t_start", "fatigue_score"])
+
+def check(n_cases: int = 20):
+    for seed in range(n_cases):
+        rng = np.random.default_rng(seed)
+        feats, labels = make_inputs(int(rng.integers(1, 400)), int(rng.integers(1, 200)), seed)
+        try:
+            got = _map_labels_to_windows(feats, labels)
+        except ValueError:
+            got = pd.DataFrame(columns=["window_id", "t_start", "fatigue_score"])
+        ref = reference_join(feats, labels)
+        pd.testing.assert_frame_equal(got.reset_index(drop=True), ref.astype(got.dtypes.to_dict()),
+                                      check_dtype=False)
+    print(f"[bench] sweep == per-window scan on {n_cases} random cases")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the label → window join.")
+    parser.add_argument("--windows", type=int, default=10_000_000)
+    parser.add_argument("--labels", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    check()
+    feats, labels = make_inputs(args.windows, args.labels)
+    times = []
+    for _ in range(args.repeat):
+        t = time.perf_counter()
+        out = _map_labels_to_windows(feats, labels)
+        times.append(time.perf_counter() - t)
+    print(f"[bench] {args.windows:,} windows x {args.labels:,} labels → {len(out):,} labeled, "
+          f"best {min(times):.2f}s of {args.repeat}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# benchmarks/pipeline.py
+# End-to-end pipeline benchmark on synthetic sessions (benchmarks/synth.py) of several
+# lengths. Each stage is timed (best of --repeat) and, in a separate pass, its peak
+# traced allocation measured with tracemalloc (kept out of the timed runs: it slows
+# allocation-heavy code several-fold). Results go to benchmarks/results/<stamp>.json and
+# are compared stage by stage with benchmarks/baseline.json when there is one.
+# Startup: every `python -m src <command>` module is imported in a fresh interpreter and
+# checked against STARTUP_BUDGET_MS and the heavy modules it must not pull in
+# (STARTUP_FORBIDDEN): the lazy CLI only stays fast as long as nobody adds a top-level
+# pandas / sklearn import to the wrong module.
+# Parity: the window_features, sliding_features and window_states checks run first;
+# any mismatch exits 1, with or without --fail-on-regression.
+#
+#   python -m benchmarks.pipeline                            # 0.25 / 1 / 4 h of activity
+#   python -m benchmarks.pipeline --hours 1 8 --repeat 5
+#   python -m benchmarks.pipeline --save-baseline            # this run becomes the baseline
+#   python -m benchmarks.pipeline --fail-on-regression       # exit 1 if a stage is > --tolerance slower
+#   python -m benchmarks.pipeline --startup-only             # just the import-time checks
+#   python -m benchmarks.pipeline --no-parity                # skip the parity checks
+
+import os, gc, sys, json, time, shutil, argparse, tempfile, tracemalloc, platform, subprocess, warnings
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from benchmarks import sliding_features, window_features, window_states
+from benchmarks.synth import generate
+from src.features.windowing import read_ndjson, add_window_index
+from src.features.computecore import compute_window_features
+from src.features.postprocess import fill_and_clip
+from src.features.make_features import stream_features
+from src.features.datasetbuilder import _map_labels_to_windows
+from src.model.cv import BASELINE, make_model
+from src.model.export import flatten_forest
+from src.model.train import EXCLUDE
+from src.__main__ import COMMANDS
+
+RESULTS_DIR   = "benchmarks/results"
+BASELINE_JSON = "benchmarks/baseline.json"
+HOURS         = [0.25, 1.0, 4.0]
+TOLERANCE     = 1.25     # a stage regresses when slower than baseline x this
+PREDICT_ROWS  = 200      # single-row predictions per predict_row run
+STARTUP_REPEAT = 3
+# Import time of each command's module (best of STARTUP_REPEAT, fresh interpreter)
+STARTUP_BUDGET_MS = {"cli": 50, "capture": 400, "label": 300, "app": 100, "features": 1200, "dataset": 1200,
+                     "train": 3000, "predict": 1200, "serve": 1500, "ingest": 400}
+# Modules a command must not have loaded once imported
+STARTUP_FORBIDDEN = {
+    "cli":      ["numpy", "pandas", "sklearn", "joblib"],
+    "capture":  ["pandas", "sklearn", "joblib"],
+    "label":    ["numpy", "pandas", "sklearn", "joblib"],
+    "app":      ["pynput", "tkinter", "numpy", "pandas", "sklearn", "joblib"],
+    "features": ["sklearn", "joblib"],
+    "dataset":  ["sklearn", "joblib"],
+    "predict":  ["sklearn", "joblib"],
+    "ingest":   ["pandas", "sklearn", "joblib"],
+}
+
+# ----------------- Stages -----------------
+# A stage takes the context built so far (paths + earlier stages' outputs) and returns
+# (its output, rows processed). Run in order; later stages read earlier outputs by name.
+Stage = Callable[[Dict[str, Any]], Tuple[Any, int]]
+
+def _read(ctx):
+    df = read_ndjson(ctx["raw"])
+    return df, len(df)
+
+def _window(ctx):
+    df = add_window_index(ctx["read_ndjson"].copy())   # add_window_index works in place
+    return df, len(df)
+
+def _compute(ctx):
+    feats = compute_window_features(ctx["window"])
+    return feats, len(ctx["window"])
+
+def _postprocess(ctx):
+    feats = fill_and_clip(ctx["compute"].copy())
+    return feats, len(feats)
+
+def _stream(ctx):
+    feats = stream_features(ctx["raw"])
+    return feats, len(feats)
+
+def _join(ctx):
+    feats, labels = ctx["postprocess"], pd.read_csv(ctx["labels"])
+    df = feats.merge(_map_labels_to_windows(feats, labels), on=["window_id", "t_start"], how="inner")
+    return df, len(df)
+
+def _fit(ctx):
+    df = ctx["label_join"]
+    cols = [c for c in df.columns if c not in EXCLUDE]
+    model = make_model(BASELINE, n_jobs=-1).fit(df[cols], df["fatigue_score"])
+    return (model, df[cols]), len(df)
+
+def _predict_batch(ctx):
+    model, X = ctx["train_fit"]
+    model.predict(X)
+    return None, len(X)
+
+def _predict_row(ctx):
+    # What predict / the server do per window: the flattened forest on one row
+    model, X = ctx["train_fit"]
+    flat = ctx.setdefault("flat", flatten_forest(model))
+    rows = X.to_numpy(dtype=np.float32)[np.arange(PREDICT_ROWS) % len(X)]
+    for i in range(PREDICT_ROWS):
+        flat.predict(rows[i:i + 1])
+    return None, PREDICT_ROWS
+
+STAGES: Dict[str, Stage] = {
+    "read_ndjson":     _read,
+    "window":          _window,
+    "compute":         _compute,
+    "postprocess":     _postprocess,
+    "stream_features": _stream,
+    "label_join":      _join,
+    "train_fit":       _fit,
+    "predict_batch":   _predict_batch,
+    "predict_row":     _predict_row,
+}
+
+# ----------------- Startup -----------------
+_IMPORT_PROBE = """
+import sys, time, json, importlib
+t = time.perf_counter()
+importlib.import_module(sys.argv[1])
+ms = (time.perf_counter() - t) * 1e3
+print(json.dumps({"ms": ms, "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+def startup_check(repeat: int = STARTUP_REPEAT) -> Dict[str, Any]:
+    """Per command: import ms, forbidden modules it loaded, whether it is within budget."""
+    modules = {"cli": "src.__main__", **{cmd: mod for cmd, (mod, _) in COMMANDS.items()}}
+    out: Dict[str, Any] = {}
+    for cmd, mod in modules.items():
+        forbidden = STARTUP_FORBIDDEN.get(cmd, [])
+        runs = []
+        for _ in range(repeat):
+            p = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, mod, *forbidden],
+                               capture_output=True, text=True)
+            if p.returncode != 0:   # e.g. pynput / tkinter not installed here
+                err = (p.stderr.strip().splitlines() or ["?"])[-1]
+                out[cmd] = {"module": mod, "skipped": err}
+                break
+            runs.append(json.loads(p.stdout.strip().splitlines()[-1]))
+        if cmd in out:
+            print(f"[bench] startup {cmd:9s} skipped ({out[cmd]['skipped']})")
+            continue
+        ms = min(r["ms"] for r in runs)
+        loaded = runs[0]["loaded"]
+        budget = STARTUP_BUDGET_MS.get(cmd)
+        ok = not loaded and (budget is None or ms <= budget)
+        out[cmd] = {"module": mod, "import_ms": ms, "budget_ms": budget, "forbidden_loaded": loaded, "ok": ok}
+        print(f"[bench] startup {cmd:9s} {ms:8.1f} ms (budget {budget} ms)"
+              + (f"  loads {', '.join(loaded)}" if loaded else "") + ("" if ok else "  FAIL"))
+    return out
+
+# ----------------- Parity -----------------
+PARITY_CHECKS: Dict[str, Callable[[], None]] = {
+    "window_features": window_features.check,
+    "sliding_features": sliding_features.check,
+    "window_states": window_states.check,
+}
+
+def parity_check() -> Dict[str, Any]:
+    """Per check: "ok" or the AssertionError it raised."""
+    out: Dict[str, Any] = {}
+    for name, fn in PARITY_CHECKS.items():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            warnings.simplefilter("ignore", FutureWarning)
+            try:
+                fn()
+                out[name] = "ok"
+            except AssertionError as e:
+                out[name] = f"FAIL {e}"
+                print(f"[bench] parity {name}: {out[name]}")
+    return out
+
+# ----------------- Runner -----------------
+def run_scale(hours: float, work_dir: str, repeat: int, memory: bool = True) -> Dict[str, Any]:
+    d = os.path.join(work_dir, f"{hours:g}h")
+    raw, labels, n_events = generate(d, hours)
+    ctx: Dict[str, Any] = {"raw": raw, "labels": labels}
+    out = {"hours": hours, "events": n_events, "raw_bytes": os.path.getsize(raw), "stages": {}}
+    for name, fn in STAGES.items():
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            t = time.perf_counter()
+            res, rows = fn(ctx)
+            times.append(time.perf_counter() - t)
+        ctx[name] = res
+        st = {"rows": rows, "best_s": min(times), "median_s": float(np.median(times)),
+              "rows_per_s": rows / min(times) if min(times) > 0 else None}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            fn(ctx)
+            st["peak_alloc_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        out["stages"][name] = st
+        print(f"[bench] {hours:g}h {name:16s} {rows:>10,} rows  best {st['best_s'] * 1e3:9.1f} ms"
+              + (f"  peak {st['peak_alloc_mb']:8.1f} MB" if memory else ""))
+    return out
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = TOLERANCE) -> List[Dict[str, Any]]:
+    """Per (scale, stage) present in both: time ratio to the baseline, flagged past tolerance."""
+    base = {(s["hours"], k): v for s in baseline["scales"] for k, v in s["stages"].items()}
+    rows = []
+    for s in current["scales"]:
+        for k, v in s["stages"].items():
+            b = base.get((s["hours"], k))
+            if b is None or not b["best_s"]:
+                continue
+            ratio = v["best_s"] / b["best_s"]
+            rows.append({"hours": s["hours"], "stage": k, "ratio": ratio, "regressed": ratio > tolerance,
+                         "mem_ratio": (v["peak_alloc_mb"] / b["peak_alloc_mb"]
+                                       if v.get("peak_alloc_mb") and b.get("peak_alloc_mb") else None)})
+    base_startup = baseline.get("startup") or {}
+    for cmd, v in (current.get("startup") or {}).items():
+        b = base_startup.get(cmd) or {}
+        if v.get("import_ms") and b.get("import_ms"):
+            ratio = v["import_ms"] / b["import_ms"]
+            rows.append({"hours": None, "stage": f"startup:{cmd}", "ratio": ratio, "regressed": ratio > tolerance,
+                         "mem_ratio": None})
+    return rows
+
+def _write_json(path: str, obj: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic sessions.")
+    parser.add_argument("--hours", type=float, nargs="+", default=HOURS, help="Session lengths to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=BASELINE_JSON)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-startup", action="store_true", help="Skip the import-time checks")
+    parser.add_argument("--startup-only", action="store_true", help="Only the import-time checks")
+    parser.add_argument("--no-parity", action="store_true", help="Skip the parity checks")
+    args = parser.parse_args()
+
+    parity = None if args.no_parity or args.startup_only else parity_check()
+    startup = None if args.no_startup else startup_check()
+    scales = []
+    if not args.startup_only:
+        work_dir = tempfile.mkdtemp(prefix="fatigue_bench_")
+        try:
+            scales = [run_scale(h, work_dir, args.repeat, not args.no_memory) for h in args.hours]
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    result = {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "machine": {"python": sys.version.split()[0], "platform": platform.platform(),
+                          "cpus": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__},
+              "repeat": args.repeat, "parity": parity, "startup": startup, "scales": scales}
+
+    regressed = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        result["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance,
+                                "stages": compare(result, baseline, args.tolerance)}
+        regressed = [r for r in result["comparison"]["stages"] if r["regressed"]]
+        for r in result["comparison"]["stages"]:
+            scale = "" if r["hours"] is None else f"{r['hours']:g}h "
+            print(f"[bench] vs baseline {scale}{r['stage']:16s} x{r['ratio']:.2f}"
+                  + ("  REGRESSED" if r["regressed"] else ""))
+
+    out = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    _write_json(out, result)
+    print(f"[bench] Results → {out}")
+    if args.save_baseline:
+        _write_json(args.baseline, result)
+        print(f"[bench] Baseline → {args.baseline}")
+    over = [cmd for cmd, v in (startup or {}).items() if v.get("ok") is False]
+    if over:
+        print(f"[bench] Startup over budget / loading heavy modules: {', '.join(over)}")
+    if regressed:
+        print(f"[bench] {len(regressed)} stage(s) slower than baseline x{args.tolerance}")
+    failed = [name for name, v in (parity or {}).items() if v != "ok"]
+    if failed:
+        print(f"[bench] Parity check(s) failed: {', '.join(failed)}")
+    if failed or ((regressed or over) and args.fail_on_regression):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
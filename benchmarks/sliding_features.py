@@ -0,0 +1,92 @@
+# benchmarks/sliding_features.py
+# compute_sliding_features against compute_window_features on each window's slice of
+# the events: counts, t_start/t_end and tod must be equal, every float feature within
+# SLIDING_RTOL (iki_std / mouse_speed_std relative to avg_iki / mouse_speed_mean), on
+# random frames with several hops, then time it at scale. Exits 1 on a mismatch.
+#
+#   python -m benchmarks.sliding_features
+#   python -m benchmarks.sliding_features --events 2000000 --hop 1000
+
+import sys, time, argparse
+import numpy as np
+import pandas as pd
+
+from benchmarks.window_features import make_frame
+from src.features.computecore import (FEATURE_COLUMNS, SLIDING_RTOL, compute_sliding_features,
+                                      compute_window_features)
+
+FLOAT_COLUMNS = ["avg_iki", "iki_std", "mouse_speed_mean", "mouse_speed_std",
+                 "mouse_jerk_mean", "idle_ratio"]
+SCALE = {"iki_std": "avg_iki", "mouse_speed_std": "mouse_speed_mean"}
+HOPS = [(60_000, 5_000), (60_000, 7_000), (60_000, 60_000), (30_000, 1_000)]
+
+def per_slice(df: pd.DataFrame, window_ms: int, hop_ms: int) -> pd.DataFrame:
+    """compute_window_features on every window's events, stacked as window_id = k."""
+    t = df["t"].to_numpy()
+    t0 = int(t.min())
+    ts = np.sort(t)
+    order = np.argsort(t, kind="stable")
+    k = np.arange((int(t.max()) - t0) // hop_ms + 1)
+    lo = np.searchsorted(ts, t0 + k * hop_ms, side="left")
+    hi = np.searchsorted(ts, t0 + k * hop_ms + window_ms, side="left")
+    rows = np.concatenate([order[a:b] for a, b in zip(lo, hi)])
+    return compute_window_features(df.iloc[rows].assign(window_id=np.repeat(k, hi - lo)))
+
+def compare(got: pd.DataFrame, ref: pd.DataFrame) -> float:
+    """Worst error in units of SLIDING_RTOL; raises AssertionError past 1."""
+    got, ref = got.reset_index(drop=True), ref.reset_index(drop=True)
+    assert len(got) == len(ref), f"{len(got)} windows, slices give {len(ref)}"
+    exact = [c for c in FEATURE_COLUMNS if c not in FLOAT_COLUMNS]
+    pd.testing.assert_frame_equal(got[exact], ref[exact].astype(got[exact].dtypes.to_dict()),
+                                  check_exact=True)
+    worst = 0.0
+    for c in FLOAT_COLUMNS:
+        a, b = ref[c].to_numpy(float), got[c].to_numpy(float)
+        assert (np.isnan(a) == np.isnan(b)).all(), f"{c}: NaN in different windows"
+        scale = np.abs(ref[SCALE.get(c, c)].to_numpy(float))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            err = np.abs(a - b) / (SLIDING_RTOL * np.maximum(np.abs(a), scale))
+        err = np.where(np.isnan(a) | (a == b), 0.0, err)
+        i = int(np.argmax(err)) if len(err) else 0
+        assert not len(err) or err[i] <= 1, f"{c}: window {i} {b[i]:.17g} vs {a[i]:.17g} (> SLIDING_RTOL)"
+        worst = max(worst, float(err.max(initial=0.0)))
+    return worst
+
+def check(n_cases: int = 12):
+    worst = 0.0
+    for seed in range(n_cases):
+        rng = np.random.default_rng(seed)
+        df = make_frame(int(rng.integers(1, 4000)), seed, shuffle=bool(seed % 2))
+        df = df.drop(columns="window_id")
+        for window_ms, hop_ms in HOPS:
+            got = compute_sliding_features(df, window_ms, hop_ms)
+            try:
+                worst = max(worst, compare(got, per_slice(df, window_ms, hop_ms)))
+            except AssertionError as e:
+                raise AssertionError(f"seed {seed}, window {window_ms} / hop {hop_ms}: {e}") from None
+    print(f"[bench] sliding == per-slice compute_window_features on {n_cases} random frames x "
+          f"{len(HOPS)} hops (worst {worst:.2g} x SLIDING_RTOL={SLIDING_RTOL:g})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time compute_sliding_features.")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--window", type=int, default=60_000)
+    parser.add_argument("--hop", type=int, default=5_000)
+    parser.add_argument("--cases", type=int, default=12)
+    args = parser.parse_args()
+
+    import warnings
+    warnings.simplefilter("ignore", RuntimeWarning)
+    try:
+        check(args.cases)
+    except AssertionError as e:
+        print(f"[bench] FAIL {e}")
+        sys.exit(1)
+    df = make_frame(args.events).drop(columns="window_id")
+    t = time.perf_counter()
+    out = compute_sliding_features(df, args.window, args.hop)
+    print(f"[bench] {args.events:,} events → {len(out):,} windows of {args.window} ms every "
+          f"{args.hop} ms in {time.perf_counter() - t:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/synth.py
+# Synthetic raw logs shaped like EventLogger output, plus matching labels, for the
+# benchmarks: typing bursts (log-normal IKIs that stretch as "fatigue" grows, ~6 %
+# backspaces, special keys), mouse strokes sampled at 125-1000 Hz ending in clicks,
+# scroll bursts, short pauses and occasional multi-minute breaks. Labels cover every
+# LABEL_SPAN_MIN like the GUI scheduler's, scored 1-5 along the session's drift.
+#
+#   python -m benchmarks.synth --hours 2 --out /tmp/bench   # → raw/events_*.ndjson, labels/labels.csv
+
+import os, argparse
+from datetime import datetime, timezone
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+
+T0 = 1_700_000_000_000
+LABEL_SPAN_MIN = 15
+MOUSE_HZ = [125, 250, 500, 1000]
+SPECIAL_KEYS = ["Key.space", "Key.enter", "Key.shift", "Key.tab", "Key.cmd"]
+SCREEN = (1920, 1080)
+
+def _typing(rng, t: int, fatigue: float) -> Tuple[List[str], int]:
+    n = int(rng.integers(10, 200))
+    iki = np.maximum(15, rng.lognormal(np.log(140 * (1 + 0.6 * fatigue)), 0.5, n)).astype(np.int64)
+    ts = t + np.cumsum(iki)
+    r = rng.random(n)
+    lines = []
+    for ti, ri in zip(ts.tolist(), r.tolist()):
+        if ri < 0.06 * (1 + fatigue):
+            lines.append(f'{{"t": {ti}, "type": "key_down", "is_backspace": true}}')
+        elif ri < 0.25:
+            lines.append(f'{{"t": {ti}, "type": "key_down", "special": "{SPECIAL_KEYS[int(ri * 1000) % 5]}"}}')
+        else:
+            lines.append(f'{{"t": {ti}, "type": "key_down"}}')
+    return lines, int(ts[-1])
+
+def _stroke(rng, t: int, hz: int, pos: np.ndarray) -> Tuple[List[str], int, np.ndarray]:
+    """Minimum-jerk stroke to a random target (+ hand tremor), sampled at ~hz; maybe a click."""
+    dur_ms = int(rng.uniform(150, 2500))
+    n = max(2, dur_ms * hz // 1000)
+    target = rng.uniform([0, 0], SCREEN)
+    s = np.linspace(0, 1, n)
+    s = 10 * s**3 - 15 * s**4 + 6 * s**5
+    xy = pos + (target - pos) * s[:, None] + rng.normal(0, 1.5, (n, 2))
+    xy = np.clip(np.round(xy), 0, [SCREEN[0] - 1, SCREEN[1] - 1]).astype(np.int64)
+    dt = np.maximum(1, np.round(rng.normal(1000 / hz, 0.15 * 1000 / hz, n))).astype(np.int64)
+    ts = t + np.cumsum(dt)
+    lines = [f'{{"t": {ti}, "type": "mouse_move", "x": {x}, "y": {y}}}'
+             for ti, (x, y) in zip(ts.tolist(), xy.tolist())]
+    end = int(ts[-1])
+    if rng.random() < 0.5:
+        end += int(rng.integers(60, 400))
+        lines.append(f'{{"t": {end}, "type": "mouse_click", "btn": "Button.left", "x": {xy[-1, 0]}, "y": {xy[-1, 1]}}}')
+    return lines, end, xy[-1].astype(float)
+
+def _scroll(rng, t: int, pos: np.ndarray) -> Tuple[List[str], int]:
+    n = int(rng.integers(3, 30))
+    ts = t + np.cumsum(rng.integers(20, 60, n))
+    dy = -1 if rng.random() < 0.7 else 1
+    x, y = int(pos[0]), int(pos[1])
+    return [f'{{"t": {ti}, "type": "mouse_scroll", "dx": 0, "dy": {dy}, "x": {x}, "y": {y}}}'
+            for ti in ts.tolist()], int(ts[-1])
+
+def generate_session(path: str, hours: float, seed: int = 0, t0: int = T0) -> Tuple[int, int]:
+    """Write one NDJSON log covering `hours` of activity from t0. Returns (events, end_ms)."""
+    rng = np.random.default_rng(seed)
+    hz = int(rng.choice(MOUSE_HZ))
+    end_ms = t0 + int(hours * 3_600_000)
+    t, pos, n = t0, np.array(SCREEN, dtype=float) / 2, 0
+    with open(path, "w", encoding="utf-8") as f:
+        while t < end_ms:
+            fatigue = (t - t0) / max(end_ms - t0, 1)
+            r = rng.random()
+            if r < 0.35:
+                lines, t = _typing(rng, t, fatigue)
+            elif r < 0.85:
+                lines, t, pos = _stroke(rng, t, hz, pos)
+            else:
+                lines, t = _scroll(rng, t, pos)
+            f.write("\n".join(lines) + "\n")
+            n += len(lines)
+            # pauses: mostly short, sometimes a coffee break
+            t += int(rng.exponential(1500 * (1 + fatigue))) if rng.random() > 0.01 else int(rng.uniform(60_000, 600_000))
+    return n, t
+
+def generate_labels(path: str, t0: int, t_end: int, seed: int = 0) -> pd.DataFrame:
+    """One label per LABEL_SPAN_MIN up to t_end, score rising 1 → 5 with noise."""
+    rng = np.random.default_rng(seed + 1)
+    span = LABEL_SPAN_MIN * 60_000
+    to = np.arange(t0 + span, t_end + span, span, dtype=np.int64)
+    drift = (to - t0) / max(t_end - t0, 1)
+    score = np.clip(np.round(1 + 4 * drift + rng.normal(0, 0.5, len(to))), 1, 5)
+    labels = pd.DataFrame({"applies_from": to - span, "applies_to": to, "fatigue_score": score})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    labels.to_csv(path, index=False)
+    return labels
+
+def generate(out_dir: str, hours: float, seed: int = 0) -> Tuple[str, str, int]:
+    """<out_dir>/raw/events_<stamp>.ndjson + <out_dir>/labels/labels.csv → (raw, labels, events)."""
+    os.makedirs(os.path.join(out_dir, "raw"), exist_ok=True)
+    stamp = datetime.fromtimestamp(T0 / 1000, tz=timezone.utc).strftime("%Y%m%d_%H%M%S")
+    raw = os.path.join(out_dir, "raw", f"events_{stamp}.ndjson")
+    n, t_end = generate_session(raw, hours, seed)
+    labels = os.path.join(out_dir, "labels", "labels.csv")
+    generate_labels(labels, T0, t_end, seed)
+    return raw, labels, n
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw log and labels.")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--out", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    raw, labels, n = generate(args.out, args.hours, args.seed)
+    print(f"[synth] {n:,} events over {args.hours} h → {raw}; labels → {labels}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/window_features.py
+# compute_window_features: check the segment reductions against the original
+# per-window groupby loop on small random frames, then time them at scale.
+# Sparse frames (btn/special/is_backspace NA on move rows, as read_ndjson returns
+# them) are checked against the loop with dropna restricted to dx/dy/dt: the loop's
+# plain dropna() (old_dropna=True) discarded every move row there, so mouse speed/jerk
+# were all NaN. That is the loop's only change. Exits 1 on a mismatch.
+#
+#   python -m benchmarks.window_features                    # 10M events
+#   python -m benchmarks.window_features --events 200000 --loop    # also time the loop (~100x slower)
+
+import sys, time, argparse
+import numpy as np
+import pandas as pd
+
+from src.features.computecore import FEATURE_COLUMNS, _tod_features, compute_window_features
+
+WINDOW_MS = 60_000
+T0 = 1_700_000_000_000
+TYPES = np.array(["mouse_move", "key_down", "mouse_click", "mouse_scroll", "key_up"], dtype=object)
+
+def make_frame(n_events: int, seed: int = 0, shuffle: bool = False, sparse: bool = False) -> pd.DataFrame:
+    """
+    Events over ~n_events/100 windows, every column filled (as a dense binary log
+    decodes) or, with `sparse`, NA where the event type has no value (as in
+    read_ndjson frames). Coarse timestamps so dt == 0 pairs occur; a few NaN
+    coordinates and NaN window ids; `shuffle` scrambles row order across windows.
+    """
+    rng = np.random.default_rng(seed)
+    span = max(1, n_events // 100) * WINDOW_MS
+    t = np.sort(T0 + rng.integers(0, span, n_events))
+    t -= t % rng.choice([1, 8, 1000])
+    types = TYPES[rng.choice(len(TYPES), n_events, p=[0.6, 0.2, 0.05, 0.1, 0.05])]
+    x = np.cumsum(rng.normal(0, 4, n_events))
+    y = np.cumsum(rng.normal(0, 3, n_events))
+    x[rng.random(n_events) < 0.01] = np.nan
+    df = pd.DataFrame({"t": t, "type": types, "x": x, "y": y,
+                       "dx": np.zeros(n_events), "dy": np.zeros(n_events),
+                       "btn": np.full(n_events, "none", dtype=object),
+                       "is_backspace": rng.random(n_events) < 0.06,
+                       "special": np.full(n_events, "", dtype=object),
+                       "window_id": ((t - T0) // WINDOW_MS).astype(float)})
+    df.loc[rng.random(n_events) < 0.001, "window_id"] = np.nan
+    if sparse:
+        key = df["type"].isin(["key_down", "key_up"]).to_numpy()
+        df[["dx", "dy"]] = np.nan
+        df["btn"] = df["btn"].where(df["type"] == "mouse_click", pd.NA)
+        df["is_backspace"] = df["is_backspace"].astype(object).where(key, pd.NA)
+        df["special"] = df["special"].where(key, pd.NA)
+        df.loc[key, ["x", "y"]] = np.nan
+    if shuffle:
+        df = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    return df
+
+def reference_features(df: pd.DataFrame, old_dropna: bool = False) -> pd.DataFrame:
+    """The original per-window groupby loop; its mv.dropna() looks at dx/dy/dt only
+    unless old_dropna (every column, as originally)."""
+    if df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    out = []
+    for wid, chunk in df.groupby("window_id", sort=True):
+        t_start = int(chunk["t"].min())
+        t_end   = int(chunk["t"].max())
+        k = chunk[chunk["type"] == "key_down"].copy()
+        keys_total = int(len(k))
+        backspace = int(k["is_backspace"].fillna(False).astype(bool).sum())
+        correction_rate = (backspace / keys_total) if keys_total > 0 else 0.0
+        if keys_total >= 2:
+            ikis = k["t"].astype("int64").diff().dropna().to_numpy(dtype=float)
+            avg_iki, iki_std = float(np.mean(ikis)), float(np.std(ikis, ddof=0))
+        else:
+            avg_iki, iki_std = float("nan"), float("nan")
+
+        mv = chunk[chunk["type"] == "mouse_move"].copy()
+        move_events = int(len(mv))
+        mouse_speed_mean = mouse_speed_std = mouse_jerk_mean = float("nan")
+        if move_events >= 2:
+            mv["dx"] = mv["x"].astype(float).diff()
+            mv["dy"] = mv["y"].astype(float).diff()
+            mv["dt"] = mv["t"].astype("int64").diff() / 1000.0
+            mv = mv.dropna() if old_dropna else mv.dropna(subset=["dx", "dy", "dt"])
+            dist = np.sqrt(mv["dx"].to_numpy()**2 + mv["dy"].to_numpy()**2)
+            dt = mv["dt"].replace(0, np.nan).to_numpy()
+            speed = dist / dt
+            mouse_speed_mean = float(np.nanmean(speed))
+            mouse_speed_std  = float(np.nanstd(speed, ddof=0))
+            accel = np.diff(speed) / dt[1:]
+            jerk = np.diff(accel)
+            mouse_jerk_mean = float(np.nanmean(np.abs(jerk))) if jerk.size else float("nan")
+
+        gaps = chunk["t"].astype("int64").diff().fillna(0) / 1000.0
+        idle_seconds = float(np.sum(gaps[gaps > 2.0]))
+        idle_ratio = max(0.0, min(1.0, idle_seconds / 60.0))
+        tod_s, tod_c = _tod_features((t_start + t_end) // 2)
+        out.append({"window_id": int(wid), "t_start": t_start, "t_end": t_end,
+                    "keys_total": keys_total, "backspace": backspace,
+                    "correction_rate": float(correction_rate),
+                    "avg_iki": avg_iki, "iki_std": iki_std, "move_events": move_events,
+                    "mouse_speed_mean": mouse_speed_mean, "mouse_speed_std": mouse_speed_std,
+                    "mouse_jerk_mean": mouse_jerk_mean, "idle_ratio": idle_ratio,
+                    "clicks": int((chunk["type"] == "mouse_click").sum()),
+                    "scrolls": int((chunk["type"] == "mouse_scroll").sum()),
+                    "tod_sin": float(tod_s), "tod_cos": float(tod_c)})
+    return pd.DataFrame(out, columns=FEATURE_COLUMNS)
+
+def _assert_same(got: pd.DataFrame, ref: pd.DataFrame):
+    pd.testing.assert_frame_equal(got.reset_index(drop=True), ref.astype(got.dtypes.to_dict()),
+                                  check_exact=True)
+
+def check(n_cases: int = 40):
+    import warnings
+    warnings.simplefilter("ignore", RuntimeWarning)   # the loop's nanmean of empty slices
+    warnings.simplefilter("ignore", FutureWarning)    # fillna downcast of object is_backspace
+    for seed in range(n_cases):
+        rng = np.random.default_rng(seed)
+        df = make_frame(int(rng.integers(1, 3000)), seed, shuffle=bool(seed % 2))
+        _assert_same(compute_window_features(df), reference_features(df))
+    print(f"[bench] segment reductions == groupby loop (bit-exact) on {n_cases} random frames")
+    changed = 0
+    for seed in range(n_cases):
+        rng = np.random.default_rng(seed)
+        df = make_frame(int(rng.integers(1, 3000)), seed, shuffle=bool(seed % 2), sparse=True)
+        got = compute_window_features(df)
+        _assert_same(got, reference_features(df))
+        old = reference_features(df, old_dropna=True)
+        assert old["mouse_speed_mean"].isna().all()
+        changed += int(got["mouse_speed_mean"].notna().sum())
+    print(f"[bench] sparse frames == loop with dropna(subset=[dx, dy, dt]) on {n_cases} random frames "
+          f"({changed:,} windows gain mouse speed/jerk over the old dropna())")
+
+def _best(fn, df: pd.DataFrame, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compute_window_features.")
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loop", action="store_true", help="Also time the original loop (slow)")
+    args = parser.parse_args()
+
+    try:
+        check()
+    except AssertionError as e:
+        print(f"[bench] FAIL {e}")
+        sys.exit(1)
+    df = make_frame(args.events)
+    best = _best(compute_window_features, df, args.repeat)
+    print(f"[bench] {args.events:,} events → {df['window_id'].nunique():,} windows, "
+          f"best {best:.2f}s of {args.repeat}")
+    if args.loop:
+        loop = _best(reference_features, df, 1)
+        print(f"[bench] groupby loop: {loop:.2f}s ({loop / best:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/window_states.py
+# Mergeable window states: features_from_states of compute_window_states,
+# coarsen_states and rolling_states against compute_window_features on the events
+# re-windowed the same way (window_id // factor; windows w-span+1 .. w relabelled w),
+# on random time-ordered frames and synthetic sessions. Counts and edges must be equal,
+# the float features within STATE_RTOL (the std columns of the matching mean);
+# idle_ratio is left out (states divide by the merged span, not 60 s). Then times
+# rolling_states against folding merge_states window by window. Exits 1 on a mismatch.
+#
+#   python -m benchmarks.window_states
+#   python -m benchmarks.window_states --events 2000000 --loop
+
+import os, sys, time, shutil, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+from benchmarks.synth import generate_session
+from benchmarks.window_features import make_frame
+from src.features.computecore import (FEATURE_COLUMNS, STATE_COLUMNS, STATE_RTOL, compute_window_features,
+                                      compute_window_states, features_from_states, coarsen_states,
+                                      rolling_states, merge_states)
+from src.features.windowing import read_raw, add_window_index
+
+FLOAT_COLUMNS = ["correction_rate", "avg_iki", "iki_std", "mouse_speed_mean", "mouse_speed_std",
+                 "mouse_jerk_mean", "tod_sin", "tod_cos"]
+SCALE = {"iki_std": "avg_iki", "mouse_speed_std": "mouse_speed_mean"}
+FACTORS = (2, 5, 15)
+
+def rewindowed(df: pd.DataFrame, span: int) -> pd.DataFrame:
+    """compute_window_features over windows w-span+1 .. w for every window w with events."""
+    df = df[df["window_id"].notna()]
+    w = df["window_id"].to_numpy().astype("int64")
+    parts = [df[(w > i - span) & (w <= i)].assign(window_id=i) for i in np.unique(w)]
+    return compute_window_features(pd.concat(parts, ignore_index=True))
+
+def compare(ref: pd.DataFrame, got: pd.DataFrame) -> float:
+    """Worst error in units of STATE_RTOL; raises AssertionError past 1."""
+    ref, got = ref.reset_index(drop=True), got.reset_index(drop=True)
+    assert len(got) == len(ref), f"{len(got)} windows, events give {len(ref)}"
+    exact = [c for c in FEATURE_COLUMNS if c not in FLOAT_COLUMNS and c != "idle_ratio"]
+    pd.testing.assert_frame_equal(got[exact], ref[exact].astype(got[exact].dtypes.to_dict()),
+                                  check_exact=True)
+    worst = 0.0
+    for c in FLOAT_COLUMNS:
+        a, b = ref[c].to_numpy(float), got[c].to_numpy(float)
+        assert (np.isnan(a) == np.isnan(b)).all(), f"{c}: NaN in different windows"
+        scale = np.abs(ref[SCALE.get(c, c)].to_numpy(float))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            err = np.abs(a - b) / (STATE_RTOL * np.maximum(np.abs(a), scale))
+        err = np.where(np.isnan(a) | (a == b), 0.0, err)
+        i = int(np.argmax(err)) if len(err) else 0
+        assert not len(err) or err[i] <= 1, f"{c}: window {i} {b[i]:.17g} vs {a[i]:.17g} (> STATE_RTOL)"
+        worst = max(worst, float(err.max(initial=0.0)))
+    return worst
+
+def check_frame(df: pd.DataFrame) -> float:
+    states = compute_window_states(df)
+    worst = compare(compute_window_features(df), features_from_states(states))
+    for f in FACTORS:
+        coarse = df.assign(window_id=df["window_id"] // f)
+        worst = max(worst, compare(compute_window_features(coarse), features_from_states(coarsen_states(states, f))))
+        worst = max(worst, compare(rewindowed(df, f), features_from_states(rolling_states(states, f))))
+    return worst
+
+def check(n_cases: int = 20, sessions: int = 3):
+    worst = 0.0
+    for seed in range(n_cases):
+        rng = np.random.default_rng(seed)
+        df = make_frame(int(rng.integers(1, 6000)), seed, sparse=bool(seed % 2))
+        try:
+            worst = max(worst, check_frame(df))
+        except AssertionError as e:
+            raise AssertionError(f"frame {seed}: {e}") from None
+    work = tempfile.mkdtemp(prefix="window_states_")
+    try:
+        for seed in range(sessions):
+            path = os.path.join(work, f"events_{seed}.ndjson")
+            generate_session(path, 0.5, seed)
+            try:
+                worst = max(worst, check_frame(add_window_index(read_raw(path))))
+            except AssertionError as e:
+                raise AssertionError(f"session {seed}: {e}") from None
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(f"[bench] merged states == compute_window_features on {n_cases} random frames + {sessions} "
+          f"sessions, x{'/'.join(map(str, FACTORS))} coarse and rolling (worst {worst:.2g} x STATE_RTOL={STATE_RTOL:g})")
+
+def fold_rolling(states: pd.DataFrame, span: int) -> pd.DataFrame:
+    """rolling_states as a merge_states fold per window (the definition; slow)."""
+    rows = states.sort_values("window_id", kind="stable").to_dict("records")
+    out, lo = [], 0
+    for i, row in enumerate(rows):
+        while rows[lo]["window_id"] <= row["window_id"] - span:
+            lo += 1
+        acc = rows[lo]
+        for r in rows[lo + 1:i + 1]:
+            acc = merge_states(acc, r)
+        out.append({**acc, "window_id": row["window_id"]})
+    return pd.DataFrame(out, columns=STATE_COLUMNS)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time coarsen_states / rolling_states.")
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--span", type=int, default=15)
+    parser.add_argument("--cases", type=int, default=20)
+    parser.add_argument("--loop", action="store_true", help="Also time the merge_states fold (slow)")
+    args = parser.parse_args()
+
+    import warnings
+    warnings.simplefilter("ignore", RuntimeWarning)
+    warnings.simplefilter("ignore", FutureWarning)    # fillna downcast of object is_backspace
+    try:
+        check(args.cases)
+    except AssertionError as e:
+        print(f"[bench] FAIL {e}")
+        sys.exit(1)
+    states = compute_window_states(make_frame(args.events))
+    t = time.perf_counter()
+    rolling_states(states, args.span)
+    best = time.perf_counter() - t
+    print(f"[bench] rolling_states over {len(states):,} windows, span {args.span}: {best:.3f}s")
+    if args.loop:
+        t = time.perf_counter()
+        fold_rolling(states, args.span)
+        loop = time.perf_counter() - t
+        print(f"[bench] merge_states fold: {loop:.2f}s ({loop / best:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# src/__main__.py
+# One entry point for the whole pipeline: python -m src <command> [options]
+# Only the chosen command's module is imported, so pandas / sklearn / pynput load
+# only for the commands that use them; `python -m src --help` imports none of them.
+# Options after the command go to that module's own parser (python -m src train --help).
+#
+#   python -m src capture --segments        # = python -m src.collector.eventcapture
+#   python -m src label                     # = python -m src.labeling.gui_scheduler
+#   python -m src app                       # = python app.py (capture + label in one process)
+#   python -m src features --incremental    # = python -m src.features.make_features
+#   python -m src dataset                   # = python -m src.features.datasetbuilder
+#   python -m src train --budget 300        # = python -m src.model.train
+#   python -m src predict                   # = python -m src.inference.predict
+#   python -m src serve --port 8765         # = python -m src.inference.server
+#   python -m src ingest --shards 4         # = python -m src.inference.ingest
+
+import sys, importlib
+
+# command → (module with a main(), one-line help)
+COMMANDS = {
+    "capture":  ("src.collector.eventcapture",  "Log contentless keyboard / mouse events to data/raw"),
+    "label":    ("src.labeling.gui_scheduler",  "Popup asking for a fatigue score every 15 minutes"),
+    "app":      ("src.app",                     "Capture in the background + the label popup (= python app.py)"),
+    "features": ("src.features.make_features",  "Raw events → per-window features"),
+    "dataset":  ("src.features.datasetbuilder", "Join features with labels → data/datasets/train/ (training matrix)"),
+    "train":    ("src.model.train",             "Fit and save a model under models/"),
+    "predict":  ("src.inference.predict",       "Score the newest feature window"),
+    "serve":    ("src.inference.server",        "Resident prediction server on localhost"),
+    "ingest":   ("src.inference.ingest",        "Multi-user ingest: live features + fatigue timeline per user"),
+}
+
+def usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = ["usage: python -m src <command> [options]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {desc}" for name, (_, desc) in COMMANDS.items()]
+    lines += ["", "python -m src <command> --help shows the command's options."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    cmd, rest = argv[0], argv[1:]
+    if cmd not in COMMANDS:
+        print(f"python -m src: unknown command '{cmd}'\n\n{usage()}", file=sys.stderr)
+        sys.exit(2)
+    module = importlib.import_module(COMMANDS[cmd][0])
+    sys.argv = [f"python -m src {cmd}"] + rest   # the module's argparse reads sys.argv
+    module.main()
+
+if __name__ == "__main__":
+    main()
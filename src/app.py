@@ -0,0 +1,63 @@
+# src/app.py
+# Combined runner: event logger (keyboard + mouse) in a background thread and the label
+# popup scheduler (Tkinter) on the main thread, until the popup window is closed or
+# Ctrl+C / SIGTERM. pynput and Tkinter are imported when it starts, not on import, so
+# `python -m src --help` / `python -m src app --help` stay instant.
+#
+#   python -m src app                  # = python app.py
+#   python -m src app --format bin     # logger options as for `python -m src capture`
+
+import sys, signal, argparse, threading
+
+_logger_instance = None
+
+def start_logger_bg(fmt: str = "ndjson", decimate: str = "off", decimate_param: float = 20):
+    """Start EventLogger in a background thread and return the instance."""
+    from src.collector.eventcapture import EventLogger, make_raw_path
+    out_path = make_raw_path(fmt)
+    logger = EventLogger(out_path, decimate=decimate, decimate_param=decimate_param)
+
+    t = threading.Thread(target=logger.run, daemon=True)
+    t.start()
+    print(f"[app] Event logger started (background) → {out_path}")
+    return logger
+
+def _graceful_exit(signum=None, frame=None):
+    """Handle Ctrl+C / SIGTERM and stop the logger cleanly."""
+    print("\n[app] Shutting down…")
+    if _logger_instance is not None:
+        try:
+            _logger_instance.stop()
+        except Exception as e:
+            print(f"[app] Logger stop error: {e}", file=sys.stderr)
+    sys.exit(0)
+
+def main():
+    global _logger_instance
+    parser = argparse.ArgumentParser(description="Event logger + fatigue label popup in one process.")
+    parser.add_argument("--format", choices=["ndjson", "bin"], default="ndjson",
+                        help="Raw event file format (default: %(default)s)")
+    parser.add_argument("--decimate", choices=["off", "rate", "distance"], default="off",
+                        help="Mouse-move decimation before storage (default: %(default)s)")
+    parser.add_argument("--decimate-param", type=float, default=20,
+                        help="ms per kept move (rate) or px of path (distance), >= 1")
+    args = parser.parse_args()
+    if args.decimate != "off" and not args.decimate_param >= 1:   # MoveDecimator's MIN_PARAM (numpy-free here)
+        parser.error(f"--decimate-param must be >= 1, got {args.decimate_param:g}")
+
+    from src.labeling.gui_scheduler import main as labels_main  # runs Tk mainloop
+    # Trap signals for clean shutdown
+    signal.signal(signal.SIGINT, _graceful_exit)
+    signal.signal(signal.SIGTERM, _graceful_exit)
+
+    # 1) Start event logger in background
+    _logger_instance = start_logger_bg(args.format, args.decimate, args.decimate_param)
+    # 2) Run label scheduler UI on main thread (Tkinter mainloop)
+    #    This call blocks until the UI quits; logger keeps running in background.
+    try:
+        labels_main()
+    finally:
+        _graceful_exit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# src/collector/decimate.py
+# Capture-time mouse_move decimation + a validation tool for its feature error.
+# - Applied by EventLogger to each drained mouse batch, before anything is stored
+#   (the listener hot path stays a bare ring push)
+# - "rate":     keep at most one move per `param` ms bucket
+# - "distance": keep a move each time the travelled path grows by `param` px
+# - Endpoints are always kept: the moves right before/after a pause (> gap_ms),
+#   the moves around a click/scroll, and the last move of every batch
+# Opt-in: EventLogger captures undecimated unless --decimate is given (DECIMATE_MODE "off").
+#
+# Tolerance: mouse speed and jerk are taken at the raw intervals between stored moves
+# (computecore), so decimation changes them. Relative error per 60 s window against the
+# undecimated log, median / p95 over windows, and mean ratio decimated / undecimated, on
+# 4 synthetic 1 h sessions per mouse rate (benchmarks/synth.py):
+#                       moves   speed_mean          speed_std           jerk_mean
+#   125 Hz  rate 10      1.2x   5% / 11%   0.95     3% / 11%   0.97     22% / 33%  0.79
+#           rate 20      2.5x   16% / 42%  0.82     5% / 43%   0.91     80% / 84%  0.21
+#           rate 50      5.9x   23% / 54%  0.75     5% / 61%   0.89     95% / 97%  0.06
+#           distance 10  2.0x   20% / 57%  1.14     14% / 42%  1.11     20% / 76%  0.74
+#   500 Hz  rate 20      9.7x   59% / 82%  0.42     37% / 83%  0.61     98% / 99%  0.02
+#           distance 10  3.2x   30% / 61%  0.71     28% / 55%  0.97     71% / 83%  0.34
+#   1000 Hz rate 20     19.4x   79% / 92%  0.24     65% / 90%  0.41     99% / 100% 0.01
+#           distance 10  3.5x   55% / 62%  0.50     30% / 46%  0.78     75% / 81%  0.27
+# Speed is biased low (the native-rate speed includes per-sample jitter and 1 px / 1 ms
+# quantization that longer intervals average out) and jerk, a third difference, is not
+# preserved at any setting. No setting keeps any of the three within DYNAMICS_TOLERANCE
+# (10% p95), so decimated logs are a different feature distribution: each log records its
+# decimation next to it (events_<stamp>.decimation.json; none = "off"), and the builds
+# that combine logs — make_features --all / --stitch and the feature store — refuse logs
+# whose setting differs (MixedDecimationError). Re-check on your own recordings (prints
+# the same numbers; exits 1 when a feature is past DYNAMICS_TOLERANCE):
+#   python -m src.collector.decimate data/raw/events_*.ndjson --mode rate --param 20
+
+import os, argparse, json
+import numpy as np
+from typing import Dict, List, Optional
+
+DECIMATE_MODES = ("off", "rate", "distance")
+DECIMATE_GAP_MS = 50    # a longer pause between moves marks a stroke endpoint
+DYNAMICS_TOLERANCE = 0.10  # p95 relative error per window at which a feature counts as preserved
+MIN_PARAM = 1           # smallest rate (ms) / distance (px) step
+DECIMATION_SUFFIX = ".decimation.json"
+
+class MixedDecimationError(ValueError):
+    """Logs (or stored features) captured with different decimation settings were combined."""
+
+# ----------------- Per-log record -----------------
+def decimation_label(mode: str, param: float) -> str:
+    """'off', or mode:param (e.g. 'rate:20'): equal labels mean comparable mouse features."""
+    return "off" if mode == "off" else f"{mode}:{float(param):g}"
+
+def decimation_path(raw_path: str) -> str:
+    """events_<stamp>.ndjson / .bin / segment directory → events_<stamp>.decimation.json beside it."""
+    base = raw_path.rstrip("/\\")
+    if not os.path.isdir(base):
+        base = os.path.splitext(base)[0]
+    return base + DECIMATION_SUFFIX
+
+def save_decimation(raw_path: str, mode: str, param: float):
+    path = decimation_path(raw_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"mode": mode, "param": float(param), "label": decimation_label(mode, param)}, f)
+    os.replace(tmp, path)
+
+def log_decimation(raw_path: str) -> str:
+    """Decimation label of a raw log; logs without a record were captured undecimated."""
+    path = decimation_path(raw_path)
+    if not os.path.exists(path):
+        return "off"
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["label"]
+
+def common_decimation(raw_paths: List[str]) -> str:
+    """The one decimation label shared by raw_paths; raises MixedDecimationError otherwise."""
+    groups: Dict[str, List[str]] = {}
+    for p in raw_paths:
+        groups.setdefault(log_decimation(p), []).append(os.path.basename(p.rstrip("/\\")))
+    if len(groups) > 1:
+        detail = "; ".join(f"{label}: {', '.join(names)}" for label, names in sorted(groups.items()))
+        raise MixedDecimationError(f"raw logs were captured with different mouse decimation ({detail}); "
+                                   "their mouse speed / jerk are not comparable. Process each group separately.")
+    return next(iter(groups), "off")
+
+def param_arg(value: str) -> float:
+    """argparse type of a decimation param: a number >= MIN_PARAM."""
+    try:
+        v = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value!r}")
+    if not v >= MIN_PARAM:
+        raise argparse.ArgumentTypeError(f"must be >= {MIN_PARAM} (ms for rate, px for distance), got {value}")
+    return v
+
+class MoveDecimator:
+    """Stateful keep-mask over successive batches of events in time order."""
+    def __init__(self, mode: str = "rate", param: float = 20, gap_ms: int = DECIMATE_GAP_MS):
+        if mode not in DECIMATE_MODES:
+            raise ValueError(f"mode must be one of {DECIMATE_MODES}")
+        if mode != "off" and not float(param) >= MIN_PARAM:
+            raise ValueError(f"param must be >= {MIN_PARAM} (ms for rate, px for distance), got {param}")
+        self.mode = mode
+        self.param = float(param)
+        self.gap_ms = gap_ms
+        self.last_t: Optional[int] = None   # last move of the previous batch (always kept)
+        self.last_x = self.last_y = 0.0
+        self.path_px = 0.0
+        self.seen = 0
+        self.kept = 0
+
+    def mask(self, t: np.ndarray, x: np.ndarray, y: np.ndarray, is_move: np.ndarray) -> np.ndarray:
+        keep = np.ones(len(t), dtype=bool)
+        idx = np.flatnonzero(is_move)
+        if self.mode == "off" or not len(idx):
+            return keep
+        mt = t[idx].astype(np.int64)
+        mx = x[idx].astype(float)
+        my = y[idx].astype(float)
+        first = self.last_t is None
+        pt = np.r_[mt[0] if first else self.last_t, mt]
+        px = np.r_[mx[0] if first else self.last_x, mx]
+        py = np.r_[my[0] if first else self.last_y, my]
+
+        if self.mode == "rate":
+            bucket = pt // self.param
+        else:
+            path = self.path_px + np.cumsum(np.hypot(np.diff(px), np.diff(py)))
+            bucket = np.floor(np.r_[self.path_px, path] / self.param)
+            self.path_px = float(path[-1])
+        km = bucket[1:] != bucket[:-1]
+        if first:
+            km[0] = True
+
+        # Stroke endpoints: last move before a pause and first move after it
+        gap = np.diff(pt) > self.gap_ms
+        km |= gap
+        km[:-1] |= gap[1:]
+        # Moves adjacent to clicks/scrolls keep the pointer position exact there
+        km |= np.r_[idx[1:] - idx[:-1] > 1, True]
+        km |= np.r_[idx[0] > 0, idx[1:] - idx[:-1] > 1]
+        km[-1] = True   # batch end: the next batch diffs against it
+
+        keep[idx] = km
+        self.last_t, self.last_x, self.last_y = int(mt[-1]), float(mx[-1]), float(my[-1])
+        self.seen += len(idx)
+        self.kept += int(km.sum())
+        return keep
+
+# ----------------- Validation -----------------
+DYNAMICS = ["mouse_speed_mean", "mouse_speed_std", "mouse_jerk_mean"]
+
+def validate(raw_path: str, mode: str, param: float, window_ms: int = 60_000) -> dict:
+    """Features of raw_path vs the same log decimated → reduction and relative errors."""
+    from src.features.windowing import read_raw, add_window_index
+    from src.features.computecore import compute_window_features
+
+    df = read_raw(raw_path)
+    if df.empty:
+        return {"file": raw_path, "events": 0}
+    is_move = (df["type"] == "mouse_move").to_numpy()
+    keep = MoveDecimator(mode, param).mask(df["t"].to_numpy(), df["x"].to_numpy(),
+                                          df["y"].to_numpy(), is_move)
+    ref = compute_window_features(add_window_index(df.copy(), window_ms=window_ms)).set_index("window_id")
+    # Same window_id base as the undecimated log (the first event may be a dropped move)
+    base = int(df["t"].min())
+    dec = df[keep].reset_index(drop=True)
+    got = compute_window_features(add_window_index(dec, window_ms=window_ms, base_ts_ms=base)).set_index("window_id")
+    got = got.reindex(ref.index)
+
+    out = {"file": raw_path, "mode": mode, "param": param,
+           "events": int(len(df)), "moves": int(is_move.sum()), "moves_kept": int((keep & is_move).sum())}
+    out["reduction"] = out["moves"] / max(out["moves_kept"], 1)
+    out["ok"] = True
+    for c in DYNAMICS:
+        r, g = ref[c].to_numpy(dtype=float), got[c].to_numpy(dtype=float)
+        ok = np.isfinite(r) & np.isfinite(g)
+        rel = np.abs(g[ok] - r[ok]) / np.where(r[ok] != 0, np.abs(r[ok]), 1.0)
+        nz = ok & (r != 0)
+        # A window with the feature on one side only (e.g. NaN after decimation) fails too
+        missing = int((np.isfinite(r) != np.isfinite(g)).sum())
+        out[c] = {"windows": int(ok.sum()), "missing": missing,
+                  "median_rel_err": float(np.median(rel)) if rel.size else None,
+                  "p95_rel_err": float(np.percentile(rel, 95)) if rel.size else None,
+                  "max_rel_err": float(rel.max()) if rel.size else None,
+                  "mean_ratio": float(np.mean(g[nz] / r[nz])) if nz.any() else None}
+        out[c]["ok"] = not missing and (not rel.size or out[c]["p95_rel_err"] <= DYNAMICS_TOLERANCE)
+        out["ok"] &= out[c]["ok"]
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure feature error of move decimation on recorded logs.")
+    parser.add_argument("files", nargs="+", help="Undecimated raw logs (.ndjson or .bin)")
+    parser.add_argument("--mode", choices=DECIMATE_MODES[1:], default="rate")
+    parser.add_argument("--param", type=param_arg, default=20, help="ms (rate) or px (distance), >= 1")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = [validate(p, args.mode, args.param) for p in args.files]
+    for r in results:
+        if not r["events"]:
+            print(f"[decimate] {r['file']}: empty")
+            continue
+        print(f"[decimate] {r['file']}: {r['moves']} → {r['moves_kept']} moves ({r['reduction']:.1f}x)")
+        for c in DYNAMICS:
+            s = r[c]
+            if s["windows"]:
+                ratio = "n/a" if s["mean_ratio"] is None else f"{s['mean_ratio']:.3f}"
+                print(f"  {c:18s} median {s['median_rel_err']:.3f}  p95 {s['p95_rel_err']:.3f}  "
+                      f"max {s['max_rel_err']:.3f}  mean ratio {ratio}  ({s['windows']} windows)"
+                      + (f"  {s['missing']} window(s) lost it" if s["missing"] else "")
+                      + ("" if s["ok"] else f"  FAIL (tolerance {DYNAMICS_TOLERANCE:g})"))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(r.get("ok", True) for r in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,102 +3,203 @@
 # - Captures keyboard & mouse events using pynput
 # - Does NOT store printable keys (letters, digits, symbols)
 # - Only keeps event type, timing, and limited metadata (Backspace flag, mouse coords)
-# - Buffers in memory, flushes to NDJSON every 5s
-# - Output file: data/raw/events_<ISO-like-timestamp>.ndjson
+# - Buffers in preallocated ring buffers (one per listener thread, no locks on the
+#   hot path), flushes to NDJSON (or the compact binary format) every 5s or early
+#   when a ring fills up
+# - Optional mouse_move decimation before storage (see src/collector/decimate.py); the
+#   setting is recorded beside the log in events_<stamp>.decimation.json
+# - Optional live feature engine fed each flushed batch (src/inference/livefeatures.py),
+#   or --ingest: the batches streamed to a multi-user ingest server (src/inference/ingest.py)
+# - Telemetry (src/collector/telemetry.py): callback latency, per-type rates, flush
+#   time / bytes, ring high-water marks and drops → data/logs/capture_<stamp>.ndjson
+#   every minute; --metrics-port serves the same read-only on localhost
+# - Output file: data/raw/events_<ISO-like-timestamp>.ndjson (or .bin), kept open and
+#   written once per flush; with --segments a directory of size/time-rotated segments,
+#   compressed in the background, with a time-range index (src/utils/segments.py)
 
 from pynput import keyboard, mouse
-from collections import deque
 from datetime import datetime, timezone
-import threading, time, json, os, sys
-from typing import Deque, Dict, Any
+import threading, time, json, os, sys, argparse
+from typing import Optional
+import numpy as np
+
+from src.utils.io import BIN_SUFFIX, FLAG_BACKSPACE, append_records, decode_events, remap_codes
+from src.collector.ringbuffer import EventRing, OVERFLOW_POLICIES, MOUSE_MOVE
+from src.collector.decimate import MoveDecimator, DECIMATE_MODES, save_decimation, param_arg
+from src.collector.telemetry import CaptureTelemetry, MetricsServer, TELEMETRY_DIR, TELEMETRY_INTERVAL_SEC
+from src.utils.segments import (SegmentWriter, SEGMENT_MAX_BYTES, SEGMENT_MAX_SEC, COMPRESS_MODES,
+                                WRITE_BUFFER)
 
 FLUSH_INTERVAL_SEC = 5
-BUFFER_MAXLEN = 10000
+BUFFER_MAXLEN = 16384           # ring capacity per listener (rounded to a power of two)
+BUFFER_MAX_GROW = 1 << 20       # upper bound when OVERFLOW_POLICY = "grow"
+OVERFLOW_POLICY = "flush"       # "drop" | "flush" (wake writer early) | "grow"
+RAW_FORMAT = "ndjson"   # or "bin" (fixed-width records, see src/utils/io.py)
+DECIMATE_MODE  = "off"          # "off" | "rate" | "distance"
+DECIMATE_PARAM = 20             # ms per kept move (rate) or px of path (distance)
 
 def iso_stamp() -> str:
     # e.g., 2025-09-10T13-22-45
     return datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%dT%H-%M-%S")
 
-def now_ms() -> int:
-    return int(time.time() * 1000)
+def now_ms(_ns=time.time_ns) -> int:
+    return _ns() // 1_000_000
+
+perf_ns = time.perf_counter_ns
 
-def make_raw_path() -> str:
-    fname = f"events_{iso_stamp()}.ndjson"
+def make_raw_path(fmt: str = RAW_FORMAT, segmented: bool = False) -> str:
+    ext = "" if segmented else (BIN_SUFFIX if fmt == "bin" else ".ndjson")   # segmented: a directory
+    fname = f"events_{iso_stamp()}{ext}"
     path = os.path.join("data", "raw", fname)
     os.makedirs(os.path.dirname(path), exist_ok=True)
     return path
 
+def telemetry_path(out_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(out_path))[0]
+    return os.path.join(TELEMETRY_DIR, f"capture_{stem[len('events_'):] if stem.startswith('events_') else stem}.ndjson")
+
 class EventLogger:
-    def __init__(self, out_path: str):
+    def __init__(self, out_path: str, policy: str = OVERFLOW_POLICY,
+                 decimate: str = DECIMATE_MODE, decimate_param: float = DECIMATE_PARAM, live=None,
+                 telemetry_interval: float = TELEMETRY_INTERVAL_SEC, metrics_port: Optional[int] = None,
+                 segments: Optional[SegmentWriter] = None):
         self.out_path = out_path
-        self.buf: Deque[Dict[str, Any]] = deque(maxlen=BUFFER_MAXLEN)
-        self.lock = threading.Lock()
+        self.live = live                       # LiveFeatures (or anything with feed/advance/finish)
+        self.segments = segments               # writes to out_path (a session directory) instead
+        self.binary = segments is None and out_path.endswith(BIN_SUFFIX)
+        self._fh = None                        # NDJSON file: one handle for the whole session
         self.stop_evt = threading.Event()
+        self.flush_evt = threading.Event()     # set by a ring under pressure → early flush
+        self.flush_lock = threading.Lock()     # writer side only; rings have one consumer
+        # pynput runs keyboard and mouse listeners on separate threads: one ring each
+        ring_args = dict(capacity=BUFFER_MAXLEN, policy=policy, max_capacity=BUFFER_MAX_GROW,
+                         on_pressure=self.flush_evt.set)
+        self.key_ring = EventRing(**ring_args)
+        self.mouse_ring = EventRing(**ring_args)
+        self.decimator = MoveDecimator(decimate, decimate_param)   # writer thread only
+        self.decimate, self.decimate_param = decimate, decimate_param
+        self._dropped_reported = 0
+        self.telemetry = CaptureTelemetry({"key": self.key_ring, "mouse": self.mouse_ring},
+                                          telemetry_path(out_path), telemetry_interval)
+        cb = self.telemetry.callbacks
+        self._cb_key, self._cb_move, self._cb_click, self._cb_scroll = cb["key"], cb["move"], cb["click"], cb["scroll"]
+        self.metrics = MetricsServer(self.telemetry, metrics_port) if metrics_port is not None else None
         self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
 
+    @property
+    def dropped(self) -> int:
+        return self.key_ring.dropped + self.mouse_ring.dropped
+
     # -------- Event handlers --------
     def on_key_press(self, key):
-        ev = {"t": now_ms(), "type": "key_down"}
+        t0 = perf_ns()
+        flags = name = 0
         try:
             # special key (like backspace), record
             if isinstance(key, keyboard.Key):
                 if key == keyboard.Key.backspace:
-                    ev["is_backspace"] = True
+                    flags = FLAG_BACKSPACE
                 else:
-                    ev["special"] = str(key)  #e.g,'Key.enter', 'Key.tab'
+                    name = self.key_ring.name_code(str(key))  #e.g,'Key.enter', 'Key.tab'
             else:
                 # Printable characters recorded but without their data(for privacy)
                 pass
         except Exception:
             pass
-        self._append(ev)
+        self.key_ring.push_key(now_ms(), flags, name)
+        self._cb_key.add(perf_ns() - t0)
 
     def on_click(self, x, y, button, pressed):
         if not pressed:
             return
-        self._append({
-            "t": now_ms(),
-            "type": "mouse_click",
-            "btn": str(button),
-            "x": x, "y": y
-        })
+        t0 = perf_ns()
+        ring = self.mouse_ring
+        ring.push_click(now_ms(), x, y, ring.name_code(str(button)))
+        self._cb_click.add(perf_ns() - t0)
 
     def on_move(self, x, y):
-        self._append({"t": now_ms(), "type": "mouse_move", "x": x, "y": y})
+        t0 = perf_ns()
+        self.mouse_ring.push_move(now_ms(), x, y)
+        self._cb_move.add(perf_ns() - t0)
 
     def on_scroll(self, x, y, dx, dy):
-        self._append({
-            "t": now_ms(),
-            "type": "mouse_scroll",
-            "dx": dx, "dy": dy,
-            "x": x, "y": y
-        })
+        t0 = perf_ns()
+        self.mouse_ring.push_scroll(now_ms(), x, y, dx, dy)
+        self._cb_scroll.add(perf_ns() - t0)
 
     # -------- Internals --------
-    def _append(self, ev: Dict[str, Any]):
-        with self.lock:
-            self.buf.append(ev)
-
     def _writer_loop(self):
         while not self.stop_evt.is_set():
-            time.sleep(FLUSH_INTERVAL_SEC)
+            self.flush_evt.wait(FLUSH_INTERVAL_SEC)
+            self.flush_evt.clear()
             self.flush()
+            self.telemetry.maybe_emit()
+
+    def _drain(self):
+        """
+        Both rings → one batch of EVENT_DTYPE records in time order, its name list, and
+        per ring the type codes drained (before decimation, for telemetry).
+        """
+        names: list = []
+        parts = []
+        drained = {}
+        for key, ring in (("key", self.key_ring), ("mouse", self.mouse_ring)):
+            rec, local = ring.drain()
+            drained[key] = rec["type"]
+            if ring is self.mouse_ring and len(rec):
+                rec = rec[self.decimator.mask(rec["t"], rec["x"], rec["y"], rec["type"] == MOUSE_MOVE)]
+            if len(rec) and local:
+                rec["btn"] = remap_codes(rec["btn"], local, names)
+                rec["special"] = remap_codes(rec["special"], local, names)
+            parts.append(rec)
+        batch = np.concatenate(parts)
+        return batch[np.argsort(batch["t"], kind="stable")], names, drained
 
     def flush(self):
-        with self.lock:
-            if not self.buf:
-                return
-            batch = list(self.buf)
-            self.buf.clear()
+        with self.flush_lock:
+            t0 = time.perf_counter()
+            drained_at = now_ms()   # events still in the rings are stamped after this (give or take)
+            batch, names, drained = self._drain()
+            if self.dropped > self._dropped_reported:
+                print(f"[logger] WARNING: buffer full, {self.dropped - self._dropped_reported} events dropped",
+                      file=sys.stderr)
+                self._dropped_reported = self.dropped
+            write_s = nbytes = 0
+            if len(batch):
+                t1 = time.perf_counter()
+                nbytes = self._write(batch, names)
+                write_s = time.perf_counter() - t1
+            self.telemetry.record_flush(drained, batch["type"], time.perf_counter() - t0, write_s, nbytes)
+            if self.live is not None:
+                # After the write: rows the live engine emits are already backed by the log
+                self.live.feed(batch)
+                self.live.advance(drained_at)
 
-        with open(self.out_path, "a", encoding="utf-8") as f:
-            for ev in batch:
-                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    def _write(self, batch, names) -> int:
+        """Append one batch (a single write call); returns the bytes it added."""
+        if self.binary:
+            size = os.path.getsize(self.out_path) if os.path.exists(self.out_path) else 0
+            append_records(self.out_path, batch, names)
+            return os.path.getsize(self.out_path) - size
+        data = "".join(json.dumps(ev, ensure_ascii=False) + "\n"
+                       for ev in decode_events(batch, names)).encode("utf-8")
+        if self.segments is not None:
+            return self.segments.write_batch(data, int(batch["t"][0]), int(batch["t"][-1]), len(batch))
+        if self._fh is None:
+            self._fh = open(self.out_path, "ab", buffering=WRITE_BUFFER)
+        self._fh.write(data)
+        self._fh.flush()   # readers (incremental features) see whole batches
+        return len(data)
 
     # -------- Lifecycle --------
     def run(self):
-        print(f"[logger] Writing NDJSON to: {self.out_path}")
+        print(f"[logger] Writing {'binary' if self.binary else 'segmented NDJSON' if self.segments else 'NDJSON'}"
+              f" to: {self.out_path}")
         print("[logger] Press Ctrl+C to stop.")
+        # Feature builds must know which logs are decimated (jerk does not survive it)
+        save_decimation(self.out_path, self.decimate, self.decimate_param)
+        if self.metrics is not None:
+            self.metrics.start()
         self.writer_thread.start()
 
         with keyboard.Listener(on_press=self.on_key_press) as kl, \
@@ -112,13 +213,73 @@ class EventLogger:
 
     def stop(self):
         self.stop_evt.set()
+        self.flush_evt.set()
         self.flush()
-        print("[logger] Stopped and flushed remaining events.")
+        if self.live is not None:
+            with self.flush_lock:
+                self.live.finish()
+        with self.flush_lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if self.segments is not None:
+                self.segments.close()   # waits for the last segment's compression
+        self.telemetry.maybe_emit(force=True)
+        if self.metrics is not None:
+            self.metrics.stop()
+        print(f"[logger] Stopped and flushed remaining events ({self.dropped} dropped).")
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=["ndjson", "bin"], default=RAW_FORMAT,
+                        help="Raw event file format (default: %(default)s)")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICY,
+                        help="What to do when the buffer fills between flushes (default: %(default)s)")
+    parser.add_argument("--decimate", choices=DECIMATE_MODES, default=DECIMATE_MODE,
+                        help="Mouse-move decimation before storage (default: %(default)s)")
+    parser.add_argument("--decimate-param", type=param_arg, default=DECIMATE_PARAM,
+                        help="ms per kept move (rate) or px of path (distance), >= 1")
+    parser.add_argument("--live", action="store_true",
+                        help="Compute window features in-process and print each one as it closes")
+    parser.add_argument("--ingest", metavar="HOST:PORT",
+                        help="Also stream each flushed batch to an ingest server (python -m src.inference.ingest)")
+    parser.add_argument("--user", default=os.environ.get("USER") or os.environ.get("USERNAME"),
+                        help="With --ingest: the name this session streams under (default: login name)")
+    parser.add_argument("--segments", action="store_true",
+                        help="NDJSON as a directory of rotated, compressed segments with a time index")
+    parser.add_argument("--segment-mb", type=float, default=SEGMENT_MAX_BYTES / 2**20,
+                        help="With --segments: rotate past this size (default: %(default)s)")
+    parser.add_argument("--segment-min", type=float, default=SEGMENT_MAX_SEC / 60,
+                        help="With --segments: rotate after this many minutes (default: %(default)s)")
+    parser.add_argument("--compress", choices=COMPRESS_MODES, default="gzip",
+                        help="With --segments: how closed segments are compressed (default: %(default)s)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve capture telemetry read-only at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--telemetry-interval", type=float, default=TELEMETRY_INTERVAL_SEC,
+                        help="Seconds per summary record in data/logs/capture_<stamp>.ndjson")
+    args = parser.parse_args()
+    if args.segments and args.format == "bin":
+        parser.error("--segments writes NDJSON segments; drop --format bin")
+    if args.ingest and args.live:
+        parser.error("--live and --ingest both take the flushed batches; pick one")
+    if args.ingest and not args.user:
+        parser.error("--ingest needs --user")
     try:
-        out_path = make_raw_path()
-        EventLogger(out_path).run()
+        out_path = make_raw_path(args.format, args.segments)
+        segments = (SegmentWriter(out_path, int(args.segment_mb * 2**20), args.segment_min * 60, args.compress)
+                    if args.segments else None)
+        live = None
+        if args.live:
+            from src.inference.livefeatures import LiveFeatures
+            live = LiveFeatures(on_window=lambda row: print(f"[live] {json.dumps(row)}"))
+        elif args.ingest:
+            from src.inference.ingest import IngestClient
+            host, _, port = args.ingest.rpartition(":")
+            live = IngestClient(args.user, host or "127.0.0.1", int(port))
+        EventLogger(out_path, policy=args.overflow, decimate=args.decimate,
+                    decimate_param=args.decimate_param, live=live,
+                    telemetry_interval=args.telemetry_interval, metrics_port=args.metrics_port,
+                    segments=segments).run()
     except Exception as e:
         print(f"[logger] ERROR: {e}", file=sys.stderr)
         if sys.platform == "darwin":
@@ -126,4 +287,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
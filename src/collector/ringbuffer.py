@@ -0,0 +1,147 @@
+# src/collector/ringbuffer.py
+# Preallocated columnar ring buffer for the capture hot path.
+# - One producer (a pynput listener thread) and one consumer (the writer thread)
+# - push_* only stores the columns its event type uses and bumps `head`; no lock,
+#   no dict, no per-event allocation beyond the timestamp itself
+# - drain() copies [tail, head) out as EVENT_DTYPE records and advances `tail`
+# - When full: "drop" counts and discards the new event, "flush" also wakes the
+#   writer early, "grow" doubles the arrays (up to max_capacity) before dropping
+
+import threading
+from array import array
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.utils.io import EVENT_DTYPE, TYPE_CODES, OTHER_CODE, MAX_NAMES
+
+KEY_DOWN     = TYPE_CODES["key_down"]
+MOUSE_MOVE   = TYPE_CODES["mouse_move"]
+MOUSE_CLICK  = TYPE_CODES["mouse_click"]
+MOUSE_SCROLL = TYPE_CODES["mouse_scroll"]
+
+OVERFLOW_POLICIES = ("drop", "flush", "grow")
+
+# column name → array typecode (the names/types match EVENT_DTYPE; `name` holds
+# the btn or special code depending on the event type)
+_COLUMNS = {"t": "q", "type": "B", "x": "d", "y": "d", "dx": "d", "dy": "d", "flags": "B", "name": "B"}
+
+def _pow2(n: int) -> int:
+    return 1 << max(0, int(n) - 1).bit_length()
+
+class EventRing:
+    def __init__(self, capacity: int = 16384, policy: str = "flush", max_capacity: int = 1 << 20,
+                 early_flush_fraction: float = 0.5, on_pressure: Optional[Callable[[], None]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"policy must be one of {OVERFLOW_POLICIES}")
+        self.policy = policy
+        self.max_capacity = _pow2(max(capacity, max_capacity))
+        self.early_flush_fraction = early_flush_fraction
+        self.on_pressure = on_pressure
+        self.head = 0       # events written (producer only)
+        self.tail = 0       # events drained (consumer only)
+        self.dropped = 0
+        self.grown = 0
+        self.names: List[str] = []          # btn/special strings, code = index + 1
+        self._codes: Dict[str, int] = {}
+        self._resize_lock = threading.Lock()
+        self._alloc(_pow2(capacity))
+
+    def _alloc(self, capacity: int):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.pressure_mark = max(1, int(capacity * self.early_flush_fraction))
+        for c, code in _COLUMNS.items():
+            setattr(self, c, array(code, bytes(capacity * array(code).itemsize)))
+
+    def __len__(self) -> int:
+        return self.head - self.tail
+
+    # -------- Producer side --------
+    def name_code(self, s: str) -> int:
+        code = self._codes.get(s)
+        if code is None:
+            if len(self.names) >= MAX_NAMES:
+                return OTHER_CODE
+            self.names.append(s)
+            code = self._codes[s] = len(self.names)
+        return code
+
+    def _slot(self) -> int:
+        """Index to write the next event into, or -1 if it has to be dropped."""
+        head = self.head
+        used = head - self.tail
+        if used == self.pressure_mark and self.on_pressure is not None and self.policy != "drop":
+            self.on_pressure()
+        if used >= self.capacity and not self._make_room():
+            self.dropped += 1
+            return -1
+        return head & self.mask
+
+    def _make_room(self) -> bool:
+        if self.policy != "grow" or self.capacity >= self.max_capacity:
+            return False
+        with self._resize_lock:
+            live = np.arange(self.tail, self.head) & self.mask
+            old = {c: np.frombuffer(getattr(self, c), dtype=code)[live].copy() for c, code in _COLUMNS.items()}
+            base = self.tail
+            self._alloc(self.capacity * 2)
+            pos = (base + np.arange(len(live))) & self.mask
+            for c, code in _COLUMNS.items():
+                np.frombuffer(getattr(self, c), dtype=code)[pos] = old[c]
+            self.grown += 1
+        return True
+
+    def push_move(self, t: int, x: float, y: float):
+        i = self._slot()
+        if i < 0:
+            return
+        self.t[i] = t; self.type[i] = MOUSE_MOVE; self.x[i] = x; self.y[i] = y
+        self.head += 1
+
+    def push_click(self, t: int, x: float, y: float, name: int):
+        i = self._slot()
+        if i < 0:
+            return
+        self.t[i] = t; self.type[i] = MOUSE_CLICK; self.x[i] = x; self.y[i] = y; self.name[i] = name
+        self.head += 1
+
+    def push_scroll(self, t: int, x: float, y: float, dx: float, dy: float):
+        i = self._slot()
+        if i < 0:
+            return
+        self.t[i] = t; self.type[i] = MOUSE_SCROLL; self.x[i] = x; self.y[i] = y
+        self.dx[i] = dx; self.dy[i] = dy
+        self.head += 1
+
+    def push_key(self, t: int, flags: int, name: int):
+        i = self._slot()
+        if i < 0:
+            return
+        self.t[i] = t; self.type[i] = KEY_DOWN; self.flags[i] = flags; self.name[i] = name
+        self.head += 1
+
+    # -------- Consumer side --------
+    def drain(self) -> Tuple[np.ndarray, List[str]]:
+        """Take everything written so far → (EVENT_DTYPE records, names for their codes)."""
+        with self._resize_lock:
+            head, tail = self.head, self.tail
+            idx = np.arange(tail, head) & self.mask
+            cols = {c: np.frombuffer(getattr(self, c), dtype=code)[idx] for c, code in _COLUMNS.items()}
+            self.tail = head
+        names = list(self.names)
+
+        # Slots are reused, so columns an event type does not write hold stale values
+        typ = cols["type"]
+        pointer = typ != KEY_DOWN
+        scroll = typ == MOUSE_SCROLL
+        rec = np.empty(len(idx), dtype=EVENT_DTYPE)
+        rec["t"] = cols["t"]
+        rec["type"] = typ
+        rec["x"] = np.where(pointer, cols["x"], np.nan)
+        rec["y"] = np.where(pointer, cols["y"], np.nan)
+        rec["dx"] = np.where(scroll, cols["dx"], np.nan)
+        rec["dy"] = np.where(scroll, cols["dy"], np.nan)
+        rec["flags"] = np.where(typ == KEY_DOWN, cols["flags"], 0)
+        rec["special"] = np.where(typ == KEY_DOWN, cols["name"], 0)
+        rec["btn"] = np.where(typ == MOUSE_CLICK, cols["name"], 0)
+        return rec, names
@@ -0,0 +1,198 @@
+# src/collector/telemetry.py
+# Capture-side telemetry for EventLogger: is the logger keeping up?
+# - Listener callbacks: duration histograms in power-of-two ns buckets, one per
+#   callback kind. Each is written by its listener thread only (no locks), the hot
+#   path adds two clock reads and one array increment
+# - Per flush (writer thread): events captured / written by type, ring fill at drain
+#   (= its high-water mark since the previous flush; capacity alongside), drops,
+#   drain / write time and bytes written
+# - Every TELEMETRY_INTERVAL_SEC the interval's rates, percentiles and deltas are
+#   appended as one JSON line to data/logs/capture_<session>.ndjson
+# - MetricsServer: read-only GET /metrics (cumulative totals + last interval) on
+#   localhost, for a dashboard or a curl while the session runs
+#
+#   python -m src.collector.eventcapture --metrics-port 8766
+#   curl -s localhost:8766/metrics
+
+import os, json, time, threading
+from array import array
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+import numpy as np
+
+from src.utils.io import EVENT_TYPES
+
+TELEMETRY_INTERVAL_SEC = 60
+TELEMETRY_DIR = "data/logs"
+METRICS_HOST = "127.0.0.1"
+HIST_BUCKETS = 48               # bucket b holds durations in [2^(b-1), 2^b) ns
+FLUSH_SAMPLES = 1024            # recent flushes kept for percentiles
+CALLBACKS = ("key", "move", "click", "scroll")
+
+class Histogram:
+    """Log2 histogram of nanosecond durations; one writer thread, readers copy."""
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * HIST_BUCKETS))
+
+    def add(self, ns: int):
+        b = ns.bit_length()
+        self.counts[b if b < HIST_BUCKETS else HIST_BUCKETS - 1] += 1
+
+    def snapshot(self) -> np.ndarray:
+        return np.frombuffer(self.counts, dtype=np.uint64).astype(np.int64)   # a copy: the array keeps changing
+
+def summarize_hist(counts: np.ndarray) -> Dict[str, Any]:
+    """Count and p50 / p99 / max in µs (upper bound of the bucket they fall in)."""
+    n = int(counts.sum())
+    if n == 0:
+        return {"n": 0, "p50_us": None, "p99_us": None, "max_us": None}
+    upper_us = (2.0 ** np.arange(HIST_BUCKETS)) / 1e3
+    cum = np.cumsum(counts)
+    pct = lambda q: float(upper_us[int(np.searchsorted(cum, q * n))])
+    return {"n": n, "p50_us": pct(0.5), "p99_us": pct(0.99),
+            "max_us": float(upper_us[int(np.flatnonzero(counts)[-1])])}
+
+def _by_type(types: np.ndarray) -> np.ndarray:
+    return np.bincount(types, minlength=len(EVENT_TYPES) + 1)[1:len(EVENT_TYPES) + 1].astype(np.int64)
+
+class CaptureTelemetry:
+    def __init__(self, rings: Dict[str, Any], path: Optional[str] = None,
+                 interval_sec: float = TELEMETRY_INTERVAL_SEC):
+        self.rings = rings                       # name → EventRing (dropped / grown / capacity)
+        self.path = path
+        self.interval_sec = interval_sec
+        self.callbacks = {k: Histogram() for k in CALLBACKS}
+        self.lock = threading.Lock()             # writer thread vs metrics readers
+        self.started = time.time()
+        self.captured = np.zeros(len(EVENT_TYPES), dtype=np.int64)
+        self.written = np.zeros(len(EVENT_TYPES), dtype=np.int64)
+        self.bytes_written = 0
+        self.flushes = 0
+        self.high_water = {name: 0 for name in rings}
+        self.flush_ms: deque = deque(maxlen=FLUSH_SAMPLES)
+        self.write_ms: deque = deque(maxlen=FLUSH_SAMPLES)
+        self.last_interval: Optional[Dict[str, Any]] = None
+        self._mark = self._totals()
+        self._mark_time = time.monotonic()
+
+    # -------- Writer thread --------
+    def record_flush(self, drained: Dict[str, np.ndarray], written: np.ndarray,
+                     flush_s: float, write_s: float, nbytes: int):
+        """drained: ring name → the type codes it gave up this flush (before decimation)."""
+        with self.lock:
+            for name, types in drained.items():
+                self.captured += _by_type(types)
+                self.high_water[name] = max(self.high_water[name], len(types))
+            self.written += _by_type(written)
+            self.bytes_written += nbytes
+            self.flushes += 1
+            self.flush_ms.append(flush_s * 1e3)
+            self.write_ms.append(write_s * 1e3)
+
+    def maybe_emit(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Close the interval if it is due (or force): summary → last_interval and the log."""
+        now = time.monotonic()
+        if not force and now - self._mark_time < self.interval_sec:
+            return None
+        with self.lock:
+            totals = self._totals()
+            prev, self._mark = self._mark, totals
+            n_new = min(totals["flushes"] - prev["flushes"], len(self.flush_ms))
+            flush_ms = np.array(list(self.flush_ms)[-n_new:] if n_new else [])
+            write_ms = np.array(list(self.write_ms)[-n_new:] if n_new else [])
+        secs = max(now - self._mark_time, 1e-9)
+        self._mark_time = now
+        rec = {"t": int(time.time() * 1000), "interval_s": round(secs, 3),
+               "events_per_s": {t: (totals["captured"][t] - prev["captured"][t]) / secs for t in EVENT_TYPES},
+               "written_per_s": {t: (totals["written"][t] - prev["written"][t]) / secs for t in EVENT_TYPES},
+               "callbacks": {k: summarize_hist(totals["callbacks"][k] - prev["callbacks"][k]) for k in CALLBACKS},
+               "flushes": totals["flushes"] - prev["flushes"],
+               "flush_ms": _pcts(flush_ms), "write_ms": _pcts(write_ms),
+               "bytes_written": totals["bytes_written"] - prev["bytes_written"],
+               "dropped": {r: totals["dropped"][r] - prev["dropped"][r] for r in self.rings},
+               "buffer": self._buffers()}
+        with self.lock:
+            self.last_interval = rec
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+        return rec
+
+    # -------- Readers --------
+    def _totals(self) -> Dict[str, Any]:
+        return {"captured": dict(zip(EVENT_TYPES, self.captured.tolist())),
+                "written": dict(zip(EVENT_TYPES, self.written.tolist())),
+                "callbacks": {k: h.snapshot() for k, h in self.callbacks.items()},
+                "dropped": {name: ring.dropped for name, ring in self.rings.items()},
+                "bytes_written": self.bytes_written, "flushes": self.flushes}
+
+    def _buffers(self) -> Dict[str, Any]:
+        return {name: {"capacity": ring.capacity, "high_water": self.high_water[name],
+                       "high_water_frac": self.high_water[name] / ring.capacity,
+                       "in_use": len(ring), "grown": ring.grown} for name, ring in self.rings.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative totals since start + the last closed interval (what /metrics serves)."""
+        with self.lock:
+            t = self._totals()
+            out = {"uptime_s": time.time() - self.started,
+                   "captured": t["captured"], "written": t["written"],
+                   "callbacks": {k: summarize_hist(v) for k, v in t["callbacks"].items()},
+                   "flushes": t["flushes"], "flush_ms": _pcts(np.array(self.flush_ms)),
+                   "write_ms": _pcts(np.array(self.write_ms)), "bytes_written": t["bytes_written"],
+                   "dropped": t["dropped"], "buffer": self._buffers(), "last_interval": self.last_interval}
+        return out
+
+def _pcts(a: np.ndarray) -> Optional[Dict[str, float]]:
+    if not a.size:
+        return None
+    return {"p50": float(np.percentile(a, 50)), "p99": float(np.percentile(a, 99)), "max": float(a.max())}
+
+# ----------------- Read-only endpoint -----------------
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, telemetry: CaptureTelemetry, port: int, host: str = METRICS_HOST):
+        super().__init__((host, port), _MetricsHandler)
+        self.telemetry = telemetry
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def start(self) -> "MetricsServer":
+        self.thread.start()
+        print(f"[logger] Metrics on http://{self.server_address[0]}:{self.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: MetricsServer
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.server.telemetry.snapshot())
+        elif self.path == "/health":
+            self._send(200, {"ok": True})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):   # read-only
+        self._send(405, {"error": "read-only"})
+
+    do_PUT = do_DELETE = do_POST
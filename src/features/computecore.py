@@ -3,8 +3,8 @@
 
 import numpy as np
 import pandas as pd
-from math import pi, sin, cos
-from typing import Tuple, List
+from math import pi, sin, cos, isnan, nan
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 FEATURE_COLUMNS: List[str] = [
     "window_id","t_start","t_end",
@@ -13,12 +13,70 @@ FEATURE_COLUMNS: List[str] = [
     "move_events","mouse_speed_mean","mouse_speed_std","mouse_jerk_mean",
     "idle_ratio","clicks","scrolls","tod_sin","tod_cos"
 ]
+# Bumped whenever a feature's values change for the same events; train.py stamps it into
+# metrics.json and inference refuses models trained on another version.
+#   1: mouse_speed_* / mouse_jerk_mean NaN (→ 0) on every NDJSON log (mv.dropna())
+#   2: mouse features from every move pair with a diff
+FEATURE_VERSION = 2
 
 def _tod_features(ts_ms: int) -> Tuple[float, float]:
     seconds = (ts_ms // 1000) % 86400
     theta = 2 * pi * (seconds / 86400.0)
     return sin(theta), cos(theta)
 
+# ----------------- Segment reductions -----------------
+# Events are stably sorted by window_id, so each window is a contiguous segment
+# of every typed column array and each feature is one reduction per segment.
+# Float sums stack equal-length segments into a 2-D block and reduce row-wise:
+# that keeps numpy's pairwise summation order, so results are bit-identical to
+# np.mean/np.std/np.nanmean on each window's slice (np.add.reduceat is not).
+
+def _segment_bounds(seg: np.ndarray, n_seg: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(starts, counts) for segment ids 0..n_seg-1 of a sorted id array."""
+    counts = np.bincount(seg, minlength=n_seg)
+    starts = np.zeros(n_seg, dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return starts, counts
+
+def _segment_sum(values: np.ndarray, seg: np.ndarray, n_seg: int) -> np.ndarray:
+    """Per-segment np.sum(values[segment]); empty segments → 0.0."""
+    starts, counts = _segment_bounds(seg, n_seg)
+    out = np.zeros(n_seg, dtype=float)
+    for length in np.unique(counts):
+        if length == 0:
+            continue
+        sel = np.flatnonzero(counts == length)
+        out[sel] = values[starts[sel, None] + np.arange(length)].sum(axis=1)
+    return out
+
+def _same_segment(seg: np.ndarray) -> np.ndarray:
+    """Mask over pairs (i-1, i): True where both events fall in the same segment."""
+    return seg[1:] == seg[:-1]
+
+def _segment_mean_std(values: np.ndarray, seg: np.ndarray, n_seg: int) -> Tuple[np.ndarray, np.ndarray]:
+    """np.mean / np.std(ddof=0) per segment; NaN for empty segments."""
+    counts = np.bincount(seg, minlength=n_seg)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _segment_sum(values, seg, n_seg) / counts
+        dev = values - mean[seg]
+        std = np.sqrt(_segment_sum(dev * dev, seg, n_seg) / counts)
+    return mean, std
+
+def _segment_nanmean(values: np.ndarray, seg: np.ndarray, n_seg: int) -> np.ndarray:
+    """np.nanmean per segment (NaNs summed as 0, not counted)."""
+    nan = np.isnan(values)
+    counts = np.bincount(seg[~nan], minlength=n_seg)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _segment_sum(np.where(nan, 0.0, values), seg, n_seg) / counts
+
+def _segment_nanstd(values: np.ndarray, seg: np.ndarray, n_seg: int, mean: np.ndarray) -> np.ndarray:
+    """np.nanstd(ddof=0) per segment given its nanmean."""
+    nan = np.isnan(values)
+    counts = np.bincount(seg[~nan], minlength=n_seg)
+    dev = np.where(nan, 0.0, values - mean[seg])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(_segment_sum(dev * dev, seg, n_seg) / counts)
+
 def compute_window_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Expects df columns: t,type,x,y,dx,dy,is_backspace,special,window_id
@@ -26,75 +84,662 @@ def compute_window_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     if df.empty:
         return pd.DataFrame(columns=FEATURE_COLUMNS)
+    if df["window_id"].isna().any():  # groupby drops NaN keys
+        df = df[df["window_id"].notna()]
+        if df.empty:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+    # Stable sort keeps each window's rows in their original order (as groupby does);
+    # frames from read_ndjson are already in window order and skip the gather.
+    wid = df["window_id"].to_numpy()
+    if (wid[1:] >= wid[:-1]).all():
+        order = slice(None)
+    else:
+        order = np.argsort(wid, kind="stable")
+        wid = wid[order]
+    first = np.empty(len(wid), dtype=bool)
+    first[0] = True
+    np.not_equal(wid[1:], wid[:-1], out=first[1:])
+    seg = np.cumsum(first) - 1
+    n = int(seg[-1]) + 1
+
+    t = df["t"].astype("int64").to_numpy()[order]
+    starts, _ = _segment_bounds(seg, n)
+    t_start = np.minimum.reduceat(t, starts)
+    t_end   = np.maximum.reduceat(t, starts)
+
+    # Compare event types once as integer codes rather than per-row strings
+    codes, names = pd.factorize(df["type"])
+    def type_mask(name: str) -> np.ndarray:
+        hit = np.flatnonzero(names == name)
+        return codes == hit[0] if hit.size else np.zeros(len(codes), dtype=bool)
+    key_mask  = type_mask("key_down")
+    move_mask = type_mask("mouse_move")
+
+    # --- Keyboard features ---
+    is_backspace = np.zeros(len(df), dtype=bool)
+    is_backspace[key_mask] = df.loc[key_mask, "is_backspace"].fillna(False).astype(bool).to_numpy()
+    is_key = key_mask[order]
+    kseg = seg[is_key]
+    keys_total = np.bincount(kseg, minlength=n)
+    backspace = np.bincount(seg[is_key & is_backspace[order]], minlength=n)
+    correction_rate = np.where(keys_total > 0, backspace / np.maximum(keys_total, 1), 0.0)
+
+    kt = t[is_key]
+    same = _same_segment(kseg)
+    ikis = (kt[1:] - kt[:-1])[same].astype(float)
+    avg_iki, iki_std = _segment_mean_std(ikis, kseg[1:][same], n)
+
+    # --- Mouse dynamics ---
+    # Per-window diffs over move rows; the first move of a window has none. Only
+    # rows without a diff are dropped: sparse columns (btn, special, ...) are NA on
+    # every move row and must not discard them.
+    x = np.full(len(df), np.nan)
+    y = np.full(len(df), np.nan)
+    x[move_mask] = df.loc[move_mask, "x"].astype(float).to_numpy()
+    y[move_mask] = df.loc[move_mask, "y"].astype(float).to_numpy()
+
+    is_move = move_mask[order]
+    mseg = seg[is_move]
+    move_events = np.bincount(mseg, minlength=n)
+    mx, my, mt = x[order][is_move], y[order][is_move], t[is_move]
+    dx = mx[1:] - mx[:-1]
+    dy = my[1:] - my[:-1]
+    dt = (mt[1:] - mt[:-1]) / 1000.0  # seconds
+    keep = _same_segment(mseg) & ~np.isnan(dx) & ~np.isnan(dy)
+    dx, dy, dt, sseg = dx[keep], dy[keep], dt[keep], mseg[1:][keep]
+
+    dist = np.sqrt(dx**2 + dy**2)
+    dt = np.where(dt == 0, np.nan, dt)
+    speed = dist / dt
+    mouse_speed_mean = _segment_nanmean(speed, sseg, n)
+    mouse_speed_std  = _segment_nanstd(speed, sseg, n, mouse_speed_mean)
+
+    same = _same_segment(sseg)
+    accel = (speed[1:] - speed[:-1]) / dt[1:]  # aligned
+    triple = same[1:] & same[:-1]
+    jerk = (accel[1:] - accel[:-1])[triple]
+    mouse_jerk_mean = _segment_nanmean(np.abs(jerk), sseg[2:][triple], n)
+
+    # Idle ratio via gaps in any events (>2s)
+    gaps = np.where(_same_segment(seg), t[1:] - t[:-1], 0) / 1000.0
+    idle = gaps > 2.0
+    idle_seconds = _segment_sum(gaps[idle], seg[1:][idle], n)
+    idle_ratio = np.maximum(0.0, np.minimum(1.0, idle_seconds / 60.0))
+
+    clicks  = np.bincount(seg[type_mask("mouse_click")[order]], minlength=n)
+    scrolls = np.bincount(seg[type_mask("mouse_scroll")[order]], minlength=n)
+
+    # Time-of-day from window midpoint
+    mid_ts = (t_start + t_end) // 2
+    tod = np.array([_tod_features(ts) for ts in mid_ts.tolist()], dtype=float).reshape(-1, 2)
+
+    return pd.DataFrame({
+        "window_id": wid[first].astype("int64"),
+        "t_start": t_start, "t_end": t_end,
+        "keys_total": keys_total,
+        "backspace": backspace,
+        "correction_rate": correction_rate,
+        "avg_iki": avg_iki,
+        "iki_std": iki_std,
+        "move_events": move_events,
+        "mouse_speed_mean": mouse_speed_mean,
+        "mouse_speed_std": mouse_speed_std,
+        "mouse_jerk_mean": mouse_jerk_mean,
+        "idle_ratio": idle_ratio,
+        "clicks": clicks, "scrolls": scrolls,
+        "tod_sin": tod[:, 0],
+        "tod_cos": tod[:, 1],
+    }, columns=FEATURE_COLUMNS)
+
+# ----------------- Sliding windows -----------------
+# Overlapping windows [t0 + k*hop, t0 + k*hop + window_ms). Every per-window quantity is
+# a sum over a contiguous index range of a per-type array (keys, move pairs, jerk
+# triples, gaps), so one prefix sum per quantity serves all windows: cost is
+# O(events + windows * log events) whatever the overlap. Integer sums (counts, IKIs,
+# idle ms) are exact, so are t_start/t_end, tod and avg_iki; the mouse means and std are
+# combined from per-piece two-pass reductions (_range_nan_stats). Every float feature
+# matches compute_window_features on the window's slice within SLIDING_RTOL of the value,
+# of the matching mean for iki_std / mouse_speed_std (a std of 0 may come out ~1e-16 *
+# mean). benchmarks/sliding_features.py checks it.
+SLIDING_RTOL = 1e-12
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(values) + 1, dtype=np.result_type(values.dtype, np.int64))
+    np.cumsum(values, out=out[1:])
+    return out
+
+def _range_nan_stats(values: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                     with_std: bool = True) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    nanmean / nanstd(ddof=0) (None unless with_std) / non-NaN count of values[lo:hi] for
+    each window.
+    The range ends cut values into pieces that each window covers whole; every piece is
+    reduced once, two-pass as in _segment_mean_std, and a window combines its pieces with
+    Chan's update (M2 = sum M2_p + sum n_p (mean_p - mean)^2). No sum is ever differenced,
+    so a window of equal values gets std 0 and the error stays ~1e-15 of the window mean.
+    """
+    n_v = len(values)
+    lo = np.minimum(lo, n_v)
+    hi = np.clip(hi, lo, n_v)
+    cuts = np.unique(np.concatenate([lo, hi, [0, n_v]]))
+    n_p = len(cuts) - 1
+    piece = np.repeat(np.arange(n_p), np.diff(cuts))
+    ok = ~np.isnan(values)
+    cnt_p = np.bincount(piece[ok], minlength=n_p)
+    sum_p = _segment_sum(np.where(ok, values, 0.0), piece, n_p)
+    mean_p = np.where(cnt_p > 0, sum_p / np.maximum(cnt_p, 1), 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # pieces first..last-1 of each window, padded with an empty piece n_p
+        first, last = np.searchsorted(cuts, lo), np.searchsorted(cuts, hi)
+        span = int((last - first).max()) if len(lo) else 0
+        idx = first[:, None] + np.arange(span)
+        idx[idx >= last[:, None]] = n_p
+        c = np.append(cnt_p, 0)[idx]
+        cnt = c.sum(axis=1)
+        mean = np.append(sum_p, 0.0)[idx].sum(axis=1) / cnt
+        if not with_std:
+            return mean, None, cnt
+        dev = np.where(ok, values - mean_p[piece], 0.0)
+        m2_p = np.append(_segment_sum(dev * dev, piece, n_p), 0.0)
+        d = np.append(mean_p, 0.0)[idx] - mean[:, None]
+        m2 = m2_p[idx].sum(axis=1) + (c * d * d).sum(axis=1)
+        return mean, np.sqrt(m2 / cnt), cnt
+
+def compute_sliding_features(df: pd.DataFrame, window_ms: int = 60_000, hop_ms: int = 5_000,
+                             base_ts_ms: Optional[int] = None) -> pd.DataFrame:
+    """
+    Features for overlapping windows of width window_ms every hop_ms (window_id = k for the
+    window starting at t0 + k*hop_ms; t0 = base_ts_ms or the first event). Same columns
+    and per-window values as compute_window_features on each window's events up to float
+    rounding: within SLIDING_RTOL relative (for iki_std / mouse_speed_std, relative to
+    avg_iki / mouse_speed_mean). Windows without events are omitted. hop_ms == window_ms
+    gives the tumbling windows.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    t_all = df["t"].astype("int64").to_numpy()
+    order = slice(None) if (t_all[1:] >= t_all[:-1]).all() else np.argsort(t_all, kind="stable")
+    t = t_all[order]
+    t0 = int(t[0]) if base_ts_ms is None else int(base_ts_ms)
+    k_lo = 0 if base_ts_ms is None else -((t0 + window_ms - 1 - int(t[0])) // hop_ms)
+    k = np.arange(k_lo, (int(t[-1]) - t0) // hop_ms + 1, dtype=np.int64)
+    starts = t0 + k * hop_ms
+    ends = starts + window_ms
+    e_lo = np.searchsorted(t, starts, side="left")
+    e_hi = np.searchsorted(t, ends, side="left")
+    has = e_hi > e_lo
+    k, starts, ends, e_lo, e_hi = k[has], starts[has], ends[has], e_lo[has], e_hi[has]
+
+    codes, names = pd.factorize(df["type"])
+    def type_mask(name: str) -> np.ndarray:   # in df row order, like compute_window_features
+        hit = np.flatnonzero(names == name)
+        return codes == hit[0] if hit.size else np.zeros(len(codes), dtype=bool)
+    def bounds(ts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return np.searchsorted(ts, starts, side="left"), np.searchsorted(ts, ends, side="left")
+    def count(mask: np.ndarray) -> np.ndarray:
+        lo, hi = bounds(t[mask[order]])
+        return hi - lo
+
+    # --- Keyboard: counts, backspaces, IKIs of consecutive keys (integers → exact sums) ---
+    is_key = type_mask("key_down")[order]
+    kt = t[is_key]
+    k_lo_i, k_hi_i = bounds(kt)
+    keys_total = k_hi_i - k_lo_i
+    key_mask = type_mask("key_down")
+    is_backspace = np.zeros(len(df), dtype=bool)
+    is_backspace[key_mask] = df.loc[key_mask, "is_backspace"].fillna(False).astype(bool).to_numpy()
+    p_bs = _prefix(is_backspace[order][is_key].astype(np.int64))
+    backspace = p_bs[k_hi_i] - p_bs[k_lo_i]
+    correction_rate = np.where(keys_total > 0, backspace / np.maximum(keys_total, 1), 0.0)
+
+    ikis = np.diff(kt)
+    ikis = np.where(ikis < window_ms, ikis, 0)   # longer gaps never fall inside one window
+    p1, p2 = _prefix(ikis), _prefix(ikis * ikis)
+    i_lo = np.minimum(k_lo_i, len(ikis))
+    i_hi = np.maximum(k_hi_i - 1, i_lo)
+    n_iki = i_hi - i_lo
+    s1 = (p1[i_hi] - p1[i_lo]).astype(float)    # integer sums: exact below 2**53
+    s2 = (p2[i_hi] - p2[i_lo]).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_iki = s1 / n_iki
+        # n^2 var = n s2 - s1^2 with no rounding before the subtraction: equal IKIs give 0
+        iki_std = np.sqrt(np.maximum(n_iki * s2 - s1 * s1, 0.0)) / n_iki
+
+    # --- Mouse: move pairs and jerk triples as global sequences ---
+    move_mask = type_mask("mouse_move")
+    x = np.full(len(df), np.nan)
+    y = np.full(len(df), np.nan)
+    x[move_mask] = df.loc[move_mask, "x"].astype(float).to_numpy()
+    y[move_mask] = df.loc[move_mask, "y"].astype(float).to_numpy()
+    is_move = move_mask[order]
+    mt = t[is_move]
+    m_lo, m_hi = bounds(mt)
+    move_events = m_hi - m_lo
+    mx, my = x[order][is_move], y[order][is_move]
+    dx, dy = np.diff(mx), np.diff(my)
+    dt = np.diff(mt) / 1000.0
+    kept = np.flatnonzero(~np.isnan(dx) & ~np.isnan(dy))        # pair p = moves (p, p+1)
+    dx, dy, dt = dx[kept], dy[kept], dt[kept]
+    dt = np.where(dt == 0, np.nan, dt)
+    speed = np.sqrt(dx**2 + dy**2) / dt
+    # kept pairs inside window: pair p with m_lo <= p and p + 1 < m_hi
+    q_lo = np.searchsorted(kept, m_lo, side="left")
+    q_hi = np.searchsorted(kept, np.maximum(m_hi - 1, m_lo), side="left")
+    mouse_speed_mean, mouse_speed_std, _ = _range_nan_stats(speed, q_lo, q_hi)
+    accel = (speed[1:] - speed[:-1]) / dt[1:]
+    jerk = np.abs(accel[1:] - accel[:-1])                        # triple j = kept pairs j..j+2
+    mouse_jerk_mean, _, _ = _range_nan_stats(jerk, q_lo, np.maximum(q_hi - 2, q_lo), with_std=False)
+
+    # --- Idle: gaps > 2 s between consecutive events of the window ---
+    gaps = np.diff(t)
+    idle_ms = _prefix(np.where((gaps > 2000) & (gaps < window_ms), gaps, 0))
+    idle_seconds = (idle_ms[e_hi - 1] - idle_ms[e_lo]) / 1000.0
+    idle_ratio = np.maximum(0.0, np.minimum(1.0, idle_seconds / 60.0))
+
+    clicks  = count(type_mask("mouse_click"))
+    scrolls = count(type_mask("mouse_scroll"))
+
+    t_start, t_end = t[e_lo], t[e_hi - 1]
+    mid_ts = (t_start + t_end) // 2
+    tod = np.array([_tod_features(ts) for ts in mid_ts.tolist()], dtype=float).reshape(-1, 2)
+
+    return pd.DataFrame({
+        "window_id": k,
+        "t_start": t_start, "t_end": t_end,
+        "keys_total": keys_total,
+        "backspace": backspace,
+        "correction_rate": correction_rate,
+        "avg_iki": avg_iki,
+        "iki_std": iki_std,
+        "move_events": move_events,
+        "mouse_speed_mean": mouse_speed_mean,
+        "mouse_speed_std": mouse_speed_std,
+        "mouse_jerk_mean": mouse_jerk_mean,
+        "idle_ratio": idle_ratio,
+        "clicks": clicks, "scrolls": scrolls,
+        "tod_sin": tod[:, 0],
+        "tod_cos": tod[:, 1],
+    }, columns=FEATURE_COLUMNS)
 
+# ----------------- Mergeable window states -----------------
+# A window's state holds additive moments (counts, sums, sums of squares) plus what
+# sits at its edges: first/last event, key and move, and its first/last two kept move
+# pairs (speed, dt). Merging two adjacent states adds the moments and the terms that
+# straddle the seam (one IKI, one move pair, up to three jerk triples, one idle gap),
+# so 5- and 15-minute windows come from 1-minute states without re-reading raw events.
+# Features of a merged state equal compute_window_features over the combined events
+# (time-ordered, as logs are) within STATE_RTOL, except idle_ratio (idle time over the
+# merged span, not 60 s). Counts and avg_iki are exact; a std is sqrt(sum_sq / n - mean^2)
+# and near 0 keeps only ~1e-8 of the mean, so the std columns are held to STATE_RTOL of
+# the matching mean. benchmarks/window_states.py checks it.
+STATE_RTOL = 1e-7
+
+STATE_COLUMNS: List[str] = [
+    "window_id","t_start","t_end","ev_first_t","ev_last_t",
+    "keys_total","backspace","key_first_t","key_last_t","n_iki","iki_sum","iki_sq",
+    "move_events","move_first_t","move_first_x","move_first_y","move_last_t","move_last_x","move_last_y",
+    "n_pairs","head_s0","head_dt0","head_s1","head_dt1","tail_s0","tail_dt0","tail_s1","tail_dt1",
+    "n_speed","speed_sum","speed_sq","n_jerk","jerk_sum","idle_ms","clicks","scrolls"
+]
+MULTISCALE_COLUMNS: List[str] = [
+    "keys_total","backspace","correction_rate","avg_iki","iki_std",
+    "move_events","mouse_speed_mean","mouse_speed_std","mouse_jerk_mean","idle_ratio","clicks","scrolls"
+]
+
+def _edges(values: np.ndarray, seg: np.ndarray, n_seg: int, fill=0) -> Tuple[np.ndarray, ...]:
+    """(first, second, second-to-last, last) value of each segment; fill where too short."""
+    starts, counts = _segment_bounds(seg, n_seg)
     out = []
-    for wid, chunk in df.groupby("window_id", sort=True):
-        if chunk.empty:
-            continue
-        t_start = int(chunk["t"].min())
-        t_end   = int(chunk["t"].max())
-        # --- Keyboard features ---
-        k = chunk[chunk["type"] == "key_down"].copy()
-        keys_total = int(len(k))
-        backspace = int(k["is_backspace"].fillna(False).astype(bool).sum())
-        correction_rate = (backspace / keys_total) if keys_total > 0 else 0.0
-
-        if keys_total >= 2:
-            ikis = k["t"].astype("int64").diff().dropna().to_numpy(dtype=float)
-            avg_iki = float(np.mean(ikis))
-            iki_std = float(np.std(ikis, ddof=0))
-        else:
-            avg_iki, iki_std = float("nan"), float("nan")
-
-        # --- Mouse dynamics ---
-        mv = chunk[chunk["type"] == "mouse_move"].copy()
-        move_events = int(len(mv))
-        mouse_speed_mean = float("nan")
-        mouse_speed_std  = float("nan")
-        mouse_jerk_mean  = float("nan")
-
-        if move_events >= 2:
-            mv["dx"] = mv["x"].astype(float).diff()
-            mv["dy"] = mv["y"].astype(float).diff()
-            mv["dt"] = mv["t"].astype("int64").diff() / 1000.0  # seconds
-            mv = mv.dropna()
-            dist = np.sqrt(mv["dx"].to_numpy()**2 + mv["dy"].to_numpy()**2)
-            dt = mv["dt"].replace(0, np.nan).to_numpy()
-            speed = dist / dt
-            mouse_speed_mean = float(np.nanmean(speed))
-            mouse_speed_std  = float(np.nanstd(speed, ddof=0))
-            accel = np.diff(speed) / dt[1:]  # aligned
-            jerk = np.diff(accel)
-            mouse_jerk_mean = float(np.nanmean(np.abs(jerk))) if jerk.size else float("nan")
-
-        # Idle ratio via gaps in any events (>2s)
-        gaps = chunk["t"].astype("int64").diff().fillna(0) / 1000.0
-        idle_seconds = float(np.sum(gaps[gaps > 2.0]))
-        idle_ratio = max(0.0, min(1.0, idle_seconds / 60.0))
-
-        clicks  = int((chunk["type"] == "mouse_click").sum())
-        scrolls = int((chunk["type"] == "mouse_scroll").sum())
-
-        # Time-of-day from window midpoint
-        mid_ts = (t_start + t_end) // 2
-        tod_s, tod_c = _tod_features(mid_ts)
-
-        out.append({
-            "window_id": int(wid),
-            "t_start": t_start, "t_end": t_end,
-            "keys_total": keys_total,
-            "backspace": backspace,
-            "correction_rate": float(correction_rate),
-            "avg_iki": float(avg_iki),
-            "iki_std": float(iki_std),
-            "move_events": move_events,
-            "mouse_speed_mean": mouse_speed_mean,
-            "mouse_speed_std": mouse_speed_std,
-            "mouse_jerk_mean": mouse_jerk_mean,
-            "idle_ratio": idle_ratio,
-            "clicks": clicks, "scrolls": scrolls,
-            "tod_sin": float(tod_s),
-            "tod_cos": float(tod_c),
+    for pos, need in ((starts, 1), (starts + 1, 2), (starts + counts - 2, 2), (starts + counts - 1, 1)):
+        ok = counts >= need
+        col = np.full(n_seg, fill, dtype=np.result_type(values.dtype, type(fill)))
+        col[ok] = values[pos[ok]]
+        out.append(col)
+    return tuple(out)
+
+def compute_window_states(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Same input as compute_window_features; one row of STATE_COLUMNS per window_id.
+    Turn into features with features_from_states, combine with merge_states.
+    """
+    if df.empty or df["window_id"].isna().all():
+        return pd.DataFrame(columns=STATE_COLUMNS)
+    df = df[df["window_id"].notna()]
+    wid = df["window_id"].to_numpy()
+    order = slice(None) if (wid[1:] >= wid[:-1]).all() else np.argsort(wid, kind="stable")
+    wid = wid[order]
+    first = np.empty(len(wid), dtype=bool)
+    first[0] = True
+    np.not_equal(wid[1:], wid[:-1], out=first[1:])
+    seg = np.cumsum(first) - 1
+    n = int(seg[-1]) + 1
+    count = lambda s, w=None: np.bincount(s, weights=w, minlength=n)
+
+    t = df["t"].astype("int64").to_numpy()[order]
+    starts, _ = _segment_bounds(seg, n)
+    ev_first_t, _, _, ev_last_t = _edges(t, seg, n)
+
+    codes, names = pd.factorize(df["type"])
+    def type_mask(name: str) -> np.ndarray:
+        hit = np.flatnonzero(names == name)
+        return codes == hit[0] if hit.size else np.zeros(len(codes), dtype=bool)
+    key_mask, move_mask = type_mask("key_down"), type_mask("mouse_move")
+
+    # Keys
+    is_backspace = np.zeros(len(df), dtype=bool)
+    is_backspace[key_mask] = df.loc[key_mask, "is_backspace"].fillna(False).astype(bool).to_numpy()
+    is_key = key_mask[order]
+    kseg, kt = seg[is_key], t[is_key]
+    same = _same_segment(kseg)
+    ikis = (kt[1:] - kt[:-1])[same].astype(float)
+    iseg = kseg[1:][same]
+    key_first_t, _, _, key_last_t = _edges(kt, kseg, n)
+
+    # Moves: kept pairs as in compute_window_features
+    x = np.full(len(df), np.nan)
+    y = np.full(len(df), np.nan)
+    x[move_mask] = df.loc[move_mask, "x"].astype(float).to_numpy()
+    y[move_mask] = df.loc[move_mask, "y"].astype(float).to_numpy()
+    is_move = move_mask[order]
+    mseg = seg[is_move]
+    mx, my, mt = x[order][is_move], y[order][is_move], t[is_move]
+    move_first_t, _, _, move_last_t = _edges(mt, mseg, n)
+    move_first_x, _, _, move_last_x = _edges(mx, mseg, n, np.nan)
+    move_first_y, _, _, move_last_y = _edges(my, mseg, n, np.nan)
+    dx, dy = mx[1:] - mx[:-1], my[1:] - my[:-1]
+    dt = (mt[1:] - mt[:-1]) / 1000.0
+    keep = _same_segment(mseg) & ~np.isnan(dx) & ~np.isnan(dy)
+    dx, dy, dt, sseg = dx[keep], dy[keep], dt[keep], mseg[1:][keep]
+    dt = np.where(dt == 0, np.nan, dt)
+    speed = np.sqrt(dx**2 + dy**2) / dt
+    head_s0, head_s1, tail_s0, tail_s1 = _edges(speed, sseg, n, np.nan)
+    head_dt0, head_dt1, tail_dt0, tail_dt1 = _edges(dt, sseg, n, np.nan)
+    ok = ~np.isnan(speed)
+    s_ok = np.where(ok, speed, 0.0)
+
+    same = _same_segment(sseg)
+    accel = (speed[1:] - speed[:-1]) / dt[1:]
+    triple = same[1:] & same[:-1]
+    jerk = np.abs(accel[1:] - accel[:-1])[triple]
+    jseg = sseg[2:][triple]
+    j_ok = ~np.isnan(jerk)
+
+    gaps = t[1:] - t[:-1]
+    idle = _same_segment(seg) & (gaps > 2000)
+
+    return pd.DataFrame({
+        "window_id": wid[first].astype("int64"),
+        "t_start": np.minimum.reduceat(t, starts), "t_end": np.maximum.reduceat(t, starts),
+        "ev_first_t": ev_first_t, "ev_last_t": ev_last_t,
+        "keys_total": count(kseg),
+        "backspace": count(seg[is_key & is_backspace[order]]).astype("int64"),
+        "key_first_t": key_first_t, "key_last_t": key_last_t,
+        "n_iki": count(iseg), "iki_sum": count(iseg, ikis), "iki_sq": count(iseg, ikis * ikis),
+        "move_events": count(mseg),
+        "move_first_t": move_first_t, "move_first_x": move_first_x, "move_first_y": move_first_y,
+        "move_last_t": move_last_t, "move_last_x": move_last_x, "move_last_y": move_last_y,
+        "n_pairs": count(sseg),
+        "head_s0": head_s0, "head_dt0": head_dt0, "head_s1": head_s1, "head_dt1": head_dt1,
+        "tail_s0": tail_s0, "tail_dt0": tail_dt0, "tail_s1": tail_s1, "tail_dt1": tail_dt1,
+        "n_speed": count(sseg[ok]), "speed_sum": count(sseg, s_ok), "speed_sq": count(sseg, s_ok * s_ok),
+        "n_jerk": count(jseg[j_ok]), "jerk_sum": count(jseg[j_ok], jerk[j_ok]),
+        "idle_ms": count(seg[1:][idle], gaps[idle]).astype("int64"),
+        "clicks": count(seg[type_mask("mouse_click")[order]]),
+        "scrolls": count(seg[type_mask("mouse_scroll")[order]]),
+    }, columns=STATE_COLUMNS)
+
+def _pairs(s: Dict[str, Any], head: bool) -> List[Tuple[float, float]]:
+    """The (speed, dt) of a state's first (head) or last two kept move pairs, in order."""
+    k = min(int(s["n_pairs"]), 2)
+    if head:
+        return [(s["head_s0"], s["head_dt0"]), (s["head_s1"], s["head_dt1"])][:k]
+    return [(s["tail_s0"], s["tail_dt0"]), (s["tail_s1"], s["tail_dt1"])][2 - k:]
+
+def merge_states(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """State of a's events followed by b's (b the later window); keeps a's window_id."""
+    out = dict(a)
+    for c in ("keys_total", "backspace", "n_iki", "iki_sum", "iki_sq", "move_events", "n_pairs",
+              "n_speed", "speed_sum", "speed_sq", "n_jerk", "jerk_sum", "idle_ms", "clicks", "scrolls"):
+        out[c] = a[c] + b[c]
+    out["t_start"], out["t_end"] = min(a["t_start"], b["t_start"]), max(a["t_end"], b["t_end"])
+    out["ev_last_t"] = b["ev_last_t"]
+    gap = b["ev_first_t"] - a["ev_last_t"]
+    if gap > 2000:
+        out["idle_ms"] += gap
+
+    if a["keys_total"] and b["keys_total"]:
+        iki = float(b["key_first_t"] - a["key_last_t"])
+        out["n_iki"] += 1
+        out["iki_sum"] += iki
+        out["iki_sq"] += iki * iki
+    if not a["keys_total"]:
+        out["key_first_t"] = b["key_first_t"]
+    if b["keys_total"]:
+        out["key_last_t"] = b["key_last_t"]
+
+    cross: List[Tuple[float, float]] = []
+    if a["move_events"] and b["move_events"]:
+        dx, dy = b["move_first_x"] - a["move_last_x"], b["move_first_y"] - a["move_last_y"]
+        if not (isnan(dx) or isnan(dy)):
+            dt = (b["move_first_t"] - a["move_last_t"]) / 1000.0
+            dt = nan if dt == 0 else dt
+            sp = np.sqrt(dx**2 + dy**2) / dt
+            cross = [(float(sp), dt)]
+            out["n_pairs"] += 1
+            if not isnan(sp):
+                out["n_speed"] += 1
+                out["speed_sum"] += sp
+                out["speed_sq"] += sp * sp
+    a_head, a_tail, b_head, b_tail = _pairs(a, True), _pairs(a, False), _pairs(b, True), _pairs(b, False)
+    seam = a_tail + cross + b_head        # every triple in here straddles the seam
+    for (s0, _), (s1, dt1), (s2, dt2) in zip(seam, seam[1:], seam[2:]):
+        j = abs((s2 - s1) / dt2 - (s1 - s0) / dt1)
+        if not isnan(j):
+            out["n_jerk"] += 1
+            out["jerk_sum"] += j
+    head = a_head if a["n_pairs"] >= 2 else (a_head + cross + b_head)[:2]
+    tail = b_tail if b["n_pairs"] >= 2 else (a_tail + cross + b_tail)[-2:]
+    head += [(nan, nan)] * (2 - len(head))
+    tail = [(nan, nan)] * (2 - len(tail)) + tail
+    (out["head_s0"], out["head_dt0"]), (out["head_s1"], out["head_dt1"]) = head
+    (out["tail_s0"], out["tail_dt0"]), (out["tail_s1"], out["tail_dt1"]) = tail
+    if not a["move_events"]:
+        for c in ("move_first_t", "move_first_x", "move_first_y"):
+            out[c] = b[c]
+    if b["move_events"]:
+        for c in ("move_last_t", "move_last_x", "move_last_y"):
+            out[c] = b[c]
+    return out
+
+def features_from_states(states: pd.DataFrame, window_ms: int = 60_000) -> pd.DataFrame:
+    """FEATURE_COLUMNS from state rows; idle_ratio is idle time over window_ms."""
+    if states.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    s = states
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_iki = s["iki_sum"] / s["n_iki"]
+        speed_mean = s["speed_sum"] / s["n_speed"]
+        feats = pd.DataFrame({
+            "window_id": s["window_id"].astype("int64"),
+            "t_start": s["t_start"].astype("int64"), "t_end": s["t_end"].astype("int64"),
+            "keys_total": s["keys_total"].astype("int64"),
+            "backspace": s["backspace"].astype("int64"),
+            "correction_rate": np.where(s["keys_total"] > 0, s["backspace"] / np.maximum(s["keys_total"], 1), 0.0),
+            "avg_iki": avg_iki,
+            "iki_std": np.sqrt(np.maximum(s["iki_sq"] / s["n_iki"] - avg_iki**2, 0.0)),
+            "move_events": s["move_events"].astype("int64"),
+            "mouse_speed_mean": speed_mean,
+            "mouse_speed_std": np.sqrt(np.maximum(s["speed_sq"] / s["n_speed"] - speed_mean**2, 0.0)),
+            "mouse_jerk_mean": s["jerk_sum"] / s["n_jerk"],
+            "idle_ratio": np.clip(s["idle_ms"] / window_ms, 0.0, 1.0),
+            "clicks": s["clicks"].astype("int64"), "scrolls": s["scrolls"].astype("int64"),
         })
+    mid_ts = (feats["t_start"] + feats["t_end"]) // 2
+    tod = np.array([_tod_features(ts) for ts in mid_ts.tolist()], dtype=float).reshape(-1, 2)
+    feats["tod_sin"], feats["tod_cos"] = tod[:, 0], tod[:, 1]
+    return feats[FEATURE_COLUMNS].reset_index(drop=True)
+
+ADDITIVE_STATE_COLUMNS: List[str] = [
+    "keys_total","backspace","n_iki","iki_sum","iki_sq","move_events","n_pairs",
+    "n_speed","speed_sum","speed_sq","n_jerk","jerk_sum","idle_ms","clicks","scrolls"
+]
+
+# Folding merge_states over runs of rows, vectorized. Every term a fold adds has owner rows
+# (L, R): a row's own moments (r, r), the idle gap and IKI across a seam (previous such row,
+# r), a cross move pair (previous moved row, r), a jerk triple (owner of its first pair,
+# owner of its last). A run lo..hi holds a term iff lo <= L and R <= hi; within one
+# kind of term L and R are nondecreasing, so a run holds a contiguous slice of them. Counts
+# come from prefix sums; float sums add the slice itself, so an empty or all-zero slice
+# sums to exactly 0 (a differenced running sum leaves ~1e-10 there, and a std of sqrt of
+# it). Edge fields are the first / last owned element of the run.
+
+def _owned_sum(L: np.ndarray, R: np.ndarray, values, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Per run j, the sum of the values (one per term) whose owners satisfy lo[j] <= L and
+    R <= hi[j]; L and R nondecreasing."""
+    k0 = np.searchsorted(L, lo, side="left")
+    k1 = np.maximum(np.searchsorted(R, hi, side="right"), k0)
+    if np.isscalar(values):
+        return (k1 - k0) * values
+    if values.dtype.kind in "iub":
+        p = _prefix(values)
+        return p[k1] - p[k0]
+    idx = k0[:, None] + np.arange(int((k1 - k0).max(initial=0)))
+    idx[idx >= k1[:, None]] = len(values)
+    return np.append(values, 0.0)[idx].sum(axis=1)
+
+def _first_owned(L: np.ndarray, R: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Index of the first element (L, R nondecreasing) owned by each run; -1 if none."""
+    k = np.searchsorted(L, lo, side="left")
+    ok = k < len(L)
+    ok[ok] = R[k[ok]] <= hi[ok]
+    return np.where(ok, k, -1)
+
+def _last_owned(L: np.ndarray, R: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Index of the last element (L, R nondecreasing) owned by each run; -1 if none."""
+    k = np.searchsorted(R, hi, side="right") - 1
+    ok = k >= 0
+    ok[ok] = L[k[ok]] >= lo[ok]
+    return np.where(ok, k, -1)
+
+def _take(values: np.ndarray, k: np.ndarray, fill) -> np.ndarray:
+    out = np.full(len(k), fill, dtype=np.result_type(values.dtype, type(fill)))
+    out[k >= 0] = values[k[k >= 0]]
+    return out
+
+def _merge_runs(states: pd.DataFrame, lo: np.ndarray, hi: np.ndarray, window_id: np.ndarray) -> pd.DataFrame:
+    """merge_states folded over rows lo[j]..hi[j] of states (sorted by window_id, so in time
+    order) for every run j; lo and hi nondecreasing."""
+    s = {c: states[c].to_numpy() for c in STATE_COLUMNS}
+    for c in ("iki_sum", "iki_sq", "speed_sum", "speed_sq", "jerk_sum"):
+        s[c] = s[c].astype(float)          # bincount gives int64 sums when a frame has no terms
+    rows = np.arange(len(states))
+    owned = lambda L, R, v: _owned_sum(L, R, v, lo, hi)
+    out: Dict[str, Any] = {"window_id": window_id, "t_start": s["t_start"][lo], "t_end": s["t_end"][hi],
+                           "ev_first_t": s["ev_first_t"][lo], "ev_last_t": s["ev_last_t"][hi]}
+    for c in ADDITIVE_STATE_COLUMNS:
+        out[c] = owned(rows, rows, s[c])
 
-    return pd.DataFrame(out, columns=FEATURE_COLUMNS)
\ No newline at end of file
+    gap = s["ev_first_t"][1:] - s["ev_last_t"][:-1]
+    out["idle_ms"] += owned(rows[:-1], rows[1:], np.where(gap > 2000, gap, 0))
+    kr = np.flatnonzero(s["keys_total"] > 0)
+    iki = (s["key_first_t"][kr[1:]] - s["key_last_t"][kr[:-1]]).astype(float)
+    out["n_iki"] += owned(kr[:-1], kr[1:], 1)
+    out["iki_sum"] += owned(kr[:-1], kr[1:], iki)
+    out["iki_sq"] += owned(kr[:-1], kr[1:], iki * iki)
+    k = _first_owned(kr, kr, lo, hi)
+    out["key_first_t"] = _take(s["key_first_t"][kr], k, 0)
+    k = _last_owned(kr, kr, lo, hi)
+    out["key_last_t"] = _take(s["key_last_t"][kr], k, 0)
+
+    mr = np.flatnonzero(s["move_events"] > 0)
+    k = _first_owned(mr, mr, lo, hi)
+    for c, fill in (("move_first_t", 0), ("move_first_x", nan), ("move_first_y", nan)):
+        out[c] = _take(s[c][mr], k, fill)
+    k = _last_owned(mr, mr, lo, hi)
+    for c, fill in (("move_last_t", 0), ("move_last_x", nan), ("move_last_y", nan)):
+        out[c] = _take(s[c][mr], k, fill)
+
+    # Cross pairs from each moved row's last move to the next moved row's first
+    cL, cR = mr[:-1], mr[1:]
+    dx = s["move_first_x"][cR].astype(float) - s["move_last_x"][cL].astype(float)
+    dy = s["move_first_y"][cR].astype(float) - s["move_last_y"][cL].astype(float)
+    has = ~(np.isnan(dx) | np.isnan(dy))
+    cL, cR, dx, dy = cL[has], cR[has], dx[has], dy[has]
+    cdt = (s["move_first_t"][cR] - s["move_last_t"][cL]) / 1000.0
+    cdt = np.where(cdt == 0, nan, cdt)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cs = np.sqrt(dx**2 + dy**2) / cdt
+    ok = ~np.isnan(cs)
+    out["n_pairs"] += owned(cL, cR, 1)
+    out["n_speed"] += owned(cL[ok], cR[ok], 1)
+    out["speed_sum"] += owned(cL[ok], cR[ok], cs[ok])
+    out["speed_sq"] += owned(cL[ok], cR[ok], cs[ok] * cs[ok])
+
+    # The boundary pair sequence: cross pairs and each row's head / tail pairs (h0 h1 | t0 t1,
+    # with a gap between them past 4 pairs), in order; every triple in it not inside one
+    # row is a seam triple
+    ir = np.flatnonzero(s["n_pairs"] > 0)
+    n_p = s["n_pairs"][ir]
+    slot_s = [s["head_s0"][ir], s["head_s1"][ir], np.full(len(ir), nan), s["tail_s0"][ir], s["tail_s1"][ir]]
+    slot_dt = [s["head_dt0"][ir], s["head_dt1"][ir], np.full(len(ir), nan), s["tail_dt0"][ir], s["tail_dt1"][ir]]
+    slot_on = [n_p >= 1, n_p >= 2, n_p >= 5, n_p >= 4, n_p >= 3]
+    key = np.concatenate([cR * 8] + [ir * 8 + 1 + i for i in range(5)])
+    on = np.concatenate([np.ones(len(cs), dtype=bool)] + slot_on)
+    order = np.argsort(key[on], kind="stable")
+    ps = np.concatenate([cs] + slot_s).astype(float)[on][order]
+    pdt = np.concatenate([cdt] + slot_dt).astype(float)[on][order]
+    prow = np.concatenate([np.full(len(cs), -1)] + [ir] * 5)[on][order]
+    pgap = np.concatenate([np.zeros(len(cs), dtype=bool)] + [np.zeros(len(ir), dtype=bool)] * 2
+                          + [np.ones(len(ir), dtype=bool)] + [np.zeros(len(ir), dtype=bool)] * 2)[on][order]
+    pL = np.concatenate([cL] + [ir] * 5)[on][order]
+    pR = np.concatenate([cR] + [ir] * 5)[on][order]
+    with np.errstate(invalid="ignore"):
+        jerk = np.abs((ps[2:] - ps[1:-1]) / pdt[2:] - (ps[1:-1] - ps[:-2]) / pdt[1:-1])
+    one_row = (prow[:-2] >= 0) & (prow[:-2] == prow[1:-1]) & (prow[1:-1] == prow[2:])
+    ok = ~(one_row | pgap[:-2] | pgap[1:-1] | pgap[2:] | np.isnan(jerk))
+    out["n_jerk"] += owned(pL[:-2][ok], pR[2:][ok], 1)
+    out["jerk_sum"] += owned(pL[:-2][ok], pR[2:][ok], jerk[ok])
+
+    f, e = _first_owned(pL, pR, lo, hi), _last_owned(pL, pR, lo, hi)
+    f1 = np.where((f >= 0) & (f + 1 < len(pR)), f + 1, -1)
+    f1[f1 >= 0] = np.where(pR[f1[f1 >= 0]] <= hi[f1 >= 0], f1[f1 >= 0], -1)
+    e0 = np.where(e >= 1, e - 1, -1)
+    e0[e0 >= 0] = np.where(pL[e0[e0 >= 0]] >= lo[e0 >= 0], e0[e0 >= 0], -1)
+    for name, k in (("head_s0", f), ("head_s1", f1), ("tail_s0", e0), ("tail_s1", e)):
+        out[name], out[name.replace("_s", "_dt")] = _take(ps, k, nan), _take(pdt, k, nan)
+    return pd.DataFrame(out, columns=STATE_COLUMNS)
+
+def coarsen_states(states: pd.DataFrame, factor: int) -> pd.DataFrame:
+    """Merge each run of `factor` consecutive window_ids (window_id // factor) into one state."""
+    if states.empty:
+        return pd.DataFrame(columns=STATE_COLUMNS)
+    states = states.sort_values("window_id", kind="stable").reset_index(drop=True)
+    cid = states["window_id"].to_numpy().astype("int64") // factor
+    first = np.flatnonzero(np.r_[True, cid[1:] != cid[:-1]])
+    last = np.r_[first[1:], len(cid)] - 1
+    return _merge_runs(states, first, last, cid[first])
+
+def rolling_states(states: pd.DataFrame, span: int) -> pd.DataFrame:
+    """For each window w, the merged state of windows w-span+1 .. w (those that exist)."""
+    if states.empty:
+        return pd.DataFrame(columns=STATE_COLUMNS)
+    states = states.sort_values("window_id", kind="stable").reset_index(drop=True)
+    wid = states["window_id"].to_numpy().astype("int64")
+    lo = np.searchsorted(wid, wid - span + 1, side="left")
+    return _merge_runs(states, lo, np.arange(len(wid)), wid)
+
+def multiscale_features(states: pd.DataFrame, spans: Sequence[int] = (5, 15),
+                        window_ms: int = 60_000) -> pd.DataFrame:
+    """
+    Features of each window plus, per span, the same MULTISCALE_COLUMNS over the trailing
+    `span` windows, suffixed _<span * window_ms in minutes>m (e.g. avg_iki_15m).
+    """
+    states = states.sort_values("window_id", kind="stable").reset_index(drop=True)
+    feats = features_from_states(states, window_ms)
+    for span in spans:
+        rolled = features_from_states(rolling_states(states, span), span * window_ms)
+        suffix = f"_{span * window_ms // 60_000}m"
+        for c in MULTISCALE_COLUMNS:
+            feats[c + suffix] = rolled[c].to_numpy()
+    return feats
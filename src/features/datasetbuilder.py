@@ -1,12 +1,28 @@
-# src/features/dataset_builder.py
+# src/features/datasetbuilder.py
 # Join latest features with timestamp-range labels into a supervised dataset.
+# Out of core: features are read one partition at a time (a feature store day, or
+# CHUNK_ROWS of the features CSV), joined with only the labels overlapping it, and
+# appended to a binary training matrix (src/features/trainmatrix.py) that train.py
+# memory-maps. --format csv writes data/datasets/train.csv the same way instead.
+# --trace: per-stage time / CPU / peak RSS / rows/s into data/logs/runs.ndjson (timeutils.py)
 
-import os
+import os, argparse
+from typing import Iterator, Optional, Tuple
+import numpy as np
 import pandas as pd
 
+from src.labeling.labelstore import open_store
+from src.features.featurestore import FeatureStore, FEATURE_STORE_DIR
+from src.features.trainmatrix import TrainMatrixWriter, TRAIN_MATRIX_DIR
+from src.utils.timeutils import stage, timed_iter, add_trace_args, start_run
+
 FEATURES_DIR = "data/features"
-LABELS_CSV   = "data/labels/labels.csv"
+LABELS_CSV   = "data/labels/labels.csv"     # legacy; imported into LABELS_DB once
+LABELS_DB    = "data/labels/labels.sqlite"
 DATASETS_DIR = "data/datasets"
+WINDOW_MS    = 60_000    # upper bound on t_end - t_start of a window
+CHUNK_ROWS   = 200_000   # features CSV rows per partition (no feature store)
+DATASET_FORMATS = ("matrix", "csv")
 
 def _latest_features_path() -> str:
     files = sorted([os.path.join(FEATURES_DIR, f)
@@ -16,65 +32,138 @@ def _latest_features_path() -> str:
         raise FileNotFoundError(f"No features CSVs found in {FEATURES_DIR}. Run make_features first.")
     return files[-1]
 
-def _load_features() -> pd.DataFrame:
-    path = _latest_features_path()
-    feats = pd.read_csv(path)
-    required = {"window_id", "t_start", "t_end"}
-    missing = required - set(feats.columns)
-    if missing:
-        raise ValueError(f"Features file missing columns: {missing}")
-    return feats
-
-def _load_labels() -> pd.DataFrame:
-    if not os.path.exists(LABELS_CSV):
-        raise FileNotFoundError(f"{LABELS_CSV} not found. Collect labels with the GUI scheduler first.")
-    labels = pd.read_csv(LABELS_CSV)
-    need = {"applies_from", "applies_to", "fatigue_score"}
-    if not need.issubset(labels.columns):
-        raise ValueError(f"labels.csv must have columns: {need}")
-    # ensure ints/floats
-    labels["applies_from"] = labels["applies_from"].astype("int64")
-    labels["applies_to"]   = labels["applies_to"].astype("int64")
-    labels["fatigue_score"] = labels["fatigue_score"].astype(float)
-    return labels
-
 def _overlap(a_start, a_end, b_start, b_end) -> bool:
     return not (a_end < b_start or a_start > b_end)
 
-def _map_labels_to_windows(feats: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
+def _label_windows(feats: pd.DataFrame, labels: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
     """
     For each window, find labels whose [applies_from, applies_to] overlaps [t_start, t_end].
-    If multiple labels overlap a window, take the one with the most recent applies_to (last known state).
-    Returns a DataFrame with columns: window_id, fatigue_score
+    If multiple labels overlap a window, take the one with the most recent applies_to (last known state;
+    on a tie, the later row in labels.csv).
+    Returns (hit: bool per window, score: the chosen label's fatigue_score where hit).
+
+    Sweep instead of a scan per window: the winner for a window is the label with the
+    largest applies_to among those starting at or before t_end, which is a prefix
+    maximum over labels sorted by applies_from. It overlaps iff its applies_to >= t_start.
+    O((windows + labels) log labels).
+    """
+    ws = feats["t_start"].to_numpy(dtype=np.int64)
+    we = feats["t_end"].to_numpy(dtype=np.int64)
+    if labels.empty:
+        return np.zeros(len(ws), dtype=bool), np.full(len(ws), np.nan)
+    frm = labels["applies_from"].to_numpy(dtype=np.int64)
+    to = labels["applies_to"].to_numpy(dtype=np.int64)
+    score = labels["fatigue_score"].to_numpy(dtype=float)
+
+    # rank = position in a stable sort by applies_to: higher rank wins
+    by_to = np.argsort(to, kind="stable")
+    rank = np.empty(len(to), dtype=np.int64)
+    rank[by_to] = np.arange(len(to))
+    by_from = np.argsort(frm, kind="stable")
+    best = np.maximum.accumulate(rank[by_from])   # best rank among the first k+1 by applies_from
+    winner = by_to[best]                          # rank → label index
+
+    k = np.searchsorted(frm[by_from], we, side="right") - 1
+    has = k >= 0
+    chosen = np.full(len(ws), -1, dtype=np.int64)
+    chosen[has] = winner[k[has]]
+    hit = has.copy()
+    hit[has] = to[chosen[has]] >= ws[has]
+    return hit, np.where(hit, score[chosen], np.nan)
+
+def _map_labels_to_windows(feats: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
     """
-    rows = []
-    labels_sorted = labels.sort_values("applies_to")
-
-    for _, w in feats[["window_id","t_start","t_end"]].iterrows():
-        wid, ws, we = int(w["window_id"]), int(w["t_start"]), int(w["t_end"])
-        # find overlapping labels
-        mask = (labels_sorted["applies_to"] >= ws) & (labels_sorted["applies_from"] <= we)
-        overlaps = labels_sorted.loc[mask]
-        if overlaps.empty:
-            continue
-        chosen = overlaps.iloc[-1]
-        rows.append({"window_id": wid, "fatigue_score": float(chosen["fatigue_score"])})
-
-    if not rows:
+    Labeled windows as a DataFrame with columns: window_id, t_start, fatigue_score
+    (t_start tells apart windows of different sessions, whose window_ids repeat).
+    """
+    hit, score = _label_windows(feats, labels)
+    if not hit.any():
         raise ValueError("No windows overlapped any label ranges. Collect more labels or re-run features.")
+    return pd.DataFrame({"window_id": feats["window_id"].to_numpy()[hit].astype(int),
+                         "t_start": feats["t_start"].to_numpy(dtype=np.int64)[hit],
+                         "fatigue_score": score[hit]})
+
+def _feature_partitions(span: Tuple[int, int], chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Feature rows a partition at a time: feature store days that can overlap a label
+    (t_start within [first applies_from - window, last applies_to]), else chunks of the
+    newest features CSV.
+    """
+    if FeatureStore.exists(FEATURE_STORE_DIR):
+        yield from FeatureStore(FEATURE_STORE_DIR).iter_partitions(t_from=span[0] - WINDOW_MS, t_to=span[1])
+        return
+    path = _latest_features_path()
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunk_rows)):
+        if i == 0:
+            missing = {"window_id", "t_start", "t_end"} - set(chunk.columns)
+            if missing:
+                raise ValueError(f"Features file missing columns: {missing}")
+        yield chunk
 
-    return pd.DataFrame(rows)
+class _CsvWriter:
+    """train.csv, appended chunk by chunk; replaces the old file on close()."""
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = f"{path}.tmp-{os.getpid()}"
+        self.rows = 0
+        self._header = True
 
-def build_dataset():
-    feats = _load_features()
-    labels = _load_labels()
-    mapping = _map_labels_to_windows(feats, labels)
-    # inner join keeps only labeled windows (good for supervised training)
-    df = feats.merge(mapping, on="window_id", how="inner")
+    def append(self, df: pd.DataFrame) -> int:
+        df.to_csv(self.tmp, mode="w" if self._header else "a", header=self._header, index=False)
+        self._header = False
+        self.rows += len(df)
+        return len(df)
+
+    def close(self, source: Optional[str] = None) -> str:
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def abort(self):
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+def build_dataset(fmt: str = "matrix", chunk_rows: int = CHUNK_ROWS) -> str:
+    if not os.path.exists(LABELS_DB) and not os.path.exists(LABELS_CSV):
+        raise FileNotFoundError(f"No labels in {LABELS_DB} or {LABELS_CSV}. Collect labels with the GUI scheduler first.")
     os.makedirs(DATASETS_DIR, exist_ok=True)
-    out_csv = os.path.join(DATASETS_DIR, "train.csv")
-    df.to_csv(out_csv, index=False)
-    print(f"[dataset] Built training dataset with {len(df)} labeled rows → {out_csv}")
+    source = FEATURE_STORE_DIR if FeatureStore.exists(FEATURE_STORE_DIR) else _latest_features_path()
+    with open_store(LABELS_DB, LABELS_CSV) as labels_store:
+        span = labels_store.span()
+        if span is None:
+            raise ValueError(f"No labels in {LABELS_DB}. Collect labels with the GUI scheduler first.")
+        writer = (TrainMatrixWriter(TRAIN_MATRIX_DIR) if fmt == "matrix"
+                  else _CsvWriter(os.path.join(DATASETS_DIR, "train.csv")))
+        try:
+            for feats in timed_iter(_feature_partitions(span, chunk_rows), "read"):
+                if feats.empty:
+                    continue
+                with stage("join", rows=len(feats)):
+                    # only the labels this partition can overlap (typed, insertion order)
+                    labels = labels_store.range(int(feats["t_start"].min()), int(feats["t_end"].max()))
+                    hit, score = _label_windows(feats, labels)
+                    # inner join: only labeled windows (good for supervised training)
+                    part = feats[hit].assign(fatigue_score=score[hit])
+                with stage("write", rows=len(part)):
+                    writer.append(part)
+            if not writer.rows:
+                raise ValueError("No windows overlapped any label ranges. Collect more labels or re-run features.")
+        except BaseException:
+            writer.abort()
+            raise
+        out = writer.close(source)
+    print(f"[dataset] Built training dataset with {writer.rows} labeled rows → {out}")
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Join features with labels into a training dataset.")
+    parser.add_argument("--format", choices=DATASET_FORMATS, default="matrix",
+                        help=f"matrix: {TRAIN_MATRIX_DIR}/ (memory-mapped by train.py); csv: {DATASETS_DIR}/train.csv")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help="Features CSV rows joined at a time (without a feature store)")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_run("dataset", args)
+    build_dataset(args.format, args.chunk_rows)
 
 if __name__ == "__main__":
-    build_dataset()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,295 @@
+# src/features/featurestore.py
+# Columnar, day-partitioned store for window features (data/featurestore/).
+# Layout:
+#   manifest.json               columns + dtypes, per-day row counts and t_start range,
+#                               where the newest window is, the session names, and what
+#                               every row must share: the mouse decimation of its log and
+#                               the windowing mode ("session" or "epoch")
+#   <YYYY-MM-DD>/<column>.bin   raw little-endian values, one file per column, plus
+#                               session.bin (codes into the manifest's session names)
+# - Rows are keyed by (session, t_start). Appends go to the partition of each row's
+#   t_start day (UTC) and replace a stored row with the same key (last write wins), so
+#   re-running make_features on a log that grew or was rebuilt updates its windows;
+#   rows equal to the stored ones are not rewritten
+# - A partition that needs rows replaced is rewritten into a new directory
+#   (<day>.<n>) that the manifest then points to; plain appends add to the files
+# - Per-log windows (window_id counted from each log's first event) and epoch-aligned
+#   ones (--stitch) differ for the same events: a store holds one windowing mode
+# - Reads memory-map only the requested columns of the partitions overlapping the
+#   time range, and slice by t_start with a binary search
+# - manifest.json is replaced atomically after the column bytes are written; readers
+#   trust its row counts, so a crash mid-append leaves no visible partial rows
+
+import os, json, shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+from src.features.computecore import FEATURE_COLUMNS
+from src.collector.decimate import MixedDecimationError
+
+FEATURE_STORE_DIR = "data/featurestore"
+TIME_COLUMN = "t_start"
+SESSION_COLUMN = "session"       # key with t_start; stored as codes, read on request
+SESSION_DTYPE  = "<i4"
+WINDOWING_MODES = ("session", "epoch")   # window_id from each log's first event / t // window_ms
+INT_COLUMNS = {"window_id", "t_start", "t_end", "keys_total", "backspace", "move_events", "clicks", "scrolls"}
+
+def _day(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+def _default_dtypes(columns: Sequence[str]) -> Dict[str, str]:
+    return {c: ("<i8" if c in INT_COLUMNS else "<f8") for c in columns}
+
+def _keys(codes: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """(session code, t_start) as one int64: t_start in ms fits in 42 bits until 2109."""
+    return (codes.astype(np.int64) << 42) | t.astype(np.int64)
+
+class FeatureStore:
+    def __init__(self, root: str = FEATURE_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.manifest: Dict[str, Any] = {"columns": {}, "partitions": {}, "latest": None}
+        self._stale: List[str] = []   # partition directories the next saved manifest replaces
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    @staticmethod
+    def exists(root: str = FEATURE_STORE_DIR) -> bool:
+        return os.path.exists(os.path.join(root, "manifest.json"))
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.manifest["columns"])
+
+    def __len__(self) -> int:
+        return sum(p["rows"] for p in self.manifest["partitions"].values())
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _dir(self, day: str) -> str:
+        return os.path.join(self.root, self.manifest["partitions"].get(day, {}).get("dir", day))
+
+    def _dtype(self, col: str) -> str:
+        return SESSION_DTYPE if col == SESSION_COLUMN else self.manifest["columns"][col]
+
+    def _column(self, day: str, col: str, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros(0, dtype=self._dtype(col))
+        return np.memmap(os.path.join(self._dir(day), f"{col}.bin"), dtype=self._dtype(col),
+                         mode="r", shape=(rows,))
+
+    def _frame(self, day: str, cols: Sequence[str], sel: Any) -> pd.DataFrame:
+        rows = self.manifest["partitions"][day]["rows"]
+        out = {c: np.array(self._column(day, c, rows)[sel]) for c in cols}
+        if SESSION_COLUMN in out:
+            out[SESSION_COLUMN] = np.array(self.manifest["sessions"], dtype=object)[out[SESSION_COLUMN]]
+        return pd.DataFrame(out, columns=cols)
+
+    # -------- Writes --------
+    def check_source(self, decimation: str = "off", windowing: str = "session"):
+        """
+        Raise unless rows from logs decimated as `decimation` (MixedDecimationError) and
+        windowed as `windowing` (ValueError) may join the stored ones.
+        """
+        if windowing not in WINDOWING_MODES:
+            raise ValueError(f"windowing must be one of {WINDOWING_MODES}")
+        if not self.manifest["partitions"]:
+            return
+        stored = self.manifest.get("decimation", "off")
+        if stored != decimation:
+            raise MixedDecimationError(f"feature store {self.root} holds rows from '{stored}' logs, "
+                                       f"not '{decimation}'; move it aside to start a separate one")
+        stored = self.manifest.get("windowing", "session")
+        if stored != windowing:
+            raise ValueError(f"feature store {self.root} holds {stored}-windowed rows, not {windowing}-windowed "
+                             "ones; use a separate store")
+        if "sessions" not in self.manifest:
+            raise ValueError(f"feature store {self.root} predates session keys; move it aside and rebuild it "
+                             "(python -m src.features.make_features --all)")
+
+    def _session_codes(self, names: pd.Series) -> np.ndarray:
+        sessions = self.manifest.setdefault("sessions", [])
+        index = {s: i for i, s in enumerate(sessions)}
+        for name in names.unique().tolist():
+            if name not in index:
+                index[name] = len(sessions)
+                sessions.append(name)
+        return names.map(index).to_numpy(dtype=SESSION_DTYPE)
+
+    def append(self, feats: pd.DataFrame, session: Optional[str] = None, decimation: str = "off",
+               windowing: str = "session", replace: bool = False) -> int:
+        """
+        Upsert feature rows (FEATURE_COLUMNS or a superset) keyed by (session, t_start).
+        The session comes from feats' `session` column, else `session`; decimation
+        (decimate.log_decimation) and windowing describe where the rows came from and
+        must match the store's. replace=True: feats are all of their session's rows (it
+        was recomputed from scratch), stored rows of it missing from feats are removed.
+        Returns the rows added, changed or removed.
+        """
+        if feats.empty and not (replace and session):
+            return 0
+        self.check_source(decimation, windowing)
+        os.makedirs(self.root, exist_ok=True)
+        if SESSION_COLUMN not in feats.columns:
+            feats = feats.assign(**{SESSION_COLUMN: session or ""})
+        if not self.manifest["columns"]:
+            if feats.empty:
+                return 0
+            cols = [c for c in FEATURE_COLUMNS if c in feats.columns] + \
+                   [c for c in feats.columns if c not in FEATURE_COLUMNS and c != SESSION_COLUMN]
+            self.manifest["columns"] = _default_dtypes(cols)
+        missing = set(self.columns) - set(feats.columns)
+        if missing and not feats.empty:
+            raise ValueError(f"feature rows missing columns: {missing}")
+        self.manifest.update(decimation=decimation, windowing=windowing)
+
+        feats = feats.drop_duplicates([SESSION_COLUMN, TIME_COLUMN], keep="last")
+        names = feats[SESSION_COLUMN].astype(str)
+        codes = self._session_codes(names)
+        replaced = self._session_codes(pd.Series(names.unique().tolist() or [session])) if replace else codes[:0]
+        t = feats[TIME_COLUMN].to_numpy(dtype=np.int64)
+        days = np.array([_day(v) for v in t.tolist()], dtype=object)
+        touched = set(days.tolist()) | (set(self.manifest["partitions"]) if replace else set())
+        changed = 0
+        for day in sorted(touched):
+            on_day = days == day
+            part = feats[on_day].reindex(columns=self.columns).assign(**{SESSION_COLUMN: codes[on_day]})
+            meta = self.manifest["partitions"].get(day, {"rows": 0, "t_min": None, "t_max": None, "sorted": True})
+            key = _keys(part[SESSION_COLUMN].to_numpy(), part[TIME_COLUMN].to_numpy(dtype=np.int64))
+            stored_code = np.asarray(self._column(day, SESSION_COLUMN, meta["rows"]))
+            stored_key = _keys(stored_code, np.asarray(self._column(day, TIME_COLUMN, meta["rows"])))
+            # Rows of a replaced session that the new rows do not have: removed
+            stale = np.isin(stored_code, replaced) & ~np.isin(stored_key, key)
+            hit = np.isin(stored_key, key)
+            if hit.any():
+                # Stored rows the new ones would replace: drop the new rows that equal them
+                old = self._frame(day, self.columns, np.flatnonzero(hit))
+                old.index = stored_key[hit]
+                same = np.zeros(len(part), dtype=bool)
+                repl = np.isin(key, stored_key)
+                new = part[repl].set_index(key[repl])[self.columns]
+                eq = (new == old.loc[new.index]) | (new.isna() & old.loc[new.index].isna())
+                same[repl] = eq.all(axis=1).to_numpy()
+                part, key = part[~same], key[~same]
+                hit &= np.isin(stored_key, key)
+            if part.empty and not stale.any():
+                continue
+            if hit.any() or stale.any():
+                meta = self._rewrite(day, meta, ~(hit | stale), part)
+            else:
+                meta = self._add(day, meta, part)
+            if meta["rows"]:
+                self.manifest["partitions"][day] = meta
+            else:
+                self.manifest["partitions"].pop(day, None)
+            changed += len(part) + int(stale.sum())
+        if changed:
+            parts = self.manifest["partitions"]
+            latest_day = max(parts, key=lambda k: parts[k]["t_max"]) if parts else None
+            self.manifest["latest"] = latest_day and {"day": latest_day, "t_start": parts[latest_day]["t_max"]}
+            self._save_manifest()
+            for d in self._stale:
+                shutil.rmtree(d, ignore_errors=True)
+        self._stale = []
+        return changed
+
+    def _add(self, day: str, meta: Dict[str, Any], part: pd.DataFrame) -> Dict[str, Any]:
+        """Append rows with new keys to a partition's files."""
+        d = self._dir(day)
+        os.makedirs(d, exist_ok=True)
+        for col in self.columns + [SESSION_COLUMN]:
+            dtype = self._dtype(col)
+            with open(os.path.join(d, f"{col}.bin"), "ab") as f:
+                # Bytes past the manifest's row count are leftovers of a crashed append
+                f.truncate(meta["rows"] * np.dtype(dtype).itemsize)
+                f.write(part[col].to_numpy().astype(dtype).tobytes())
+        pt = part[TIME_COLUMN].to_numpy(dtype=np.int64)
+        in_order = bool((np.diff(pt) >= 0).all()) and (meta["t_max"] is None or int(pt[0]) >= meta["t_max"])
+        return {**meta, "rows": meta["rows"] + len(part),
+                "t_min": int(pt.min()) if meta["t_min"] is None else min(meta["t_min"], int(pt.min())),
+                "t_max": int(pt.max()) if meta["t_max"] is None else max(meta["t_max"], int(pt.max())),
+                "sorted": meta["sorted"] and in_order}
+
+    def _rewrite(self, day: str, meta: Dict[str, Any], keep: np.ndarray, part: pd.DataFrame) -> Dict[str, Any]:
+        """Write the partition's kept rows plus `part` (in t_start order) to a new directory."""
+        cols = self.columns + [SESSION_COLUMN]
+        rows = pd.concat([pd.DataFrame({c: np.asarray(self._column(day, c, meta["rows"]))[keep] for c in cols}),
+                          part[cols]], ignore_index=True)
+        rows = rows.sort_values(TIME_COLUMN, kind="mergesort")
+        self._stale.append(self._dir(day))
+        if rows.empty:
+            return {"rows": 0}
+        n = 1
+        while os.path.exists(os.path.join(self.root, f"{day}.{n}")):
+            n += 1
+        name = f"{day}.{n}"
+        os.makedirs(os.path.join(self.root, name))
+        for col in cols:
+            with open(os.path.join(self.root, name, f"{col}.bin"), "wb") as f:
+                f.write(rows[col].to_numpy().astype(self._dtype(col)).tobytes())
+        pt = rows[TIME_COLUMN].to_numpy(dtype=np.int64)
+        return {"rows": len(rows), "t_min": int(pt[0]), "t_max": int(pt[-1]), "sorted": True, "dir": name}
+
+    # -------- Reads --------
+    def read(self, t_from: Optional[int] = None, t_to: Optional[int] = None,
+             columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Rows with t_from <= t_start <= t_to (either bound optional), only `columns`, in time order."""
+        cols = list(columns) if columns is not None else self.columns
+        unknown = set(cols) - set(self.columns) - {SESSION_COLUMN}
+        if unknown:
+            raise KeyError(f"not in feature store: {unknown}")
+        parts = [df for df in self.iter_partitions(t_from, t_to, cols) if len(df)]
+        if not parts:
+            return pd.DataFrame({c: np.zeros(0, dtype=object if c == SESSION_COLUMN else self._dtype(c))
+                                 for c in cols}, columns=cols)
+        return pd.concat(parts, ignore_index=True)
+
+    def iter_partitions(self, t_from: Optional[int] = None, t_to: Optional[int] = None,
+                        columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        """read(), one day partition at a time (for builds that must not hold every row)."""
+        cols = list(columns) if columns is not None else self.columns
+        lo = -np.inf if t_from is None else t_from
+        hi = np.inf if t_to is None else t_to
+        for day in sorted(self.manifest["partitions"]):
+            meta = self.manifest["partitions"][day]
+            if not meta["rows"] or meta["t_max"] < lo or meta["t_min"] > hi:
+                continue   # pruned from the manifest alone
+            t = self._column(day, TIME_COLUMN, meta["rows"])
+            if meta["sorted"]:
+                i = 0 if t_from is None else int(np.searchsorted(t, t_from, side="left"))
+                j = len(t) if t_to is None else int(np.searchsorted(t, t_to, side="right"))
+                sel: Any = slice(i, j)
+                if i >= j:
+                    continue
+            else:
+                sel = np.flatnonzero((t >= lo) & (t <= hi))
+                sel = sel[np.argsort(np.asarray(t[sel]), kind="stable")]
+            yield self._frame(day, cols, sel)
+
+    def latest(self, n: int = 1, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """The n newest windows (by t_start); starts at the manifest's newest partition."""
+        cols = list(columns) if columns is not None else self.columns
+        parts: List[pd.DataFrame] = []
+        need = n
+        for day in sorted(self.manifest["partitions"], reverse=True):
+            if need <= 0:
+                break
+            meta = self.manifest["partitions"][day]
+            if meta["sorted"]:
+                sel: Any = slice(max(0, meta["rows"] - need), meta["rows"])
+            else:
+                t = np.asarray(self._column(day, TIME_COLUMN, meta["rows"]))
+                sel = np.argsort(t, kind="stable")[-need:]
+            df = self._frame(day, cols, sel)
+            parts.insert(0, df)
+            need -= len(df)
+        if not parts:
+            return self.read(columns=cols)
+        return pd.concat(parts, ignore_index=True)
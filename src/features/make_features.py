@@ -1,35 +1,467 @@
-# Glue: pick latest NDJSON -> window -> compute -> postprocess -> save CSV
-import os
+# Glue: pick latest raw log (NDJSON or binary) -> window -> compute -> postprocess -> save CSV
+# --incremental: keep a checkpoint per raw file (byte offset + open-window state) and
+# append only newly closed windows to a stable data/features/features_<session>.csv
+# --all: every raw log in data/raw on a process pool → data/features/all_sessions.csv
+# --stitch: every raw log merged by timestamp into one epoch-aligned timeline, so windows
+# spanning an app restart are not split → data/features/timeline.csv
+# The default, --incremental and --all runs also upsert their rows into the day-partitioned
+# feature store (featurestore.py); --stitch --store DIR puts the timeline in a separate one
+# Runs that combine logs (--all, --stitch, the store) refuse logs captured with different
+# mouse decimation settings (collector/decimate.py: jerk is not comparable across them)
+# --trace: per-stage time / CPU / peak RSS / rows/s into data/logs/runs.ndjson (timeutils.py)
+import os, sys, json, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 import pandas as pd
 
-from src.features.windowing import latest_raw_file, read_ndjson, add_window_index
-from src.features.computecore import compute_window_features
+from src.features.windowing import (latest_raw_file, list_raw_files, read_raw, add_window_index,
+                                    iter_windows, iter_stitched_windows, iter_raw_chunks_from, WindowStream,
+                                    OutOfOrderError, EPOCH_BASE_MS, raw_size)
+from src.features.computecore import (compute_window_features, compute_sliding_features, compute_window_states,
+                                      multiscale_features, FEATURE_COLUMNS, STATE_COLUMNS)
 from src.features.postprocess import fill_and_clip
+from src.features.featurestore import FeatureStore, FEATURE_STORE_DIR
+from src.collector.decimate import log_decimation, common_decimation
+from src.utils.timeutils import stage, timed_iter, add_trace_args, start_run
 
 WINDOW_MS = 60_000
 FEATURES_DIR = "data/features"
+CHECKPOINT_DIR = os.path.join(FEATURES_DIR, "checkpoints")
+SESSIONS_DIR   = os.path.join(FEATURES_DIR, "sessions")      # per-file cache for --all
+ALL_SESSIONS_CSV = os.path.join(FEATURES_DIR, "all_sessions.csv")
+TIMELINE_CSV     = os.path.join(FEATURES_DIR, "timeline.csv")
 
 def iso_stamp():
     return datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%dT%H-%M-%S")
 
+def stream_features(raw_path: str, window_ms: int = WINDOW_MS) -> pd.DataFrame:
+    """Features for every window of raw_path, read in bounded memory via iter_windows."""
+    try:
+        parts = []
+        for w in timed_iter(iter_windows(raw_path, window_ms=window_ms), "read_window"):
+            with stage("compute", rows=len(w)):
+                parts.append(compute_window_features(w))
+    except OutOfOrderError as e:
+        # Rare: timestamps too far out of order to stream; redo with a full sort.
+        print(f"[features] {e}; falling back to full read")
+        with stage("read") as st:
+            df = read_raw(raw_path)
+            st.rows = len(df)
+        if df.empty:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+        with stage("window", rows=len(df)):
+            df = add_window_index(df, window_ms=window_ms)
+        with stage("compute", rows=len(df)):
+            return compute_window_features(df)
+    if not parts:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+def stream_states(raw_path: str, window_ms: int = WINDOW_MS) -> pd.DataFrame:
+    """Mergeable per-window states of raw_path (see computecore), streamed like stream_features."""
+    try:
+        parts = [compute_window_states(w) for w in iter_windows(raw_path, window_ms=window_ms)]
+    except OutOfOrderError as e:
+        print(f"[features] {e}; falling back to full read")
+        df = read_raw(raw_path)
+        parts = [compute_window_states(add_window_index(df, window_ms=window_ms))] if not df.empty else []
+    if not parts:
+        return pd.DataFrame(columns=STATE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+def multiscale_run(raw_path: Optional[str], states_csv: Optional[str], minutes: List[int]):
+    """1-minute states (from raw_path, or a saved states CSV) → features + trailing multi-minute context."""
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+    stamp = iso_stamp()
+    if states_csv:
+        states = pd.read_csv(states_csv, float_precision="round_trip")
+    else:
+        states = stream_states(raw_path)
+        states_csv = os.path.join(FEATURES_DIR, f"states_{stamp}.csv")
+        states.to_csv(states_csv, index=False)
+        print(f"[features] Wrote {len(states)} window states -> {states_csv}")
+    if states.empty:
+        print("[features] No windows. Collect more events and rerun.")
+        return
+    feats = multiscale_features(states, [m * 60_000 // WINDOW_MS for m in minutes], WINDOW_MS)
+    out_csv = os.path.join(FEATURES_DIR, f"multiscale_{stamp}.csv")
+    fill_and_clip(feats).fillna(0.0).to_csv(out_csv, index=False)   # NaN context columns too
+    print(f"[features] Wrote {len(feats)} rows with {'/'.join(map(str, minutes))}-minute context -> {out_csv}")
+
+# ----------------- Incremental mode -----------------
+def session_name(raw_path: str) -> str:
+    """events_<stamp>.ndjson → <stamp> (the stable key for its checkpoint and CSV)."""
+    stem = os.path.splitext(os.path.basename(raw_path))[0]
+    return stem[len("events_"):] if stem.startswith("events_") else stem
+
+def checkpoint_path(raw_path: str, ckpt_dir: str = CHECKPOINT_DIR) -> str:
+    return os.path.join(ckpt_dir, f"{session_name(raw_path)}.json")
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, ckpt: Dict[str, Any]):
+    """Write via a temp file + rename so a crash never leaves a half-written checkpoint."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ckpt, f)
+    os.replace(tmp, path)
+
+def _append_rows(out_csv: str, feats: pd.DataFrame, store: Optional[FeatureStore] = None,
+                 session: str = "", decimation: str = "off") -> int:
+    if feats.empty:
+        return 0
+    with stage("postprocess", rows=len(feats)):
+        feats = fill_and_clip(feats)
+    new = not os.path.exists(out_csv) or os.path.getsize(out_csv) == 0
+    with stage("write", rows=len(feats)):
+        feats.to_csv(out_csv, mode="a", header=new, index=False)
+        if store is not None:
+            store.append(feats, session, decimation)   # rows already stored (e.g. after a crash) are replaced
+    return len(feats)
+
+def _replace_rows(out_csv: str, feats: pd.DataFrame, store: Optional[FeatureStore] = None,
+                  session: str = "", decimation: str = "off") -> int:
+    """Like _append_rows, but feats replace every row written for the session so far."""
+    if not feats.empty:
+        with stage("postprocess", rows=len(feats)):
+            feats = fill_and_clip(feats)
+    with stage("write", rows=len(feats)):
+        if store is not None:
+            store.append(feats, session, decimation, replace=True)
+        if feats.empty:
+            if os.path.exists(out_csv):
+                os.remove(out_csv)
+        else:
+            tmp = out_csv + ".tmp"
+            feats.to_csv(tmp, index=False)
+            os.replace(tmp, out_csv)
+    return len(feats)
+
+def _rewindow(raw_path: str, window_ms: int, finalize: bool):
+    """
+    Window raw_path again from byte 0 (sorted, so late events land in their window):
+    (stream holding the open window, features of the closed windows, end offset).
+    """
+    chunks, offset = [], 0
+    for chunk, offset in iter_raw_chunks_from(raw_path, 0):
+        chunks.append(chunk)
+    stream = WindowStream(window_ms)
+    closed = []
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True).sort_values("t", kind="mergesort").reset_index(drop=True)
+        closed.append(stream.feed(df))
+    if finalize:
+        closed.append(stream.finish())
+    closed = [c for c in closed if c is not None]
+    if not closed:
+        return stream, pd.DataFrame(columns=FEATURE_COLUMNS), offset
+    with stage("compute"):
+        return stream, compute_window_features(pd.concat(closed, ignore_index=True)), offset
+
+def incremental_features(raw_path: str, window_ms: int = WINDOW_MS, finalize: bool = False,
+                         features_dir: str = FEATURES_DIR, ckpt_dir: str = CHECKPOINT_DIR,
+                         store_dir: Optional[str] = FEATURE_STORE_DIR) -> str:
+    """
+    Bring features_<session>.csv up to date with raw_path, parsing only bytes past the
+    checkpointed offset. Rows for closed windows are appended; the open window's events
+    stay in the checkpoint until a later run (or finalize=True) closes it. The result is
+    the same as a full run over the file once it is finalized.
+    """
+    os.makedirs(features_dir, exist_ok=True)
+    out_csv = os.path.join(features_dir, f"features_{session_name(raw_path)}.csv")
+    ckpt_file = checkpoint_path(raw_path, ckpt_dir)
+    ckpt = load_checkpoint(ckpt_file)
+    size = raw_size(raw_path)
+
+    if ckpt is not None and (ckpt["window_ms"] != window_ms or ckpt["offset"] > size):
+        print("[features] Checkpoint does not match the raw file (rotated/truncated); starting over")
+        ckpt = None
+    if ckpt is not None and ckpt.get("final"):
+        print(f"[features] {raw_path} already finalized -> {out_csv}")
+        return out_csv
+
+    if ckpt is None:
+        stream, offset, csv_size = WindowStream(window_ms), 0, 0
+    else:
+        stream, offset, csv_size = WindowStream.from_state(ckpt["stream"]), ckpt["offset"], ckpt["csv_size"]
+    # Drop rows a crashed run appended after its last checkpoint
+    if os.path.exists(out_csv) and os.path.getsize(out_csv) != csv_size:
+        with open(out_csv, "r+b") as f:
+            f.truncate(csv_size)
+
+    session, decimation = session_name(raw_path), log_decimation(raw_path)
+    store = FeatureStore(store_dir) if store_dir else None
+    if store is not None:
+        store.check_source(decimation)   # before anything is appended to the CSV
+    n_rows = 0
+    try:
+        for chunk, offset in timed_iter(iter_raw_chunks_from(raw_path, offset), "read"):
+            with stage("window", rows=len(chunk)):
+                closed = stream.feed(chunk)
+            if closed is not None:
+                with stage("compute", rows=len(closed)):
+                    feats = compute_window_features(closed)
+                n_rows += _append_rows(out_csv, feats, store, session, decimation)
+        if finalize:
+            closed = stream.finish()
+            if closed is not None:
+                with stage("compute", rows=len(closed)):
+                    feats = compute_window_features(closed)
+                n_rows += _append_rows(out_csv, feats, store, session, decimation)
+    except OutOfOrderError as e:
+        # An event went back into an emitted window: window the file again from the
+        # start, replace the closed windows' rows and keep the open window pending.
+        print(f"[features] {e}; recomputing the closed windows of {out_csv}")
+        stream, feats, offset = _rewindow(raw_path, window_ms, finalize)
+        n_rows = _replace_rows(out_csv, feats, store, session, decimation)
+
+    save_checkpoint(ckpt_file, {
+        "raw_path": raw_path, "window_ms": window_ms, "offset": offset,
+        "csv_size": os.path.getsize(out_csv) if os.path.exists(out_csv) else 0,
+        "last_closed_window": None if stream.next_open is None else stream.next_open - 1,
+        "final": bool(finalize), "stream": stream.state(),
+    })
+    print(f"[features] +{n_rows} rows (raw offset {offset}/{size}) -> {out_csv}")
+    return out_csv
+
+# ----------------- Batch mode (all sessions) -----------------
+class BatchError(RuntimeError):
+    """Raised by batch_features after saving everything else: raw log → error for the logs that failed."""
+    def __init__(self, failed: Dict[str, str]):
+        super().__init__(f"{len(failed)} raw log(s) failed: {', '.join(sorted(failed))}")
+        self.failed = failed
+
+def _file_stamp(path: str) -> Dict[str, int]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _session_features(raw_path: str, out_csv: str, window_ms: int) -> int:
+    """Worker: features of one raw log → out_csv (fill_and_clip'd). Returns the row count."""
+    feats = stream_features(raw_path, window_ms)
+    feats = fill_and_clip(feats) if not feats.empty else feats
+    tmp = out_csv + ".tmp"
+    feats.to_csv(tmp, index=False)
+    os.replace(tmp, out_csv)
+    return len(feats)
+
+def batch_features(raw_dir: str = "data/raw", window_ms: int = WINDOW_MS, workers: Optional[int] = None,
+                   sessions_dir: str = SESSIONS_DIR, out_csv: str = ALL_SESSIONS_CSV,
+                   store_dir: Optional[str] = FEATURE_STORE_DIR) -> pd.DataFrame:
+    """
+    Features for every raw log in raw_dir, one process per file, merged into out_csv with
+    a `session` column (window_id restarts per session). Files whose size and mtime
+    match the manifest from the previous run are not reprocessed. A log whose worker
+    fails is logged, left out of the manifest (so the next run retries it) and of the
+    merged rows; the rest are saved, then BatchError is raised.
+    """
+    files = list_raw_files(raw_dir)
+    if not files:
+        raise FileNotFoundError(f"No raw event files found in {raw_dir}")
+    decimation = common_decimation(files)
+    store = FeatureStore(store_dir) if store_dir else None
+    if store is not None:
+        store.check_source(decimation)
+    os.makedirs(sessions_dir, exist_ok=True)
+    manifest_path = os.path.join(sessions_dir, "manifest.json")
+    manifest: Dict[str, Any] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    def cache_csv(p: str) -> str:
+        return os.path.join(sessions_dir, f"features_{session_name(p)}.csv")
+
+    todo: List[str] = []
+    failed: Dict[str, str] = {}
+    for p in files:
+        entry = manifest.get(os.path.basename(p))
+        fresh = (entry is not None and entry["window_ms"] == window_ms
+                 and {k: entry[k] for k in ("size", "mtime_ns")} == _file_stamp(p)
+                 and os.path.exists(cache_csv(p)))
+        if not fresh:
+            todo.append(p)
+    print(f"[features] {len(files)} raw logs, {len(files) - len(todo)} unchanged, {len(todo)} to process")
+
+    if todo:
+        # Largest first so one long session does not finish last on its own
+        todo.sort(key=raw_size, reverse=True)
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        # Stamp before reading: a log that grows meanwhile is picked up again next run
+        stamps = {p: _file_stamp(p) for p in todo}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = {pool.submit(_session_features, p, cache_csv(p), window_ms): p for p in todo}
+            for fut in as_completed(futs):
+                p = futs[fut]
+                try:
+                    rows = fut.result()
+                except Exception as e:   # incl. BrokenProcessPool when a worker dies
+                    failed[p] = f"{type(e).__name__}: {e}"
+                    manifest.pop(os.path.basename(p), None)
+                    print(f"[features] ERROR {os.path.basename(p)}: {failed[p]}", file=sys.stderr)
+                    continue
+                manifest[os.path.basename(p)] = {**stamps[p], "window_ms": window_ms, "rows": rows}
+                print(f"[features] {os.path.basename(p)}: {rows} windows")
+
+    # Forget logs that were deleted
+    keep = {os.path.basename(p) for p in files}
+    manifest = {k: v for k, v in manifest.items() if k in keep}
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+
+    parts = []
+    for p in files:
+        if p in failed:
+            continue
+        df = pd.read_csv(cache_csv(p))
+        if not df.empty:
+            df.insert(0, "session", session_name(p))
+            parts.append(df)
+    if not parts:
+        out = pd.DataFrame(columns=["session"] + FEATURE_COLUMNS)
+    else:
+        out = pd.concat(parts, ignore_index=True)
+        os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+        out.to_csv(out_csv, index=False)
+        print(f"[features] Wrote {len(out)} rows from {len(parts)} sessions -> {out_csv}")
+        if store is not None:
+            n = store.append(out, decimation=decimation)
+            print(f"[features] {n} new or changed rows -> feature store {store_dir}")
+    if failed:
+        raise BatchError(failed)
+    return out
+
+# ----------------- Stitched timeline (all sessions, epoch-aligned) -----------------
+def stitched_features(raw_dir: str = "data/raw", window_ms: int = WINDOW_MS,
+                      out_csv: str = TIMELINE_CSV, store_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Features of all raw logs as one timeline: files are k-way merged by timestamp and
+    windowed at epoch-aligned boundaries (window_id = t // window_ms), with the open
+    window carried from one file into the next. Memory: about a chunk per file.
+    With store_dir, the windows also go to that feature store (as session "timeline");
+    it must not be the per-log one.
+    """
+    files = list_raw_files(raw_dir)
+    if not files:
+        raise FileNotFoundError(f"No raw event files found in {raw_dir}")
+    decimation = common_decimation(files)
+    store = FeatureStore(store_dir) if store_dir else None
+    if store is not None:
+        store.check_source(decimation, windowing="epoch")
+    try:
+        parts = []
+        for w in timed_iter(iter_stitched_windows(files, window_ms), "read_window"):
+            with stage("compute", rows=len(w)):
+                parts.append(compute_window_features(w))
+    except OutOfOrderError as e:
+        # A file more than LATE_MS out of order: sort everything in memory instead.
+        print(f"[features] {e}; falling back to full read")
+        df = pd.concat([read_raw(p) for p in files], ignore_index=True)
+        df = df.sort_values("t", kind="mergesort").reset_index(drop=True)
+        parts = [compute_window_features(add_window_index(df, window_ms, EPOCH_BASE_MS))] if not df.empty else []
+    feats = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=FEATURE_COLUMNS)
+    with stage("postprocess", rows=len(feats)):
+        feats = fill_and_clip(feats) if not feats.empty else feats
+    os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    tmp = out_csv + ".tmp"
+    with stage("write", rows=len(feats)):
+        feats.to_csv(tmp, index=False)
+        os.replace(tmp, out_csv)
+    print(f"[features] Wrote {len(feats)} windows from {len(files)} raw logs -> {out_csv}")
+    if store is not None:
+        n = store.append(feats, "timeline", decimation, windowing="epoch")
+        print(f"[features] {n} new or changed rows -> feature store {store_dir}")
+    return feats
+
 def main():
-    raw_path = latest_raw_file("data/raw")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw", help="Raw log to process (default: latest in data/raw)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append newly closed windows to features_<session>.csv using a checkpoint")
+    parser.add_argument("--finalize", action="store_true",
+                        help="With --incremental: also close the last open window (session ended)")
+    parser.add_argument("--all", action="store_true",
+                        help="Process every raw log in parallel into all_sessions.csv (unchanged files are skipped)")
+    parser.add_argument("--workers", type=int, help="Processes for --all (default: all cores)")
+    parser.add_argument("--hop", type=int, metavar="MS",
+                        help="Overlapping 60 s windows every MS ms (written to its own CSV, not the feature store)")
+    parser.add_argument("--scales", metavar="MIN,...",
+                        help="Also trailing multi-minute features, e.g. 5,15 (from 1-minute mergeable states)")
+    parser.add_argument("--states", help="With --scales: derive from this states_*.csv instead of a raw log")
+    parser.add_argument("--stitch", action="store_true",
+                        help="Every raw log as one epoch-aligned timeline (restarts do not split windows)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="With --stitch: also upsert the timeline into a feature store at DIR "
+                             f"(not {FEATURE_STORE_DIR}, which holds per-log windows)")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_run("features", args)
+
+    if args.scales and args.states:
+        multiscale_run(None, args.states, [int(m) for m in args.scales.split(",")])
+        return
+    if args.all:
+        try:
+            batch_features(workers=args.workers)
+        except BatchError as e:
+            print(f"[features] {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+    if args.stitch:
+        stitched_features(store_dir=args.store)
+        return
+
+    raw_path = args.raw or latest_raw_file("data/raw")
     print(f"[features] Using raw: {raw_path}")
+    if args.incremental:
+        incremental_features(raw_path, finalize=args.finalize)
+        return
+    if args.scales:
+        multiscale_run(raw_path, None, [int(m) for m in args.scales.split(",")])
+        return
+    if args.hop:
+        with stage("read") as st:
+            df = read_raw(raw_path)
+            st.rows = len(df)
+        with stage("compute", rows=len(df)):
+            sliding = compute_sliding_features(df, WINDOW_MS, args.hop)
+        if sliding.empty:
+            print("[features] Raw file is empty. Collect more events and rerun.")
+            return
+        os.makedirs(FEATURES_DIR, exist_ok=True)
+        out_csv = os.path.join(FEATURES_DIR, f"sliding_{args.hop}ms_{iso_stamp()}.csv")
+        with stage("postprocess", rows=len(sliding)):
+            sliding = fill_and_clip(sliding)
+        with stage("write", rows=len(sliding)):
+            sliding.to_csv(out_csv, index=False)
+        print(f"[features] Wrote {len(sliding)} sliding windows (hop {args.hop} ms) -> {out_csv}")
+        return
 
-    df = read_ndjson(raw_path)
-    if df.empty:
+    decimation = log_decimation(raw_path)
+    store = FeatureStore()
+    store.check_source(decimation)   # before the CSV is written
+    feats = stream_features(raw_path)
+    if feats.empty:
         print("[features] Raw file is empty. Collect more events and rerun.")
         return
 
-    df = add_window_index(df, window_ms=WINDOW_MS)
-    feats = compute_window_features(df)
-    feats = fill_and_clip(feats)
+    with stage("postprocess", rows=len(feats)):
+        feats = fill_and_clip(feats)
 
     os.makedirs(FEATURES_DIR, exist_ok=True)
     out_csv = os.path.join(FEATURES_DIR, f"features_{iso_stamp()}.csv")
-    feats.to_csv(out_csv, index=False)
+    with stage("write", rows=len(feats)):
+        feats.to_csv(out_csv, index=False)
+        n = store.append(feats, session_name(raw_path), decimation)
     print(f"[features] Wrote {len(feats)} rows -> {out_csv}")
+    print(f"[features] {n} new or changed rows -> feature store {FEATURE_STORE_DIR}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,116 @@
+# src/features/trainmatrix.py
+# Binary training matrix (data/datasets/train/), written partition by partition by
+# datasetbuilder and memory-mapped by train.py instead of parsing train.csv.
+# Layout:
+#   manifest.json     rows, feature names, per-file dtype, whether rows are in t_start order
+#   X.f32             features, row-major float32 (rows x features): what the CV
+#                     workers attach to directly, no copy
+#   <column>.bin      window_id / t_start / t_end (int64), fatigue_score (float32)
+# - The writer appends each partition's rows to the files as it goes, so a build holds
+#   one partition in memory, never the dataset
+# - It writes into a temporary directory and swaps it in on close(): a model being
+#   trained from the previous matrix keeps reading intact files, and a crashed build
+#   leaves the old matrix in place
+
+import os, json, shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+TRAIN_MATRIX_DIR = "data/datasets/train"
+MATRIX_FILE   = "X.f32"
+MATRIX_DTYPE  = "<f4"
+LABEL_COLUMN  = "fatigue_score"
+META_COLUMNS  = {"window_id": "<i8", "t_start": "<i8", "t_end": "<i8"}
+COLUMN_DTYPES = {**META_COLUMNS, LABEL_COLUMN: "<f4"}
+NON_FEATURES  = {"session", *META_COLUMNS, LABEL_COLUMN}   # = train.py's EXCLUDE
+
+def feature_columns(columns: List[str]) -> List[str]:
+    return [c for c in columns if c not in NON_FEATURES]
+
+class TrainMatrixWriter:
+    def __init__(self, root: str = TRAIN_MATRIX_DIR):
+        self.root = root
+        self.tmp = f"{root}.tmp-{os.getpid()}"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.features: Optional[List[str]] = None
+        self.rows = 0
+        self.sorted = True
+        self._last_t: Optional[int] = None
+        self._files: Dict[str, Any] = {}
+
+    def append(self, df: pd.DataFrame) -> int:
+        """Add labeled rows (META_COLUMNS + fatigue_score + the features); returns rows written."""
+        if self.features is None:
+            self.features = feature_columns([c for c in df.columns
+                                             if c in NON_FEATURES or pd.api.types.is_numeric_dtype(df[c])])
+            for name in [MATRIX_FILE] + [f"{c}.bin" for c in COLUMN_DTYPES]:
+                self._files[name] = open(os.path.join(self.tmp, name), "wb")
+        if df.empty:
+            return 0
+        missing = (set(self.features) | set(COLUMN_DTYPES)) - set(df.columns)
+        if missing:
+            raise ValueError(f"dataset rows missing columns: {missing}")
+        self._files[MATRIX_FILE].write(np.ascontiguousarray(df[self.features].to_numpy(dtype=MATRIX_DTYPE)).tobytes())
+        for col, dtype in COLUMN_DTYPES.items():
+            self._files[f"{col}.bin"].write(df[col].to_numpy().astype(dtype).tobytes())
+        t = df["t_start"].to_numpy(dtype=np.int64)
+        self.sorted = self.sorted and bool((np.diff(t) >= 0).all()) and (self._last_t is None or int(t[0]) >= self._last_t)
+        self._last_t = int(t[-1]) if self._last_t is None else max(self._last_t, int(t.max()))
+        self.rows += len(df)
+        return len(df)
+
+    def close(self, source: Optional[str] = None) -> str:
+        """Write the manifest and swap the new matrix in place of the old one."""
+        for f in self._files.values():
+            f.close()
+        manifest = {"version": 1, "rows": self.rows, "features": self.features or [],
+                    "matrix": {"file": MATRIX_FILE, "dtype": MATRIX_DTYPE},
+                    "columns": COLUMN_DTYPES, "sorted": self.sorted, "source": source,
+                    "built": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        with open(os.path.join(self.tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        old = f"{self.root}.old-{os.getpid()}"
+        if os.path.exists(self.root):
+            os.replace(self.root, old)   # open memory maps keep the old files alive
+        os.replace(self.tmp, self.root)
+        shutil.rmtree(old, ignore_errors=True)
+        return self.root
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+class TrainMatrix:
+    """Read side: every file memory-mapped, nothing parsed or copied up front."""
+    def __init__(self, root: str = TRAIN_MATRIX_DIR):
+        self.root = root
+        with open(os.path.join(root, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.rows: int = self.manifest["rows"]
+        self.features: List[str] = self.manifest["features"]
+        self.sorted: bool = self.manifest["sorted"]
+
+    @staticmethod
+    def exists(root: str = TRAIN_MATRIX_DIR) -> bool:
+        return os.path.exists(os.path.join(root, "manifest.json"))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def X(self) -> np.ndarray:
+        m = self.manifest["matrix"]
+        if not self.rows:
+            return np.zeros((0, len(self.features)), dtype=m["dtype"])
+        return np.memmap(os.path.join(self.root, m["file"]), dtype=m["dtype"], mode="r",
+                         shape=(self.rows, len(self.features)))
+
+    def column(self, name: str) -> np.ndarray:
+        dtype = self.manifest["columns"][name]
+        if not self.rows:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.root, f"{name}.bin"), dtype=dtype, mode="r", shape=(self.rows,))
@@ -1,20 +1,39 @@
 # src/features/windowing.py
-# Read NDJSON logs and slice events into fixed windows.
+# Read NDJSON (or binary) logs and slice events into fixed windows.
+# A raw log is a file, or a directory of NDJSON segments (src/utils/segments.py) read as
+# their concatenation; offsets into one count its segments' uncompressed bytes.
 
 import json, os, glob
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-def read_ndjson(path: str) -> pd.DataFrame:
+from src.utils.io import BIN_SUFFIX, BIN_HEADER_SIZE, EVENT_DTYPE, EVENT_TYPES, FLAG_BACKSPACE, open_binary, name_table
+from src.utils.segments import open_raw, is_segmented, load_index, covering_segments
+
+RAW_COLUMNS: List[str] = ["t","type","x","y","dx","dy","btn","is_backspace","special"]
+CHUNK_LINES = 100_000   # lines parsed per chunk by the streaming reader
+LATE_MS     = 2_000     # how late an event may arrive (listener threads interleave)
+EPOCH_BASE_MS = 0       # base_ts_ms for epoch-aligned windows: window_id = t // window_ms
+
+class OutOfOrderError(ValueError):
+    """An event landed in a window the streaming reader had already emitted."""
+
+def read_ndjson(path: str, limit: Optional[int] = None) -> pd.DataFrame:
+    """All events of an NDJSON file (.gz / .xz too), or of its first `limit` bytes."""
     rows = []
-    with open(path, "r", encoding="utf-8") as f:
+    pos = 0
+    with open_raw(path) as f:
         for line in f:
+            pos += len(line)
+            if limit is not None and pos > limit:
+                break
             s = line.strip()
             if not s:
                 continue
             rows.append(json.loads(s))
     if not rows:
-        return pd.DataFrame(columns=["t","type","x","y","dx","dy","btn","is_backspace","special"])
+        return pd.DataFrame(columns=RAW_COLUMNS)
 
     df = pd.DataFrame(rows)
     # Ensure expected columns exist
@@ -22,9 +41,335 @@ def read_ndjson(path: str) -> pd.DataFrame:
         if c not in df.columns:
             df[c] = pd.NA
 
-    df = df.sort_values("t").reset_index(drop=True)
+    # Stable: ties keep file order, same as the streaming reader below
+    df = df.sort_values("t", kind="mergesort").reset_index(drop=True)
     return df
 
+def _parse_lines(lines: List[bytes]) -> pd.DataFrame:
+    """Parse NDJSON lines straight into typed column arrays (one frame per chunk)."""
+    n = len(lines)
+    t = np.empty(n, dtype=np.int64)
+    types = np.empty(n, dtype=object)
+    nums = {c: np.full(n, np.nan) for c in ("x","y","dx","dy")}
+    objs = {c: np.full(n, np.nan, dtype=object) for c in ("btn","is_backspace","special")}
+    for i, s in enumerate(lines):
+        ev = json.loads(s)
+        t[i] = ev["t"]
+        types[i] = ev.get("type")
+        for c, arr in nums.items():
+            v = ev.get(c)
+            if v is not None:
+                arr[i] = v
+        for c, arr in objs.items():
+            v = ev.get(c)
+            if v is not None:
+                arr[i] = v
+    return pd.DataFrame({"t": t, "type": types, **nums, **objs}, columns=RAW_COLUMNS)
+
+def iter_ndjson_chunks_from(path: str, start: int = 0, chunk_lines: int = CHUNK_LINES,
+                            limit: Optional[int] = None) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """
+    Yield (frame, end_offset) chunks of the log from byte offset `start` (up to byte
+    `limit`). end_offset is where the next read should resume; a trailing line without
+    newline (a write still in progress) is left for the next read.
+    """
+    buf: List[bytes] = []
+    pos = start
+    with open_raw(path) as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n") or (limit is not None and pos + len(line) > limit):
+                break
+            pos += len(line)
+            s = line.strip()
+            if not s:
+                continue
+            buf.append(s)
+            if len(buf) >= chunk_lines:
+                yield _parse_lines(buf), pos
+                buf = []
+    if buf:
+        yield _parse_lines(buf), pos
+
+def iter_ndjson_chunks(path: str, chunk_lines: int = CHUNK_LINES) -> Iterator[pd.DataFrame]:
+    """Yield the log as typed DataFrames of up to chunk_lines events, in file order."""
+    for chunk, _ in iter_ndjson_chunks_from(path, 0, chunk_lines):
+        yield chunk
+
+def _binary_frame(rec: np.ndarray, table: np.ndarray) -> pd.DataFrame:
+    """Records of a binary event file → frame with the read_ndjson columns."""
+    is_backspace = np.full(len(rec), np.nan, dtype=object)
+    is_backspace[(rec["flags"] & FLAG_BACKSPACE) != 0] = True
+    return pd.DataFrame({
+        "t": rec["t"],
+        "type": pd.Categorical.from_codes(rec["type"].astype(np.int16) - 1, categories=EVENT_TYPES),
+        "x": rec["x"], "y": rec["y"],
+        "dx": rec["dx"].astype(float), "dy": rec["dy"].astype(float),
+        "btn": table[rec["btn"]],
+        "is_backspace": is_backspace,
+        "special": table[rec["special"]],
+    }, columns=RAW_COLUMNS)
+
+def read_binary(path: str) -> pd.DataFrame:
+    """Memory-mapped counterpart of read_ndjson for binary event files."""
+    rec, header = open_binary(path)
+    df = _binary_frame(rec, name_table(header["names"]))
+    if len(df) and not (np.diff(df["t"].to_numpy()) >= 0).all():
+        df = df.sort_values("t", kind="mergesort").reset_index(drop=True)
+    return df
+
+def iter_binary_chunks_from(path: str, start: int = 0,
+                            chunk_lines: int = CHUNK_LINES) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """Binary counterpart of iter_ndjson_chunks_from (offsets count the header)."""
+    rec, header = open_binary(path)
+    table = name_table(header["names"])
+    first = max(0, (start - BIN_HEADER_SIZE) // EVENT_DTYPE.itemsize)
+    for i in range(first, len(rec), chunk_lines):
+        part = rec[i:i + chunk_lines]
+        yield _binary_frame(part, table), BIN_HEADER_SIZE + (i + len(part)) * EVENT_DTYPE.itemsize
+
+def iter_binary_chunks(path: str, chunk_lines: int = CHUNK_LINES) -> Iterator[pd.DataFrame]:
+    """Yield a binary log as frames of up to chunk_lines events, in file order."""
+    for chunk, _ in iter_binary_chunks_from(path, 0, chunk_lines):
+        yield chunk
+
+def is_binary(path: str) -> bool:
+    return path.endswith(BIN_SUFFIX)
+
+# ----------------- Segmented logs -----------------
+def _concat_sorted(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=RAW_COLUMNS)
+    # Each part is sorted; a stable sort of them in segment order = sorting the concatenation
+    df = pd.concat(parts, ignore_index=True)
+    return df.sort_values("t", kind="mergesort").reset_index(drop=True)
+
+def read_segmented(session_dir: str) -> pd.DataFrame:
+    return _concat_sorted([read_ndjson(e["path"], e["bytes"]) for e in covering_segments(session_dir)])
+
+def iter_segmented_chunks_from(session_dir: str, start: int = 0,
+                               chunk_lines: int = CHUNK_LINES) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """iter_ndjson_chunks_from over the committed bytes of every segment, in order."""
+    base = 0
+    for e in load_index(session_dir)["segments"]:
+        if start < base + e["bytes"]:
+            path = os.path.join(session_dir, e["file"])
+            for chunk, end in iter_ndjson_chunks_from(path, max(start - base, 0), chunk_lines, e["bytes"]):
+                yield chunk, base + end
+        base += e["bytes"]
+
+def raw_size(path: str) -> int:
+    """Bytes in a raw log; for a segmented one, its committed uncompressed bytes."""
+    if is_segmented(path):
+        return sum(e["bytes"] for e in load_index(path)["segments"])
+    return os.path.getsize(path)
+
+def read_raw_range(path: str, t_from: Optional[int] = None, t_to: Optional[int] = None) -> pd.DataFrame:
+    """Events with t_from <= t < t_to; a segmented log only opens the segments covering it."""
+    if is_segmented(path):
+        df = _concat_sorted([read_ndjson(e["path"], e["bytes"]) for e in covering_segments(path, t_from, t_to)])
+    else:
+        df = read_raw(path)
+    keep = np.ones(len(df), dtype=bool)
+    if t_from is not None:
+        keep &= df["t"].to_numpy() >= t_from
+    if t_to is not None:
+        keep &= df["t"].to_numpy() < t_to
+    return df if keep.all() else df[keep].reset_index(drop=True)
+
+def read_raw(path: str) -> pd.DataFrame:
+    """read_ndjson, read_binary or read_segmented depending on what path is."""
+    if is_segmented(path):
+        return read_segmented(path)
+    return read_binary(path) if is_binary(path) else read_ndjson(path)
+
+def iter_raw_chunks(path: str, chunk_lines: int = CHUNK_LINES) -> Iterator[pd.DataFrame]:
+    if is_segmented(path):
+        return (chunk for chunk, _ in iter_segmented_chunks_from(path, 0, chunk_lines))
+    return iter_binary_chunks(path, chunk_lines) if is_binary(path) else iter_ndjson_chunks(path, chunk_lines)
+
+def iter_raw_chunks_from(path: str, start: int = 0,
+                         chunk_lines: int = CHUNK_LINES) -> Iterator[Tuple[pd.DataFrame, int]]:
+    if is_segmented(path):
+        return iter_segmented_chunks_from(path, start, chunk_lines)
+    fn = iter_binary_chunks_from if is_binary(path) else iter_ndjson_chunks_from
+    return fn(path, start, chunk_lines)
+
+class WindowStream:
+    """
+    Incremental windower behind iter_windows: feed() chunks in file order and get back
+    the windows they close. window_id matches add_window_index on the whole file; a
+    window closes once an event at least late_ms past its end has been seen. state()
+    / from_state() checkpoint it (including the open window's events) between runs.
+
+    Raises OutOfOrderError if an event arrives for an already emitted window (or before
+    the base timestamp picked from the first chunk) — callers fall back to read_raw.
+    """
+    def __init__(self, window_ms: int = 60_000, base_ts_ms: Optional[int] = None, late_ms: int = LATE_MS):
+        self.window_ms = int(window_ms)
+        self.late_ms = int(late_ms)
+        self.fixed_base = base_ts_ms is not None
+        self.t0: Optional[int] = None if base_ts_ms is None else int(base_ts_ms)
+        self.next_open: Optional[int] = None   # smallest window_id not emitted yet
+        self.max_t: Optional[int] = None
+        self.pending = pd.DataFrame(columns=RAW_COLUMNS + ["window_id"])
+
+    def feed(self, chunk: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """Add a chunk; returns the events of newly closed windows (sorted by t) or None."""
+        if chunk.empty:
+            return None
+        if self.t0 is None:
+            self.t0 = int(chunk["t"].min())
+        elif not self.fixed_base and int(chunk["t"].min()) < self.t0:
+            raise OutOfOrderError(f"event at t={int(chunk['t'].min())} precedes first chunk base {self.t0}")
+        chunk = chunk.assign(window_id=(chunk["t"] - self.t0) // self.window_ms)   # not the caller's frame
+        if self.next_open is not None and int(chunk["window_id"].min()) < self.next_open:
+            raise OutOfOrderError(f"event for window {int(chunk['window_id'].min())} "
+                                  f"arrived after window {self.next_open - 1} was emitted")
+        t_max = int(chunk["t"].max())
+        self.max_t = t_max if self.max_t is None else max(self.max_t, t_max)
+
+        pending = pd.concat([self.pending, chunk], ignore_index=True) if len(self.pending) else chunk
+        horizon = (self.max_t - self.late_ms - self.t0) // self.window_ms   # windows below are closed
+        done = pending["window_id"].to_numpy() < horizon
+        self.pending = pending[~done]
+        if not done.any():
+            return None
+        self.next_open = horizon
+        return pending[done].sort_values("t", kind="mergesort").reset_index(drop=True)
+
+    def finish(self) -> Optional[pd.DataFrame]:
+        """Close everything still open (end of input)."""
+        if not len(self.pending):
+            return None
+        out = self.pending.sort_values("t", kind="mergesort").reset_index(drop=True)
+        self.next_open = int(out["window_id"].max()) + 1
+        self.pending = self.pending.iloc[0:0]
+        return out
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serializable state; the open window's events go in as rows (NaN → None)."""
+        rows = self.pending[RAW_COLUMNS].astype(object)
+        return {"window_ms": self.window_ms, "late_ms": self.late_ms, "fixed_base": self.fixed_base,
+                "t0": self.t0, "next_open": self.next_open, "max_t": self.max_t,
+                "pending": rows.where(rows.notna(), None).values.tolist()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "WindowStream":
+        ws = cls(state["window_ms"], state["t0"] if state["fixed_base"] else None, state["late_ms"])
+        ws.t0, ws.next_open, ws.max_t = state["t0"], state["next_open"], state["max_t"]
+        if state["pending"]:
+            p = pd.DataFrame(state["pending"], columns=RAW_COLUMNS)
+            p["t"] = p["t"].astype("int64")
+            for c in ("x","y","dx","dy"):
+                p[c] = p[c].astype(float)
+            for c in ("type","btn","is_backspace","special"):
+                p[c] = p[c].astype(object).where(p[c].notna(), np.nan)
+            p["window_id"] = (p["t"] - ws.t0) // ws.window_ms
+            ws.pending = p
+        return ws
+
+def iter_windows(path: str, window_ms: int = 60_000, base_ts_ms: Optional[int] = None,
+                 chunk_lines: int = CHUNK_LINES, late_ms: int = LATE_MS) -> Iterator[pd.DataFrame]:
+    """
+    Stream a log and yield frames of complete windows (see WindowStream) as soon as they
+    close. Each frame holds one or more windows; memory stays bounded by one chunk plus
+    the open window.
+    """
+    stream = WindowStream(window_ms, base_ts_ms, late_ms)
+    for chunk in iter_raw_chunks(path, chunk_lines):
+        out = stream.feed(chunk)
+        if out is not None:
+            yield out
+    out = stream.finish()
+    if out is not None:
+        yield out
+
+def first_timestamp(path: str) -> Optional[int]:
+    """t of a log's first event (from the index / first record / first line), None if empty."""
+    if is_segmented(path):
+        segs = load_index(path)["segments"]
+        return min((e["t_min"] for e in segs if e["events"]), default=None)
+    if is_binary(path):
+        rec, _ = open_binary(path)
+        return int(rec["t"][0]) if len(rec) else None
+    with open_raw(path) as f:
+        for line in f:
+            s = line.strip()
+            if s:
+                return int(json.loads(s)["t"])
+    return None
+
+def iter_merged_chunks(paths: List[str], chunk_lines: int = CHUNK_LINES) -> Iterator[pd.DataFrame]:
+    """
+    k-way merge of several logs into one stream in timestamp order. Files are ordered by
+    their first timestamp and only opened once the merge reaches it, so only files that
+    overlap in time are buffered (about one chunk each). Events are released up to the
+    smallest "latest t read" among the open files, and below the start of the next
+    unopened one; the file holding the watermark back is read next. Each file only needs
+    to be in order up to LATE_MS (what WindowStream tolerates anyway).
+    """
+    starts = {i: first_timestamp(p) for i, p in enumerate(paths)}
+    # A file's events may precede its first line by up to LATE_MS
+    pending = sorted((t - LATE_MS, i) for i, t in starts.items() if t is not None)
+    its: Dict[int, Iterator[pd.DataFrame]] = {}
+    buf: Dict[int, pd.DataFrame] = {}
+    seen: Dict[int, int] = {}
+
+    def pull(i: int):
+        for chunk in its[i]:
+            if chunk.empty:
+                continue
+            buf[i] = pd.concat([buf[i], chunk], ignore_index=True) if i in buf else chunk
+            seen[i] = max(seen.get(i, int(chunk["t"].min())), int(chunk["t"].max()))
+            return
+        del its[i]   # exhausted
+
+    while True:
+        # Open every file the merge has reached (all of them left, once nothing is open)
+        while pending and (not its or min(seen[i] for i in its) >= pending[0][0]):
+            _, i = pending.pop(0)
+            its[i] = iter_raw_chunks(paths[i], chunk_lines)
+            pull(i)
+        if not (buf or its or pending):
+            return
+        bounds = [seen[i] for i in its] + ([pending[0][0] - 1] if pending else [])
+        watermark = min(bounds, default=None)
+        parts = []
+        for i in sorted(buf):   # file order breaks timestamp ties
+            b = buf[i]
+            if watermark is None:
+                parts.append(b)
+                del buf[i]
+                continue
+            ready = b["t"].to_numpy() <= watermark
+            if ready.any():
+                parts.append(b[ready])
+                buf[i] = b[~ready].reset_index(drop=True)
+                if buf[i].empty:
+                    del buf[i]
+        if parts:
+            out = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            yield out.sort_values("t", kind="mergesort").reset_index(drop=True)
+        if its:
+            pull(min(its, key=lambda i: seen.get(i, -1)))
+
+def iter_stitched_windows(paths: List[str], window_ms: int = 60_000, chunk_lines: int = CHUNK_LINES,
+                          late_ms: int = LATE_MS) -> Iterator[pd.DataFrame]:
+    """
+    iter_windows over several logs as one timeline: epoch-aligned window_ids, so windows
+    line up across files and one spanning an app restart gets the events of both.
+    """
+    stream = WindowStream(window_ms, EPOCH_BASE_MS, late_ms)
+    for chunk in iter_merged_chunks(paths, chunk_lines):
+        out = stream.feed(chunk)
+        if out is not None:
+            yield out
+    out = stream.finish()
+    if out is not None:
+        yield out
+
 def add_window_index(df: pd.DataFrame, window_ms: int = 60_000, base_ts_ms: Optional[int] = None) -> pd.DataFrame:
     """Assign an integer window_id per event. If base_ts_ms not given, min(t) is used."""
     if df.empty:
@@ -34,8 +379,14 @@ def add_window_index(df: pd.DataFrame, window_ms: int = 60_000, base_ts_ms: Opti
     df["window_id"] = (df["t"] - t0) // window_ms
     return df
 
+def list_raw_files(raw_dir: str = "data/raw") -> List[str]:
+    """All raw logs (NDJSON, binary and segmented directories) in raw_dir, oldest session first."""
+    return sorted(glob.glob(os.path.join(raw_dir, "events_*.ndjson")) +
+                  glob.glob(os.path.join(raw_dir, f"events_*{BIN_SUFFIX}")) +
+                  [d for d in glob.glob(os.path.join(raw_dir, "events_*")) if is_segmented(d)])
+
 def latest_raw_file(raw_dir: str = "data/raw") -> str:
-    files = sorted(glob.glob(os.path.join(raw_dir, "events_*.ndjson")))
+    files = list_raw_files(raw_dir)
     if not files:
-        raise FileNotFoundError(f"No NDJSON files found in {raw_dir}")
-    return files[-1]
\ No newline at end of file
+        raise FileNotFoundError(f"No raw event files found in {raw_dir}")
+    return files[-1]
@@ -0,0 +1,427 @@
+# src/inference/ingest.py
+# Multi-user ingestion: many EventLoggers stream their flushed batches to one server,
+# which keeps a live feature state per user and appends a scored fatigue timeline.
+# - Front end: asyncio on localhost, one TCP connection per user, length-prefixed frames
+#     client → server  H hello {"user": ...}   B EVENT_DTYPE records   T clock tick (int64 ms)
+#                      E end of session        Q recent timeline {"last": n}   S server stats
+#     server → client  J JSON reply (hello / Q / S)   A batch accepted   X error (then closed)
+# - Streams and timelines only carry event timing / features (the same contentless
+#   records EventLogger writes); a worker loads pandas / the model lazily
+# - Users are sharded by crc32(user) over a pool of worker processes; each shard has a
+#   bounded queue (SHARD_QUEUE messages). A connection reads its next frame only after
+#   the previous one is queued, so a slow shard stalls its own users down to TCP
+#   (and, through the ack, the sending logger's flush thread) without touching the others
+# - A worker runs LiveFeatures per user (epoch-aligned windows, same rows as the batch
+#   path), scores each closed window with the newest model (reloaded when a newer one
+#   is complete) and appends it to data/users/<user>/timeline.csv
+#
+#   python -m src.inference.ingest --port 8770 --shards 4
+#   python -m src.collector.eventcapture --ingest 127.0.0.1:8770 --user alice
+#   python -m benchmarks.ingest_load --users 200   # load test
+
+import os, re, sys, csv, json, time, zlib, signal, socket, struct, asyncio, argparse, threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from src.utils.io import EVENT_DTYPE
+
+HOST = "127.0.0.1"
+PORT = 8770
+USERS_DIR = "data/users"
+SHARD_QUEUE = 256               # messages per shard before readers stall
+MAX_FRAME = 16 * 1024 * 1024
+TIMELINE_KEEP = 1440            # recent rows per user kept for Q (a day of minutes)
+LATENCY_SAMPLES = 10_000
+USER_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]{0,63}$")   # becomes a directory name (no "..")
+TIMELINE_COLUMNS_EXTRA = ["fatigue_score", "model"]
+
+FRAME = struct.Struct(">IB")    # payload length, kind
+TICK = struct.Struct(">q")
+
+# ----------------- Framing -----------------
+def pack_frame(kind: bytes, payload: bytes = b"") -> bytes:
+    return FRAME.pack(len(payload), kind[0]) + payload
+
+def pack_json(kind: bytes, obj: Any) -> bytes:
+    return pack_frame(kind, json.dumps(obj).encode("utf-8"))
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    n, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if n > MAX_FRAME:
+        raise ValueError(f"frame of {n} bytes exceeds {MAX_FRAME}")
+    return bytes([kind]), (await reader.readexactly(n) if n else b"")
+
+def shard_of(user: str, shards: int) -> int:
+    return zlib.crc32(user.encode("utf-8")) % shards   # stable across restarts, unlike hash()
+
+# ----------------- Worker processes -----------------
+class _UserState:
+    def __init__(self, user: str, out_dir: str, window_ms: int):
+        from src.inference.livefeatures import LiveFeatures
+        from src.features.windowing import EPOCH_BASE_MS
+        self.user = user
+        self.live = LiveFeatures(window_ms, base_ts_ms=EPOCH_BASE_MS)   # window_id survives reconnects
+        self.path = os.path.join(out_dir, user, "timeline.csv")
+
+    def append(self, rows: List[Dict[str, Any]]):
+        from src.features.computecore import FEATURE_COLUMNS
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        new = not os.path.exists(self.path)
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=FEATURE_COLUMNS + TIMELINE_COLUMNS_EXTRA, extrasaction="ignore")
+            if new:
+                w.writeheader()
+            w.writerows(rows)
+
+class _Scorer:
+    """Newest complete model (flat forest where exported); checked again every RELOAD_POLL_SEC."""
+    def __init__(self, models_dir: str):
+        from src.inference.server import RELOAD_POLL_SEC
+        self.models_dir = models_dir
+        self.poll_sec = RELOAD_POLL_SEC
+        self.current = None
+        self._rejected = None   # newest dir that failed to load (stale or broken): not retried
+        self._refresh()   # before the first window: a cold load would add to its lag
+
+    def _refresh(self):
+        from src.inference.server import LoadedModel, MODEL_FILES
+        from src.inference.predict import latest, load_latest_model
+        self._checked = time.monotonic()
+        try:
+            d = latest(os.path.join(self.models_dir, "*_rf"))
+        except FileNotFoundError:
+            return
+        if (self.current is not None and d == self.current.model_dir) or d == self._rejected or \
+                not all(os.path.exists(os.path.join(d, f)) for f in MODEL_FILES):
+            return
+        try:
+            model, cols, _ = load_latest_model(d)
+            self.current = LoadedModel(model, cols, d)
+        except Exception as e:   # keep scoring with the previous one
+            print(f"[ingest] Loading model {d} failed: {e}")
+            self._rejected = d
+
+    def score(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        import pandas as pd
+        from src.features.postprocess import fill_and_clip
+        if time.monotonic() - self._checked >= self.poll_sec:
+            self._refresh()
+        m = self.current
+        if m is None:
+            return [{**r, "fatigue_score": None, "model": None} for r in rows]
+        filled = fill_and_clip(pd.DataFrame(rows)).to_dict("records")   # as in training
+        scores = m.predict(filled)
+        return [{**r, "fatigue_score": float(s), "model": os.path.basename(m.model_dir)}
+                for r, s in zip(rows, scores)]
+
+def _shard_main(shard: int, inbox, results, out_dir: str, models_dir: str, window_ms: int):
+    """One worker process: every message of a user arrives here, in order."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the front end stops us with a None message
+    users: Dict[str, _UserState] = {}
+    scorer = _Scorer(models_dir)
+
+    def emit(st: _UserState, rows: List[Dict[str, Any]], queued_at: float):
+        scored = scorer.score(rows)
+        st.append(scored)
+        results.put((st.user, scored, time.time() - queued_at))
+
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        kind, user, payload, queued_at = msg
+        st = users.get(user)
+        if st is None:
+            st = users[user] = _UserState(user, out_dir, window_ms)
+        try:
+            if kind == "B":
+                rows = st.live.feed(np.frombuffer(payload, dtype=EVENT_DTYPE))
+            elif kind == "T":
+                rows = st.live.advance(payload)
+            else:
+                rows = st.live.finish()
+                del users[user]
+            if rows:
+                emit(st, rows, queued_at)
+        except Exception as e:   # one user's bad batch must not take the shard down
+            print(f"[ingest] shard {shard}: {user}: {type(e).__name__}: {e}", file=sys.stderr)
+    for st in users.values():   # shutting down: close every open window
+        rows = st.live.finish()
+        if rows:
+            emit(st, rows, time.time())
+    results.put(None)
+
+# ----------------- Front end -----------------
+class IngestStats:
+    def __init__(self, n: int = LATENCY_SAMPLES):
+        self.lock = threading.Lock()
+        self.enqueue_s = deque(maxlen=n)   # > 0 when a shard queue was full: backpressure
+        self.row_lag_s = deque(maxlen=n)   # message queued → its window scored and written
+        self.connections = self.batches = self.events = self.bytes = self.rows = self.rejected = 0
+        self.stalled = 0                   # enqueues that waited > 1 ms
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            out: Dict[str, Any] = {k: getattr(self, k) for k in
+                                   ("connections", "batches", "events", "bytes", "rows", "rejected", "stalled")}
+            enq, lag = np.array(self.enqueue_s), np.array(self.row_lag_s)
+        for name, a in (("enqueue_ms", enq), ("row_lag_ms", lag)):
+            out[name] = ({"p50": float(np.percentile(a, 50) * 1e3), "p99": float(np.percentile(a, 99) * 1e3),
+                          "max": float(a.max() * 1e3)} if a.size else None)
+        return out
+
+class IngestServer:
+    def __init__(self, host: str = HOST, port: int = PORT, shards: Optional[int] = None,
+                 out_dir: str = USERS_DIR, models_dir: str = "models", window_ms: int = 60_000,
+                 queue_size: int = SHARD_QUEUE):
+        self.host, self.port = host, port
+        self.shards = shards or os.cpu_count() or 1
+        self.stats = IngestStats()
+        self.active: Dict[str, int] = {}                    # user → shard, while connected
+        self.timelines: Dict[str, deque] = {}
+        self._results = mp.Queue()
+        self._inboxes = [mp.Queue(maxsize=queue_size) for _ in range(self.shards)]
+        self._workers = [mp.Process(target=_shard_main, daemon=True, name=f"ingest-shard-{i}",
+                                    args=(i, q, self._results, out_dir, models_dir, window_ms))
+                         for i, q in enumerate(self._inboxes)]
+        # One thread per shard does the blocking put: keeps each shard's order, and a
+        # full shard only parks its own connections
+        self._putters = [ThreadPoolExecutor(1, thread_name_prefix=f"ingest-put-{i}") for i in range(self.shards)]
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._stop: Optional[asyncio.Event] = None
+
+    # -------- Worker side --------
+    def _collect(self):
+        running = self.shards
+        while running:
+            item = self._results.get()
+            if item is None:
+                running -= 1
+                continue
+            user, rows, lag_s = item
+            tl = self.timelines.get(user)
+            if tl is None:
+                tl = self.timelines[user] = deque(maxlen=TIMELINE_KEEP)
+            tl.extend(rows)
+            with self.stats.lock:
+                self.stats.rows += len(rows)
+                self.stats.row_lag_s.append(lag_s)
+
+    async def _enqueue(self, shard: int, msg: Tuple[str, str, Any, float]):
+        t0 = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._putters[shard], self._inboxes[shard].put, msg)
+        waited = time.perf_counter() - t0
+        with self.stats.lock:
+            self.stats.enqueue_s.append(waited)
+            self.stats.stalled += waited > 1e-3
+
+    # -------- Connections --------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        user: Optional[str] = None
+        try:
+            kind, payload = await read_frame(reader)
+            if kind == b"S":   # stats without a session
+                writer.write(pack_json(b"J", self.summary()))
+                return
+            hello = json.loads(payload) if kind == b"H" else {}
+            name = hello.get("user") if isinstance(hello, dict) else None
+            if not isinstance(name, str) or not USER_RE.match(name):
+                raise ValueError("expected hello {\"user\": name of letters, digits, _ . - (max 64)}")
+            if name in self.active:
+                raise ValueError(f"user {name} is already connected")
+            user, shard = name, shard_of(name, self.shards)
+            self.active[user] = shard
+            with self.stats.lock:
+                self.stats.connections += 1
+            writer.write(pack_json(b"J", {"ok": True, "user": user, "shard": shard}))
+            while True:
+                try:
+                    kind, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    return   # dropped: the user's state stays open for a reconnect
+                if kind == b"B":
+                    if len(payload) % EVENT_DTYPE.itemsize:
+                        raise ValueError("batch is not a whole number of records")
+                    await self._enqueue(shard, ("B", user, payload, time.time()))
+                    with self.stats.lock:
+                        self.stats.batches += 1
+                        self.stats.events += len(payload) // EVENT_DTYPE.itemsize
+                        self.stats.bytes += len(payload)
+                    writer.write(pack_frame(b"A"))
+                elif kind == b"T":
+                    await self._enqueue(shard, ("T", user, TICK.unpack(payload)[0], time.time()))
+                elif kind == b"E":
+                    await self._enqueue(shard, ("E", user, None, time.time()))
+                    writer.write(pack_json(b"J", {"ok": True}))
+                    return
+                elif kind == b"Q":
+                    last = int((json.loads(payload) if payload else {}).get("last", 60))
+                    rows = list(self.timelines.get(user, ()))[-last:] if last > 0 else []
+                    writer.write(pack_json(b"J", {"user": user, "rows": rows}))
+                elif kind == b"S":
+                    writer.write(pack_json(b"J", self.summary()))
+                else:
+                    raise ValueError(f"unknown frame {kind!r}")
+                await writer.drain()
+        except (ValueError, KeyError, TypeError, struct.error) as e:   # protocol error: tell the client
+            with self.stats.lock:
+                self.stats.rejected += 1
+            writer.write(pack_json(b"X", {"error": str(e)}))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if user is not None:
+                self.active.pop(user, None)
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        per_shard = []
+        for i, q in enumerate(self._inboxes):
+            try:
+                depth: Optional[int] = q.qsize()
+            except NotImplementedError:   # macOS
+                depth = None
+            per_shard.append({"shard": i, "users": sum(1 for s in self.active.values() if s == i), "queued": depth})
+        return {"shards": self.shards, "users_active": len(self.active), "users_seen": len(self.timelines),
+                **self.stats.summary(), "per_shard": per_shard}
+
+    # -------- Lifecycle --------
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop.set)
+            except (NotImplementedError, RuntimeError):   # Windows: Ctrl+C raises instead
+                pass
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"[ingest] Listening on {host}:{port} ({self.shards} shards)", flush=True)
+        async with server:
+            await self._stop.wait()
+
+    def serve(self):
+        for w in self._workers:
+            w.start()
+        self._collector.start()
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for ex, q in zip(self._putters, self._inboxes):
+                ex.shutdown(wait=True)
+                q.put(None)
+            for w in self._workers:
+                w.join()
+            self._collector.join(timeout=5)
+            print(f"[ingest] Stopped. {json.dumps(self.summary())}", flush=True)
+
+# ----------------- Client (inside EventLogger) -----------------
+class IngestClient:
+    """
+    Streams one user's batches to an IngestServer. Has LiveFeatures' feed / advance /
+    finish, so EventLogger(live=IngestClient(...)) needs no other change. Blocks on each
+    batch's ack (server backpressure reaches the flush thread and its rings). If the
+    server goes away the session keeps logging locally; a reconnect is tried every
+    RECONNECT_SEC and batches in between are only in the local log.
+    """
+    RECONNECT_SEC = 10.0
+
+    def __init__(self, user: str, host: str = HOST, port: int = PORT, timeout: float = 30.0):
+        self.user, self.addr, self.timeout = user, (host, port), timeout
+        self.sock: Optional[socket.socket] = None
+        self.sent = self.lost = 0
+        self._retry_at = 0.0
+        self._connect()
+
+    def _connect(self):
+        self._retry_at = time.monotonic() + self.RECONNECT_SEC
+        try:
+            sock = socket.create_connection(self.addr, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(pack_json(b"H", {"user": self.user}))
+            self.sock = sock
+            reply = self._reply()
+            print(f"[ingest] Streaming as {self.user} to {self.addr[0]}:{self.addr[1]} (shard {reply['shard']})")
+        except (OSError, ValueError) as e:
+            print(f"[ingest] Not connected to {self.addr[0]}:{self.addr[1]}: {e}", file=sys.stderr)
+            self._drop()
+
+    def _recv(self, n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            buf += chunk
+        return buf
+
+    def _reply(self) -> Any:
+        n, kind = FRAME.unpack(self._recv(FRAME.size))
+        payload = self._recv(n) if n else b""
+        if kind == ord("X"):
+            raise ValueError(json.loads(payload)["error"])
+        return json.loads(payload) if kind == ord("J") else None
+
+    def _drop(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+    def _send(self, frame: bytes, reply: bool) -> bool:
+        if self.sock is None and time.monotonic() >= self._retry_at:
+            self._connect()
+        if self.sock is None:
+            return False
+        try:
+            self.sock.sendall(frame)
+            if reply:
+                self._reply()
+            return True
+        except (OSError, ValueError) as e:
+            print(f"[ingest] Connection lost: {e}", file=sys.stderr)
+            self._drop()
+            return False
+
+    def feed(self, rec: np.ndarray) -> List[Dict[str, Any]]:
+        if len(rec):
+            ok = self._send(pack_frame(b"B", np.ascontiguousarray(rec, dtype=EVENT_DTYPE).tobytes()), reply=True)
+            if ok:
+                self.sent += len(rec)
+            else:
+                self.lost += len(rec)
+        return []   # rows come back scored on the server (timeline), not here
+
+    def advance(self, now_ms: int) -> List[Dict[str, Any]]:
+        self._send(pack_frame(b"T", TICK.pack(int(now_ms))), reply=False)
+        return []
+
+    def finish(self) -> List[Dict[str, Any]]:
+        self._send(pack_frame(b"E"), reply=True)
+        self._drop()
+        print(f"[ingest] Sent {self.sent} events ({self.lost} while disconnected).")
+        return []
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-user ingestion server: live features + fatigue timeline per user.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT, help="0 picks a free port (printed at startup)")
+    parser.add_argument("--shards", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--out", default=USERS_DIR, help="Per-user timelines go to OUT/<user>/timeline.csv")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--window-ms", type=int, default=60_000)
+    parser.add_argument("--queue", type=int, default=SHARD_QUEUE, help="Messages buffered per shard before readers stall")
+    args = parser.parse_args()
+    IngestServer(args.host, args.port, args.shards, args.out, args.models_dir, args.window_ms, args.queue).serve()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
-# Loads the newest model and predicts on the latest features CSV's last row.
-import os, json, glob
+# Loads the newest model and predicts on the newest feature window (feature store,
+# or the latest features CSV's last row if there is no store yet).
+# Uses the model's flattened forest.npz when it has one (no sklearn import or unpickling).
+# Models trained on another FEATURE_VERSION (none recorded in metrics.json = 1) or without a
+# metrics.json are refused: their inputs meant something else (e.g. mouse features that were
+# always 0).
+# --trace: per-stage time / CPU / peak RSS into data/logs/runs.ndjson (timeutils.py)
+import os, json, glob, argparse
 import pandas as pd
-import joblib
+
+from src.features.computecore import FEATURE_VERSION
+from src.features.featurestore import FeatureStore, FEATURE_STORE_DIR
+from src.model.export import FOREST_NPZ, load_flat
+from src.utils.timeutils import stage, add_trace_args, start_run
 
 FEATURES_DIR = "data/features"
 MODELS_DIR   = "models"
@@ -12,27 +22,72 @@ def latest(path_glob: str) -> str:
         raise FileNotFoundError(f"No matches for {path_glob}")
     return files[-1]
 
-def load_latest_model():
-    model_dir = latest(os.path.join(MODELS_DIR, "*_rf"))
+class StaleModelError(ValueError):
+    """The model was trained on features computed differently from the current code."""
+
+def check_feature_version(model_dir: str):
+    """Raise StaleModelError unless model_dir was trained on FEATURE_VERSION features."""
+    path = os.path.join(model_dir, "metrics.json")
+    if not os.path.exists(path):
+        raise StaleModelError(f"{model_dir} has no metrics.json (training did not finish), so its "
+                              "feature version is unknown; retrain it (see README, Upgrading)")
+    with open(path, "r") as f:
+        version = json.load(f).get("feature_version", 1)   # written before versioning: 1
+    if version != FEATURE_VERSION:
+        raise StaleModelError(f"{model_dir} was trained on feature version {version}, features are now "
+                              f"version {FEATURE_VERSION}; rebuild the dataset and retrain (see README, Upgrading)")
+
+def load_latest_model(model_dir: str = None):
+    """Newest models/*_rf (or the given model_dir) → (model, feature columns, model_dir)."""
+    if model_dir is None:
+        model_dir = latest(os.path.join(MODELS_DIR, "*_rf"))
+    check_feature_version(model_dir)
+    import joblib   # pulls in sklearn on unpickling; load_latest_flat avoids both
     model = joblib.load(os.path.join(model_dir, "model.joblib"))
     with open(os.path.join(model_dir, "features_used.json"), "r") as f:
         feats = json.load(f)
     return model, feats, model_dir
 
+def load_latest_flat(model_dir: str = None):
+    """Like load_latest_model, but the memory-mapped forest.npz (None if not exported)."""
+    if model_dir is None:
+        model_dir = latest(os.path.join(MODELS_DIR, "*_rf"))
+    path = os.path.join(model_dir, FOREST_NPZ)
+    if not os.path.exists(path):
+        return None
+    check_feature_version(model_dir)
+    with open(os.path.join(model_dir, "features_used.json"), "r") as f:
+        feats = json.load(f)
+    return load_flat(path), feats, model_dir
+
 def main():
-    features_csv = latest(os.path.join(FEATURES_DIR, "features_*.csv"))
-    print(f"[predict] Using features: {features_csv}")
+    parser = argparse.ArgumentParser(description="Predict the fatigue score of the newest feature window.")
+    add_trace_args(parser)
+    start_run("predict", parser.parse_args())
+
+    with stage("load"):
+        model, feature_cols, model_dir = load_latest_flat() or load_latest_model()
 
-    df = pd.read_csv(features_csv)
-    if df.empty:
-        raise ValueError("Features file is empty.")
-    last = df.iloc[-1:].copy()
+    with stage("read", rows=1):
+        if FeatureStore.exists(FEATURE_STORE_DIR):
+            print(f"[predict] Using features: {FEATURE_STORE_DIR}")
+            # Only the newest row, only the columns the model needs
+            last = FeatureStore(FEATURE_STORE_DIR).latest(1, columns=["window_id"] + feature_cols)
+            if last.empty:
+                raise ValueError("Feature store is empty.")
+        else:
+            features_csv = latest(os.path.join(FEATURES_DIR, "features_*.csv"))
+            print(f"[predict] Using features: {features_csv}")
+            df = pd.read_csv(features_csv)
+            if df.empty:
+                raise ValueError("Features file is empty.")
+            last = df.iloc[-1:].copy()
 
-    model, feature_cols, model_dir = load_latest_model()
     # Align columns exactly as during training
-    X = last[feature_cols]
+    X = last[feature_cols] if hasattr(model, "feature_names_in_") else last[feature_cols].to_numpy(dtype=float)
 
-    score = float(model.predict(X)[0])
+    with stage("predict", rows=1):
+        score = float(model.predict(X)[0])
     print(f"[predict] Model: {model_dir}")
     print(f"[predict] Window_id={int(last['window_id'].iloc[0])} → Fatigue score ≈ {score:.2f}")
 
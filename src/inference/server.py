@@ -0,0 +1,192 @@
+# src/inference/server.py
+# Long-lived prediction server: the newest model stays loaded, requests only score.
+# - HTTP on localhost (keep-alive), JSON in/out:
+#     POST /predict  {"feat": ...}              → {"score": s, "model": dir}
+#     POST /predict  [{...}, ...] | {"rows": [...]} → {"scores": [...], "model": dir}
+#     GET  /stats    request/scoring latency p50/p99, rows served, model in use
+#     GET  /health
+# - Small batches go through the flattened forest (src/model/export.py, same results
+#   as model.predict); large ones through sklearn, which is faster per row there
+# - A watcher thread hot-swaps the model when a newer models/*_rf directory is complete
+#
+#   python -m src.inference.server --port 8765
+#   curl -s localhost:8765/predict -d @row.json
+
+import os, json, time, threading, argparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from src.inference.predict import MODELS_DIR, latest, load_latest_model
+from src.model.export import FOREST_NPZ, flatten_forest, load_flat
+
+HOST = "127.0.0.1"
+PORT = 8765
+RELOAD_POLL_SEC = 2.0
+LOCKSTEP_MAX_ROWS = 128     # above this sklearn's compiled traversal wins
+LATENCY_SAMPLES = 10_000    # recent requests kept for percentiles
+MODEL_FILES = ("model.joblib", "features_used.json", "metrics.json")   # metrics.json is written last
+
+class LoadedModel:
+    def __init__(self, model, feature_cols: List[str], model_dir: str):
+        self.model = model
+        self.feature_cols = feature_cols
+        self.model_dir = model_dir
+        if hasattr(self.model, "n_jobs"):
+            self.model.n_jobs = 1   # thread-pool startup costs more than one small request
+        try:
+            npz = os.path.join(model_dir, FOREST_NPZ)
+            self.flat = load_flat(npz) if os.path.exists(npz) else flatten_forest(model)
+        except (ValueError, AttributeError):
+            self.flat = None        # not a tree ensemble: sklearn path only
+
+    def predict(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        missing = [c for c in self.feature_cols if c not in rows[0]]
+        if missing:
+            raise ValueError(f"missing features: {missing}")
+        X = np.array([[r[c] for c in self.feature_cols] for r in rows], dtype=float)
+        if self.flat is not None and len(rows) <= LOCKSTEP_MAX_ROWS:
+            return self.flat.predict(X)
+        return self.model.predict(pd.DataFrame(X, columns=self.feature_cols))
+
+class LatencyStats:
+    def __init__(self, n: int = LATENCY_SAMPLES):
+        self.lock = threading.Lock()
+        self.request_s = deque(maxlen=n)
+        self.per_row_s = deque(maxlen=n)
+        self.requests = self.rows = self.errors = 0
+
+    def add(self, request_s: float, score_s: float, rows: int):
+        with self.lock:
+            self.requests += 1
+            self.rows += rows
+            self.request_s.append(request_s)
+            self.per_row_s.append(score_s / max(rows, 1))
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            req, row = np.array(self.request_s), np.array(self.per_row_s)
+            out: Dict[str, Any] = {"requests": self.requests, "rows": self.rows, "errors": self.errors}
+        for name, a in (("request_ms", req), ("score_per_row_ms", row)):
+            out[name] = ({"p50": float(np.percentile(a, 50) * 1e3), "p99": float(np.percentile(a, 99) * 1e3)}
+                         if a.size else None)
+        return out
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = HOST, port: int = PORT, models_dir: str = MODELS_DIR,
+                 poll_sec: float = RELOAD_POLL_SEC):
+        super().__init__((host, port), _Handler)
+        self.models_dir = models_dir
+        self.poll_sec = poll_sec
+        self.stats = LatencyStats()
+        self.stop_evt = threading.Event()
+        self.current: LoadedModel = self._load(latest(os.path.join(models_dir, "*_rf")))
+        self._warmup()
+        self.watcher = threading.Thread(target=self._watch_models, daemon=True)
+
+    def _load(self, model_dir: str) -> LoadedModel:
+        model, cols, _ = load_latest_model(model_dir)
+        print(f"[serve] Loaded model {model_dir} ({len(cols)} features)")
+        return LoadedModel(model, cols, model_dir)
+
+    def _warmup(self):
+        m = self.current
+        m.predict([{c: 0.0 for c in m.feature_cols}])
+
+    def _newest_complete(self) -> Optional[str]:
+        try:
+            d = latest(os.path.join(self.models_dir, "*_rf"))
+        except FileNotFoundError:
+            return None
+        return d if all(os.path.exists(os.path.join(d, f)) for f in MODEL_FILES) else None
+
+    def _watch_models(self):
+        rejected = None
+        while not self.stop_evt.wait(self.poll_sec):
+            d = self._newest_complete()
+            if d is None or d in (self.current.model_dir, rejected):
+                continue
+            try:
+                loaded = self._load(d)
+            except Exception as e:   # half-written or incompatible: keep serving the old one
+                print(f"[serve] Reload of {d} failed, keeping {self.current.model_dir}: {e}")
+                rejected = d
+                continue
+            self.current = loaded    # one reference swap; in-flight requests keep the old model
+            self._warmup()
+
+    def serve(self):
+        self.watcher.start()
+        print(f"[serve] Listening on http://{self.server_address[0]}:{self.server_address[1]}")
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_evt.set()
+            self.server_close()
+            print(f"[serve] Stopped. {json.dumps(self.stats.summary())}")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: no TCP handshake per request
+    disable_nagle_algorithm = True  # otherwise small responses wait on the client's delayed ACK
+    server: PredictionServer
+
+    def log_message(self, fmt, *args):   # no stderr line per request
+        pass
+
+    def _send(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"ok": True, "model": self.server.current.model_dir})
+        elif self.path == "/stats":
+            self._send(200, {"model": self.server.current.model_dir, **self.server.stats.summary()})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        if self.path != "/predict":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            single = isinstance(body, dict) and "rows" not in body
+            rows = [body] if single else (body["rows"] if isinstance(body, dict) else body)
+            if not isinstance(rows, list) or not rows:
+                raise ValueError("expected a feature row, a list of rows or {\"rows\": [...]}")
+            model = self.server.current
+            t1 = time.perf_counter()
+            scores = model.predict(rows)
+            t2 = time.perf_counter()
+        except (ValueError, KeyError, TypeError) as e:   # malformed request, not a server fault
+            with self.server.stats.lock:
+                self.server.stats.errors += 1
+            self._send(400, {"error": str(e)})
+            return
+        out = ({"score": float(scores[0])} if single else {"scores": scores.tolist()})
+        self._send(200, {**out, "model": model.model_dir})
+        self.server.stats.add(time.perf_counter() - t0, t2 - t1, len(rows))
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fatigue predictions from a resident model.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--poll", type=float, default=RELOAD_POLL_SEC, help="Seconds between checks for a new model")
+    args = parser.parse_args()
+    PredictionServer(args.host, args.port, args.models_dir, args.poll).serve()
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,31 @@
 # src/labeling/gui_scheduler.py
-import os, csv, time, signal
+import time, signal
 import tkinter as tk
 
-LABELS_CSV = "data/labels/labels.csv"
+from src.labeling.labelstore import open_store
+
 PROMPT_INTERVAL_MIN = 15      # how often to show the popup
 LABEL_SPAN_MIN      = 15      # label applies to last N minutes
 
-# ----------------- File Helpers -----------------
+# ----------------- Label Store -----------------
+_store = None
+
 def ensure_labels_file():
-    """Make sure labels.csv exists with correct header."""
-    if not os.path.exists(LABELS_CSV):
-        os.makedirs(os.path.dirname(LABELS_CSV), exist_ok=True)
-        with open(LABELS_CSV, "w", newline="") as f:
-            w = csv.writer(f)
-            w.writerow(["applies_from", "applies_to", "fatigue_score"])
+    """Open the label store (importing an existing labels.csv the first time)."""
+    global _store
+    if _store is None:
+        _store = open_store()
+    return _store
 
 def _save_label_range(t_from_ms: int, t_to_ms: int, score: float):
-    """Append one label row to labels.csv."""
-    with open(LABELS_CSV, "a", newline="") as f:
-        w = csv.writer(f)
-        w.writerow([t_from_ms, t_to_ms, float(score)])
+    """Append one label (committed before returning)."""
+    ensure_labels_file().append(t_from_ms, t_to_ms, float(score))
     print(f"[label] Saved: [{t_from_ms} → {t_to_ms}] score={score}")
 
 def _last_label_end_ms() -> int | None:
-    """Return the last applies_to timestamp from labels.csv (or None)."""
-    if not os.path.exists(LABELS_CSV):
-        return None
+    """Return the last applies_to timestamp (or None)."""
     try:
-        with open(LABELS_CSV, "r") as f:
-            rows = list(csv.reader(f))
-        if len(rows) <= 1:
-            return None
-        return int(float(rows[-1][1]))
+        return ensure_labels_file().last_end_ms()
     except Exception:
         return None
 
@@ -0,0 +1,179 @@
+# src/labeling/labelstore.py
+# Fatigue labels in an embedded SQLite file (data/labels/labels.sqlite) instead of
+# re-reading labels.csv everywhere.
+# - Indexed on applies_from / applies_to: tail and range lookups are O(log n)
+# - Each append is its own transaction (WAL, synchronous=FULL): a crash or kill of the
+#   Tk scheduler loses at most the label being written, never earlier ones
+# - Rows keep insertion order (id), which breaks applies_to ties in the dataset join
+# - An existing labels.csv is imported once, the first time the store is opened
+# - numpy / pandas load on first use: the Tk scheduler only appends and starts fast
+#
+#   python -m src.labeling.labelstore import [--csv data/labels/labels.csv]
+#   python -m src.labeling.labelstore export --csv out.csv
+#   python -m src.labeling.labelstore tail -n 5
+
+import os, sqlite3, argparse
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LABELS_DB  = "data/labels/labels.sqlite"
+LABELS_CSV = "data/labels/labels.csv"
+COLUMNS = ["applies_from", "applies_to", "fatigue_score"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    applies_from  INTEGER NOT NULL,
+    applies_to    INTEGER NOT NULL,
+    fatigue_score REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS labels_from ON labels(applies_from);
+CREATE INDEX IF NOT EXISTS labels_to   ON labels(applies_to);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+class LabelStore:
+    def __init__(self, path: str = LABELS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None)   # explicit transactions below
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    # -------- Writes --------
+    def append(self, t_from_ms: int, t_to_ms: int, score: float):
+        with self.conn:   # BEGIN … COMMIT (ROLLBACK on error)
+            self.conn.execute("BEGIN")
+            self.conn.execute("INSERT INTO labels (applies_from, applies_to, fatigue_score) VALUES (?, ?, ?)",
+                              (int(t_from_ms), int(t_to_ms), float(score)))
+
+    def append_frame(self, df: "pd.DataFrame"):
+        rows = zip(df["applies_from"].astype("int64").tolist(), df["applies_to"].astype("int64").tolist(),
+                   df["fatigue_score"].astype(float).tolist())
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT INTO labels (applies_from, applies_to, fatigue_score) VALUES (?, ?, ?)",
+                                  rows)
+
+    def fill_gaps(self) -> int:
+        """applies_from := previous label's applies_to, in applies_from order. Returns rows changed."""
+        import numpy as np
+        ids, frm, to = self._arrays("SELECT id, applies_from, applies_to FROM labels ORDER BY applies_from, id")
+        if len(ids) < 2:
+            return 0
+        new_from = frm.copy()
+        new_from[1:] = to[:-1]
+        changed = np.flatnonzero(new_from != frm)
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("UPDATE labels SET applies_from = ? WHERE id = ?",
+                                  zip(new_from[changed].tolist(), ids[changed].tolist()))
+        return len(changed)
+
+    # -------- Reads --------
+    def _arrays(self, sql: str, params=()):
+        import numpy as np
+        rows = self.conn.execute(sql, params).fetchall()
+        a = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        return a[:, 0], a[:, 1], a[:, 2]
+
+    def _frame(self, sql: str, params=()) -> "pd.DataFrame":
+        import pandas as pd
+        df = pd.DataFrame(self.conn.execute(sql, params).fetchall(), columns=COLUMNS)
+        return df.astype({"applies_from": "int64", "applies_to": "int64", "fatigue_score": float})
+
+    def last_end_ms(self) -> Optional[int]:
+        """applies_to of the most recently appended label (or None)."""
+        row = self.conn.execute("SELECT applies_to FROM labels ORDER BY id DESC LIMIT 1").fetchone()
+        return None if row is None else int(row[0])
+
+    def span(self) -> Optional[Tuple[int, int]]:
+        """(earliest applies_from, latest applies_to) over all labels, or None if there are none."""
+        row = self.conn.execute("SELECT MIN(applies_from), MAX(applies_to) FROM labels").fetchone()
+        return None if row is None or row[0] is None else (int(row[0]), int(row[1]))
+
+    def tail(self, n: int = 1) -> "pd.DataFrame":
+        """Last n labels in insertion order."""
+        return self._frame("SELECT applies_from, applies_to, fatigue_score FROM "
+                           "(SELECT * FROM labels ORDER BY id DESC LIMIT ?) ORDER BY id", (int(n),))
+
+    def range(self, t_from_ms: int, t_to_ms: int) -> "pd.DataFrame":
+        """Labels overlapping [t_from_ms, t_to_ms], in insertion order."""
+        return self._frame("SELECT applies_from, applies_to, fatigue_score FROM labels "
+                           "WHERE applies_to >= ? AND applies_from <= ? ORDER BY id",
+                           (int(t_from_ms), int(t_to_ms)))
+
+    def frame(self) -> "pd.DataFrame":
+        """All labels in insertion order (the row order labels.csv had)."""
+        return self._frame("SELECT applies_from, applies_to, fatigue_score FROM labels ORDER BY id")
+
+    # -------- CSV import / export --------
+    def import_csv(self, csv_path: str = LABELS_CSV, force: bool = False) -> int:
+        """Copy labels.csv into the store once (remembered in meta). Returns rows imported."""
+        key = f"imported:{os.path.abspath(csv_path)}"
+        if not force and self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        import pandas as pd
+        df = pd.read_csv(csv_path)
+        missing = set(COLUMNS) - set(df.columns)
+        if missing:
+            raise ValueError(f"{csv_path} missing columns: {missing}")
+        df = df.dropna(subset=COLUMNS)
+        rows = zip(df["applies_from"].astype("int64").tolist(), df["applies_to"].astype("int64").tolist(),
+                   df["fatigue_score"].astype(float).tolist())
+        with self.conn:   # rows and the meta marker commit together
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT INTO labels (applies_from, applies_to, fatigue_score) VALUES (?, ?, ?)",
+                                  rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(len(df))))
+        return len(df)
+
+    def export_csv(self, csv_path: str):
+        self.frame().to_csv(csv_path, index=False)
+
+def open_store(path: str = LABELS_DB, legacy_csv: str = LABELS_CSV) -> LabelStore:
+    """Open (creating if needed) the store; the first open imports an existing labels.csv."""
+    store = LabelStore(path)
+    if os.path.exists(legacy_csv):
+        n = store.import_csv(legacy_csv)
+        if n:
+            print(f"[labels] Imported {n} labels from {legacy_csv} → {path}")
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description="Label store maintenance.")
+    parser.add_argument("command", choices=["import", "export", "tail"])
+    parser.add_argument("--db", default=LABELS_DB)
+    parser.add_argument("--csv", default=LABELS_CSV)
+    parser.add_argument("-n", type=int, default=10, help="Rows for tail")
+    parser.add_argument("--force", action="store_true", help="import: even if this CSV was imported before")
+    args = parser.parse_args()
+
+    with LabelStore(args.db) as store:
+        if args.command == "import":
+            n = store.import_csv(args.csv, force=args.force)
+            print(f"[labels] Imported {n} labels from {args.csv} → {args.db}" if n else
+                  f"[labels] {args.csv} was already imported (use --force to import again)")
+        elif args.command == "export":
+            store.export_csv(args.csv)
+            print(f"[labels] Wrote {len(store)} labels → {args.csv}")
+        else:
+            print(store.tail(args.n).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
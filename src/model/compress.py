@@ -0,0 +1,116 @@
+# src/model/compress.py
+# Shrink the trained forest to fit latency / size budgets, measured for real:
+# - Depth caps: refit with max_depth ≤ the chosen params' (the chosen depth itself reuses
+#   the search's fit on the same rows when train.py passes it)
+# - Tree pruning: a forest's first k trees are exactly what n_estimators=k fits (same
+#   seeds in order), so each fit is scored at every k without refitting
+# - Distillation: a small, shallow forest fit to the full forest's predictions
+# Every candidate is scored on the held-out split: MAE, single-row latency through the
+# flattened forest (what the server and predict use), and forest.npz / model.joblib size.
+# The lowest-MAE candidate within both budgets wins (else the fastest one).
+
+import os, copy, time, tempfile
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import joblib
+
+from sklearn.metrics import mean_absolute_error
+
+from src.model.cv import make_model
+from src.model.export import flatten_forest
+
+TREE_COUNTS   = [300, 200, 100, 50, 25, 10]
+DEPTH_CAPS    = [None, 16, 12, 8]
+DISTILL       = [(25, 8), (10, 8), (10, 6)]   # (n_estimators, max_depth) of the student
+LATENCY_REPS  = 200
+
+def measure(model: Any, X_test: np.ndarray, y_test: np.ndarray, reps: int = LATENCY_REPS) -> Dict[str, Any]:
+    """Held-out MAE, single-row / batched latency of the flattened forest, artifact sizes."""
+    flat = flatten_forest(model)
+    X_test = np.ascontiguousarray(X_test, dtype=np.float32)
+    pred = flat.predict(X_test)
+    rows = X_test[np.arange(reps) % len(X_test)]
+    flat.predict(rows[:1])   # warm-up
+    lat = np.empty(reps)
+    for i in range(reps):
+        t = time.perf_counter()
+        flat.predict(rows[i:i + 1])
+        lat[i] = time.perf_counter() - t
+    t = time.perf_counter()
+    flat.predict(X_test)
+    batch_s = time.perf_counter() - t
+    with tempfile.TemporaryDirectory() as d:
+        flat.save(os.path.join(d, "forest.npz"))
+        joblib.dump(model, os.path.join(d, "model.joblib"))
+        sizes = {f: os.path.getsize(os.path.join(d, f)) for f in ("forest.npz", "model.joblib")}
+    return {"mae": float(mean_absolute_error(y_test, pred)),
+            "latency_ms_row": float(np.median(lat) * 1e3),
+            "latency_ms_row_p99": float(np.percentile(lat, 99) * 1e3),
+            "batch_ms_per_row": batch_s * 1e3 / len(X_test),
+            "size_bytes": sizes,
+            "n_trees": flat.n_trees, "n_nodes": flat.n_nodes, "max_depth": flat.max_depth}
+
+def _prefix(model: Any, k: int) -> Any:
+    m = copy.copy(model)
+    m.estimators_ = model.estimators_[:k]
+    m.n_estimators = k
+    return m
+
+def build(config: Dict[str, Any], params: Dict[str, Any], X: np.ndarray, y: np.ndarray,
+          teacher: Optional[Any] = None, n_jobs: int = -1) -> Any:
+    """Fit the model a compression config describes (teacher: the full forest, for distill)."""
+    if config["kind"] == "forest":
+        return make_model({**params, "n_estimators": config["n_estimators"],
+                           "max_depth": config["max_depth"]}, n_jobs).fit(X, y)
+    if teacher is None:
+        teacher = make_model(params, n_jobs).fit(X, y)
+    student = {**params, "n_estimators": config["n_estimators"], "max_depth": config["max_depth"]}
+    return make_model(student, n_jobs).fit(X, teacher.predict(X))
+
+def compress(params: Dict[str, Any], X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray,
+             y_test: np.ndarray, max_latency_ms: Optional[float] = None,
+             max_size_mb: Optional[float] = None, fitted: Optional[Any] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Score every candidate on the held-out split → (chosen config, report for metrics.json).
+    fitted: params already fit on X_train / y_train (the search's last fold); used as the
+    full-depth forest instead of fitting it again.
+    """
+    n_max = int(params.get("n_estimators", 100))
+    d_max = params.get("max_depth")
+    depths = [d_max] + [d for d in DEPTH_CAPS if d is not None and (d_max is None or d < d_max)]
+    counts = [k for k in TREE_COUNTS if k <= n_max] or [n_max]
+    if n_max not in counts:
+        counts.insert(0, n_max)
+
+    def fits(m: Dict[str, Any]) -> bool:
+        return ((max_latency_ms is None or m["latency_ms_row"] <= max_latency_ms) and
+                (max_size_mb is None or m["size_bytes"]["forest.npz"] <= max_size_mb * 1e6))
+
+    X_train = np.ascontiguousarray(X_train, dtype=np.float32)
+    cands: List[Dict[str, Any]] = []
+    teacher = None
+    for d in depths:
+        if d == d_max and fitted is not None:
+            full = fitted
+        else:
+            full = make_model({**params, "max_depth": d}, n_jobs=-1).fit(X_train, y_train)
+        if d == d_max:
+            teacher = full
+        for k in counts:
+            cands.append({"kind": "forest", "n_estimators": k, "max_depth": d,
+                          **measure(_prefix(full, k), X_test, y_test)})
+    if teacher is None:
+        teacher = make_model(params, n_jobs=-1).fit(X_train, y_train)
+    for k, d in DISTILL:
+        if k < n_max:
+            cfg = {"kind": "distill", "n_estimators": k, "max_depth": d}
+            cands.append({**cfg, **measure(build(cfg, params, X_train, y_train, teacher), X_test, y_test)})
+    for c in cands:
+        c["within_budget"] = fits(c)
+    ok = [c for c in cands if c["within_budget"]]
+    best = (min(ok, key=lambda c: (c["mae"], c["latency_ms_row"])) if ok
+            else min(cands, key=lambda c: c["latency_ms_row"]))
+    config = {k: best[k] for k in ("kind", "n_estimators", "max_depth")}
+    report = {"budgets": {"max_latency_ms": max_latency_ms, "max_size_mb": max_size_mb},
+              "met": bool(ok), "chosen": config, "candidates": cands}
+    return config, report
@@ -0,0 +1,187 @@
+# src/model/cv.py
+# Time-series cross-validation and hyperparameter search behind train.py.
+# - Folds are contiguous blocks in t_start order: walk-forward (train on everything
+#   before the test block) or blocked (train on all other blocks). Training windows
+#   within purge_ms of the test block are dropped: one label covers LABEL_SPAN_MIN of
+#   windows, so a neighbour of a test window would otherwise carry its label into training
+# - Every (candidate, fold) fit is one task on a process pool. X / y are converted once
+#   to contiguous float32 (what sklearn's trees work on internally) and memory-mapped by
+#   the workers, so nothing is pickled, copied or re-converted per task. Arrays that
+#   already are whole float32 memory maps (the training matrix) are attached as they are
+# - A wall-clock budget stops scheduling new fits (the ones running finish); candidates
+#   missing a fold are reported but not ranked
+# - With keep_fits, each candidate's last-fold fit is kept (dumped by the worker) and the
+#   winner's comes back as best_model: compression holds out the last fold too, so it
+#   reuses that forest instead of refitting it on the same rows
+
+import os, time, shutil, tempfile, itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import joblib
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+
+N_FOLDS     = 5
+PURGE_MS    = 15 * 60_000    # = LABEL_SPAN_MIN in the GUI scheduler
+BUDGET_SEC  = 600.0
+N_CANDIDATES = 12
+BASELINE    = {"n_estimators": 300}   # the model train.py always fitted before
+PARAM_GRID: Dict[str, List[Any]] = {
+    "n_estimators":     [100, 300],
+    "max_depth":        [None, 8, 16],
+    "min_samples_leaf": [1, 3, 10],
+    "max_features":     [1.0, 0.5, "sqrt"],
+}
+
+Ranges = List[Tuple[int, int]]
+
+def make_model(params: Dict[str, Any], n_jobs: int = 1) -> RandomForestRegressor:
+    return RandomForestRegressor(random_state=42, n_jobs=n_jobs, **params)
+
+def param_candidates(n: int = N_CANDIDATES, seed: int = 0) -> List[Dict[str, Any]]:
+    """BASELINE first, then up to n-1 distinct grid points in random order."""
+    grid = [dict(zip(PARAM_GRID, v)) for v in itertools.product(*PARAM_GRID.values())]
+    rng = np.random.default_rng(seed)
+    out = [dict(BASELINE)]
+    for i in rng.permutation(len(grid)).tolist():
+        if len(out) >= n:
+            break
+        full = {**make_model(grid[i]).get_params(), **grid[i]}
+        if any({**make_model(c).get_params(), **c} == full for c in out):
+            continue
+        out.append(grid[i])
+    return out
+
+# ----------------- Folds -----------------
+def time_folds(t_ms: np.ndarray, n_folds: int = N_FOLDS, purge_ms: int = PURGE_MS,
+               mode: str = "walk") -> List[Dict[str, Any]]:
+    """
+    Folds over rows sorted by t_ms as index ranges: {"train": [(lo, hi), ...], "test": (lo, hi)}.
+    walk: n_folds+1 equal blocks, fold k tests block k+1 and trains on blocks 0..k.
+    blocked: n_folds blocks, each tested once with every other block for training.
+    Training rows with t within purge_ms of the test block are purged either side.
+    """
+    n = len(t_ms)
+    n_blocks = n_folds + 1 if mode == "walk" else n_folds
+    edges = np.linspace(0, n, n_blocks + 1).round().astype(int)
+    folds = []
+    for b in range(1 if mode == "walk" else 0, n_blocks):
+        lo, hi = int(edges[b]), int(edges[b + 1])
+        if hi <= lo:
+            continue
+        before = int(np.searchsorted(t_ms, t_ms[lo] - purge_ms, side="left"))
+        train = [(0, before)] if before > 0 else []
+        if mode != "walk" and hi < n:
+            after = int(np.searchsorted(t_ms, t_ms[hi - 1] + purge_ms, side="right"))
+            if after < n:
+                train.append((after, n))
+        if sum(b - a for a, b in train) == 0:
+            continue
+        folds.append({"train": train, "test": (lo, hi)})
+    return folds
+
+def _take(a: np.ndarray, ranges: Ranges) -> np.ndarray:
+    # One range (every walk-forward fold) stays a view of the memory map
+    parts = [a[lo:hi] for lo, hi in ranges]
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+# ----------------- Workers -----------------
+_X: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+
+def _attach(x_path: str, y_path: str, shape: Tuple[int, int]):
+    global _X, _y
+    _X = np.memmap(x_path, dtype=np.float32, mode="r", shape=shape)
+    _y = np.memmap(y_path, dtype=np.float32, mode="r", shape=(shape[0],))
+
+def _mapped_file(a: np.ndarray) -> Optional[str]:
+    """The file `a` memory-maps whole, as C-ordered float32 (else None: it needs a copy)."""
+    if (isinstance(a, np.memmap) and a.dtype == np.float32 and a.flags.c_contiguous and a.filename
+            and a.offset == 0 and os.path.getsize(a.filename) == a.nbytes):
+        return a.filename
+    return None
+
+def _fit_fold(cand: int, fold: int, params: Dict[str, Any], train: Ranges, test: Tuple[int, int],
+              keep_path: Optional[str] = None) -> Dict[str, Any]:
+    Xtr, ytr = _take(_X, train), _take(_y, train)
+    Xte, yte = _X[test[0]:test[1]], _y[test[0]:test[1]]
+    t = time.perf_counter()
+    model = make_model(params).fit(Xtr, ytr)
+    fit_s = time.perf_counter() - t
+    if keep_path is not None:
+        joblib.dump(model, keep_path)
+    t = time.perf_counter()
+    pred = model.predict(Xte)
+    return {"candidate": cand, "fold": fold, "mae": float(mean_absolute_error(yte, pred)),
+            "fit_s": fit_s, "predict_s": time.perf_counter() - t,
+            "train_rows": len(ytr), "test_rows": len(yte)}
+
+# ----------------- Search -----------------
+def search(X: np.ndarray, y: np.ndarray, folds: List[Dict[str, Any]], candidates: List[Dict[str, Any]],
+           workers: Optional[int] = None, budget_s: float = BUDGET_SEC, keep_fits: bool = False) -> Dict[str, Any]:
+    """
+    Fit every candidate on every fold (rows of X / y already in time order) within
+    budget_s. Returns per-candidate fold results, the best candidate (lowest mean MAE
+    over all folds), its fit on the last fold (best_model, with keep_fits; else None) and
+    how the search went.
+    """
+    workers = workers or os.cpu_count() or 1
+    cache_dir = tempfile.mkdtemp(prefix="fatigue_cv_")
+    x_path, y_path = _mapped_file(X), _mapped_file(y)
+    if x_path is None:
+        x_path = os.path.join(cache_dir, "X.f32")
+        np.ascontiguousarray(X, dtype=np.float32).tofile(x_path)
+    if y_path is None:
+        y_path = os.path.join(cache_dir, "y.f32")
+        np.ascontiguousarray(y, dtype=np.float32).tofile(y_path)
+
+    t0 = time.monotonic()
+    deadline = t0 + budget_s
+    tasks = iter([(c, f) for c in range(len(candidates)) for f in range(len(folds))])   # candidate-major
+    keep = lambda c, f: os.path.join(cache_dir, f"model_{c}.joblib") if keep_fits and f == len(folds) - 1 else None
+    results: List[Dict[str, Any]] = []
+    stopped = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(x_path, y_path, X.shape)) as pool:
+            running = set()
+            while True:
+                while len(running) < workers and not stopped:   # one fit per worker: little to overrun
+                    if time.monotonic() >= deadline:
+                        stopped = True
+                        break
+                    nxt = next(tasks, None)
+                    if nxt is None:
+                        break
+                    c, f = nxt
+                    running.add(pool.submit(_fit_fold, c, f, candidates[c], folds[f]["train"], folds[f]["test"],
+                                           keep(c, f)))
+                if stopped:
+                    for fut in running:
+                        fut.cancel()   # only succeeds for fits that have not started
+                if not running:
+                    break
+                done, running = wait(running, timeout=None if stopped else max(deadline - time.monotonic(), 0.01),
+                                     return_when=FIRST_COMPLETED)
+                results.extend(fut.result() for fut in done if not fut.cancelled())
+            stopped = stopped or next(tasks, None) is not None
+
+        per_cand = []
+        for c, params in enumerate(candidates):
+            rs = sorted((r for r in results if r["candidate"] == c), key=lambda r: r["fold"])
+            maes = [r["mae"] for r in rs]
+            per_cand.append({"params": params, "complete": len(rs) == len(folds),
+                             "mae_mean": float(np.mean(maes)) if maes else None,
+                             "mae_std": float(np.std(maes)) if maes else None,
+                             "folds": [{k: r[k] for k in ("fold", "mae", "fit_s", "predict_s", "train_rows", "test_rows")}
+                                       for r in rs]})
+        ranked = [i for i in range(len(per_cand)) if per_cand[i]["complete"]]
+        best = min(ranked, key=lambda i: per_cand[i]["mae_mean"]) if ranked else None
+        best_model = joblib.load(keep(best, len(folds) - 1)) if keep_fits and best is not None else None
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return {"best": best, "best_model": best_model, "candidates": per_cand, "elapsed_s": time.monotonic() - t0,
+            "budget_s": budget_s, "stopped_by_budget": stopped, "workers": workers,
+            "fits_done": len(results), "fits_total": len(candidates) * len(folds)}
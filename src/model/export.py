@@ -0,0 +1,201 @@
+# src/model/export.py
+# Flattened tree-ensemble evaluator: every tree's nodes in shared NumPy arrays, all
+# trees walked one level per step ("lockstep") instead of one sklearn call per tree.
+# Predictions are identical to model.predict (same float32 split test, trees summed in
+# estimator order, then divided by their count).
+# - flatten_forest(model) builds it from a fitted RandomForestRegressor
+# - save() writes the arrays as one uncompressed forest.npz; load_flat() memory-maps
+#   them straight out of the zip: no sklearn import, no unpickling, and processes
+#   loading the same file share its pages
+#
+#   python -m src.model.export                       # newest models/*_rf → forest.npz (+ check)
+#   python -m src.model.export --model-dir models/<stamp>_rf --rows 5000
+
+import os, json, time, zipfile, argparse
+import numpy as np
+from typing import Any, Dict
+
+FOREST_NPZ = "forest.npz"
+FORMAT_VERSION = 1
+
+class FlatForest:
+    """
+    Step tables of all trees, node indices global. children holds (left, right) of node i
+    at 2i, 2i+1; a leaf's children are itself, so a finished tree just stays put.
+    threshold is float32: x <= threshold32 ⇔ x <= the float64 split threshold for float32 x.
+    """
+    def __init__(self, children: np.ndarray, feature: np.ndarray, threshold: np.ndarray,
+                 missing_left: np.ndarray, value: np.ndarray, roots: np.ndarray, max_depth: int, n_features: int):
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self._any_missing_left = bool(missing_left.any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.value)
+
+    def predict(self, X: Any) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)   # sklearn trees split on float32 inputs
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got {X.shape[1]}")
+        flat = X.ravel()
+        row_off = (np.arange(len(X), dtype=np.int64) * self.n_features)[None, :]
+        missing = self._any_missing_left and bool(np.isnan(flat).any())
+        node = np.repeat(np.asarray(self.roots)[:, None], len(X), axis=1)     # (trees, rows)
+        for step in range(self.max_depth):
+            x = flat[row_off + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            if missing:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            nxt = self.children[2 * node + go_right]
+            if step % 4 == 3 and np.array_equal(nxt, node):
+                break
+            node = nxt
+        # Sequential sum over trees in estimator order, as the forest accumulates them
+        return np.add.accumulate(self.value[node], axis=0)[-1] / self.n_trees
+
+    # -------- .npz file --------
+    def save(self, path: str):
+        """One uncompressed .npz (members stay contiguous, so load_flat can memory-map them)."""
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, children=self.children, feature=self.feature, threshold=self.threshold,
+                 missing_left=self.missing_left, value=self.value, roots=self.roots,
+                 meta=np.array(json.dumps({"version": FORMAT_VERSION, "max_depth": self.max_depth,
+                                           "n_features": self.n_features})))
+        os.replace(tmp, path)
+
+def _npz_members(path: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Arrays of an uncompressed .npz, memory-mapped in place (np.load cannot mmap a zip)."""
+    if not mmap:
+        with np.load(path) as z:
+            return {k: z[k] for k in z.files}
+    out: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {info.filename} is compressed; re-export with FlatForest.save")
+            f.seek(info.header_offset)
+            local = f.read(30)   # local file header: name / extra lengths at 26 and 28
+            f.seek(info.header_offset + 30 + int.from_bytes(local[26:28], "little")
+                   + int.from_bytes(local[28:30], "little"))
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, fortran, dtype = read_header(f)
+            if dtype.hasobject or not shape or 0 in shape:   # meta scalar: just read it
+                out[name] = np.lib.format.read_array(zf.open(info.filename))
+                continue
+            mm = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                           order="F" if fortran else "C")
+            out[name] = np.asarray(mm)   # plain ndarray view: gathers skip memmap's subclass overhead
+    return out
+
+def load_flat(path: str, mmap: bool = True) -> FlatForest:
+    a = _npz_members(path, mmap)
+    meta = json.loads(str(a["meta"]))
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"{path}: format version {meta['version']}, expected {FORMAT_VERSION}")
+    return FlatForest(a["children"], a["feature"], a["threshold"], a["missing_left"], a["value"], a["roots"],
+                      meta["max_depth"], meta["n_features"])
+
+def flatten_forest(model: Any) -> FlatForest:
+    """RandomForestRegressor / ExtraTreesRegressor (single output) → FlatForest."""
+    trees = [est.tree_ for est in getattr(model, "estimators_", [])]
+    if not trees:
+        raise ValueError("model has no fitted estimators_")
+    if any(t.n_outputs != 1 for t in trees):
+        raise ValueError("only single-output regressors are supported")
+    sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+    roots = np.r_[0, np.cumsum(sizes)[:-1]].astype(np.int64)
+
+    def children(a, base):
+        a = a.astype(np.int64)
+        return np.where(a < 0, -1, a + base)
+    left = np.concatenate([children(t.children_left, b) for t, b in zip(trees, roots)])
+    right = np.concatenate([children(t.children_right, b) for t, b in zip(trees, roots)])
+    feature = np.concatenate([t.feature for t in trees]).astype(np.int64)
+    threshold = np.concatenate([t.threshold for t in trees]).astype(np.float64)
+
+    idx = np.arange(len(feature), dtype=np.int64)
+    leaf = left < 0
+    # float32 x <= float64 t  ⇔  x <= (largest float32 not above t)
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return FlatForest(
+        children=np.stack([np.where(leaf, idx, left), np.where(leaf, idx, right)], axis=1).ravel(),
+        feature=np.where(leaf, 0, feature).astype(np.int64),
+        threshold=t32,
+        missing_left=np.concatenate([np.asarray(getattr(t, "missing_go_to_left", np.zeros(t.node_count)),
+                                                dtype=bool) for t in trees]),
+        value=np.concatenate([t.value[:, 0, 0] for t in trees]).astype(np.float64),
+        roots=roots,
+        max_depth=max(t.max_depth for t in trees),
+        n_features=model.n_features_in_,
+    )
+
+def export_model(model: Any, model_dir: str) -> str:
+    """Flatten a fitted forest into <model_dir>/forest.npz; returns the path."""
+    path = os.path.join(model_dir, FOREST_NPZ)
+    flatten_forest(model).save(path)
+    return path
+
+def check_identical(model: Any, flat: FlatForest, X: np.ndarray) -> bool:
+    """flat.predict(X) == model.predict(X) bit for bit (model scored single-threaded, in tree order)."""
+    n_jobs = getattr(model, "n_jobs", None)
+    model.n_jobs = 1     # threaded predict sums trees in completion order
+    try:
+        X = np.asarray(X, dtype=np.float32)
+        if hasattr(model, "feature_names_in_"):   # fitted on a DataFrame: score one too
+            import pandas as pd
+            X_model: Any = pd.DataFrame(X, columns=model.feature_names_in_)
+        else:
+            X_model = X
+        return bool(np.array_equal(flat.predict(X), model.predict(X_model)))
+    finally:
+        model.n_jobs = n_jobs
+
+def main():
+    import joblib
+    from src.inference.predict import MODELS_DIR, latest
+
+    parser = argparse.ArgumentParser(description="Export a trained forest to forest.npz and verify it.")
+    parser.add_argument("--model-dir", help="Default: newest models/*_rf")
+    parser.add_argument("--rows", type=int, default=2000, help="Random rows for the identity check (0: skip)")
+    args = parser.parse_args()
+
+    model_dir = args.model_dir or latest(os.path.join(MODELS_DIR, "*_rf"))
+    model = joblib.load(os.path.join(model_dir, "model.joblib"))
+    path = export_model(model, model_dir)
+    t = time.perf_counter()
+    flat = load_flat(path)
+    load_ms = (time.perf_counter() - t) * 1e3
+    print(f"[export] {flat.n_trees} trees, {flat.n_nodes:,} nodes → {path} "
+          f"({os.path.getsize(path) / 1e6:.1f} MB, loads in {load_ms:.1f} ms)")
+    if args.rows:
+        rng = np.random.default_rng(0)
+        # Rows around the split thresholds the forest actually uses, plus exact threshold hits
+        X = rng.normal(size=(args.rows, flat.n_features)) * 100
+        used = flat.threshold[flat.children[2 * np.arange(flat.n_nodes)] != np.arange(flat.n_nodes)]
+        if used.size:
+            X.flat[rng.integers(0, X.size, X.size // 2)] = rng.choice(used, X.size // 2)
+        ok = check_identical(model, flat, X)
+        print(f"[export] Predictions identical to model.predict on {args.rows} rows: {ok}")
+        if not ok:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
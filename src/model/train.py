@@ -1,36 +1,51 @@
-# Trains a quick baseline (RandomForestRegressor) and saves artifacts.
-import os, json
+# Trains a RandomForestRegressor and saves artifacts.
+# Hyperparameters are picked by time-series CV (src/model/cv.py: walk-forward folds with
+# a purge gap, fits spread over a process pool, wall-clock budget); the winner is refit
+# on all rows. Per-fold metrics and timings go into metrics.json.
+# With --max-latency-ms / --max-size-mb the forest is then compressed to fit
+# (src/model/compress.py). Either way metrics.json records the saved model's per-row
+# latency and artifact sizes next to its MAE.
+# The dataset is the memory-mapped training matrix (data/datasets/train/, see
+# src/features/trainmatrix.py) or train.csv, whichever datasetbuilder wrote last.
+# --trace: per-stage time / CPU / peak RSS / rows/s into data/logs/runs.ndjson (timeutils.py)
+import os, json, time, argparse
 from datetime import datetime, timezone
 
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error
 from sklearn.model_selection import train_test_split
 import joblib
 
+from src.model.export import export_model
+from src.features.computecore import FEATURE_VERSION
+from src.features.trainmatrix import TrainMatrix, TRAIN_MATRIX_DIR
+from src.utils.timeutils import stage, add_trace_args, start_run
+from src.model.compress import compress, build, measure
+from src.model.cv import (N_FOLDS, PURGE_MS, BUDGET_SEC, N_CANDIDATES, BASELINE,
+                          make_model, param_candidates, time_folds, search)
+
 DATASET_CSV = "data/datasets/train.csv"
 MODELS_DIR  = "models"
 
-EXCLUDE = {"window_id", "t_start", "t_end", "fatigue_score"}
+EXCLUDE = {"session", "window_id", "t_start", "t_end", "fatigue_score"}
 
 def iso_stamp():
     return datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%dT%H-%M-%S")
 
-def main():
-    if not os.path.exists(DATASET_CSV):
-        raise FileNotFoundError(f"{DATASET_CSV} not found. Build it first.")
-
-    df = pd.read_csv(DATASET_CSV)
-    if "fatigue_score" not in df.columns:
-        raise ValueError("train.csv must have a fatigue_score column.")
-
-    # Feature order = all numeric columns except the excluded + label
-    feature_cols = [c for c in df.columns if c not in EXCLUDE]
-    X = df[feature_cols]
-    y = df["fatigue_score"]
-
-    # Handle tiny datasets gracefully
-    if len(df) >= 10:
+def _dataset_source(path: str = None) -> str:
+    """--dataset, else the newer of the training matrix and train.csv."""
+    if path:
+        return path
+    found = [p for p in (os.path.join(TRAIN_MATRIX_DIR, "manifest.json"), DATASET_CSV) if os.path.exists(p)]
+    if not found:
+        raise FileNotFoundError(f"Neither {TRAIN_MATRIX_DIR}/ nor {DATASET_CSV} found. Build it first.")
+    newest = max(found, key=os.path.getmtime)
+    return os.path.dirname(newest) if newest.endswith("manifest.json") else newest
+
+def _holdout_mae(X: pd.DataFrame, y: pd.Series, params) -> float:
+    """Too few rows for CV folds: one unshuffled 80/20 split (or train = test when tiny)."""
+    if len(X) >= 10:
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, shuffle=False  # time-aware-ish: keep order
         )
@@ -38,35 +53,142 @@ def main():
         # With very few rows, just train on all and evaluate on the same (not ideal, OK for demo)
         X_train, y_train = X, y
         X_test,  y_test  = X, y
+    model = make_model(params, n_jobs=-1).fit(X_train, y_train)
+    return float(mean_absolute_error(y_test, model.predict(X_test)))
+
+def _holdout_ranges(n: int, folds):
+    """Held-out split for compression: the last CV fold, else the _holdout_mae split."""
+    if folds:
+        return folds[-1]["train"], folds[-1]["test"]
+    if n >= 10:
+        cut = n - max(1, int(round(n * 0.2)))
+        return [(0, cut)], (cut, n)
+    return [(0, n)], (0, n)
 
-    model = RandomForestRegressor(
-        n_estimators=300, random_state=42, n_jobs=-1
-    )
-    model.fit(X_train, y_train)
+def main():
+    parser = argparse.ArgumentParser(description="Train the fatigue model with time-series CV.")
+    parser.add_argument("--cv", choices=["walk", "blocked"], default="walk",
+                        help="walk-forward (train on the past only) or blocked folds")
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--purge-min", type=float, default=PURGE_MS / 60_000,
+                        help="Drop training windows this close to a test block (label span)")
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES, help="Hyperparameter sets to try")
+    parser.add_argument("--budget", type=float, default=BUDGET_SEC, help="Seconds for the search")
+    parser.add_argument("--workers", type=int, help="Processes (default: all cores)")
+    parser.add_argument("--max-latency-ms", type=float, help="Compress to this single-row latency (flattened forest)")
+    parser.add_argument("--max-size-mb", type=float, help="Compress to this forest.npz size")
+    parser.add_argument("--dataset", help=f"Training matrix directory or CSV (default: newer of {TRAIN_MATRIX_DIR}/ "
+                                          f"and {DATASET_CSV})")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_run("train", args)
+
+    source = _dataset_source(args.dataset)
+    with stage("read") as st:
+        if os.path.isdir(source):
+            # Memory-mapped: nothing parsed; X's pages are read as the fits touch them
+            tm = TrainMatrix(source)
+            feature_cols = tm.features
+            X32s, y32s, t_start = tm.X, tm.column("fatigue_score"), tm.column("t_start")
+            if not tm.sorted:   # folds need time order: the one case that loads X
+                order = np.argsort(t_start, kind="mergesort")
+                X32s, y32s, t_start = X32s[order], y32s[order], t_start[order]
+            df = pd.DataFrame({"t_start": t_start, "fatigue_score": y32s}, copy=False)
+            X = pd.DataFrame(X32s, columns=feature_cols, copy=False)
+        else:
+            df = pd.read_csv(source)
+            if "fatigue_score" not in df.columns:
+                raise ValueError("train.csv must have a fatigue_score column.")
+            if "t_start" in df.columns:
+                df = df.sort_values("t_start", kind="mergesort").reset_index(drop=True)
+            # Feature order = all numeric columns except the excluded + label
+            feature_cols = [c for c in df.columns if c not in EXCLUDE]
+            X = df[feature_cols]
+            X32s, y32s = X.to_numpy(dtype=np.float32), df["fatigue_score"].to_numpy(dtype=np.float32)
+        st.rows = len(df)
+    print(f"[train] Dataset: {source} ({len(df)} rows, {len(feature_cols)} features)")
+    y = df["fatigue_score"]
 
-    y_hat = model.predict(X_test)
-    mae = float(mean_absolute_error(y_test, y_hat))
+    folds = []
+    if "t_start" in df.columns and len(df) >= 10:
+        folds = time_folds(df["t_start"].to_numpy(dtype=np.int64), args.folds,
+                           int(args.purge_min * 60_000), args.cv)
+    metrics = {"rows": len(df), "feature_version": FEATURE_VERSION}
+    fitted = None   # the search's fit of params on the held-out split's training rows
+    if folds:
+        candidates = param_candidates(args.candidates)
+        print(f"[train] {len(candidates)} candidates x {len(folds)} {args.cv} folds, budget {args.budget:.0f}s")
+        with stage("search", rows=len(df)):   # fits run in worker processes: CPU here is only the parent's
+            res = search(X32s, y32s, folds, candidates, args.workers, args.budget,
+                         keep_fits=args.max_latency_ms is not None or args.max_size_mb is not None)
+        if res["best"] is None:   # budget ran out before any candidate finished every fold
+            params, mae = dict(BASELINE), None
+        else:
+            params, mae = candidates[res["best"]], res["candidates"][res["best"]]["mae_mean"]
+            fitted = res["best_model"]
+        metrics.update({
+            "mae": mae, "params": params,
+            "cv": {"mode": args.cv, "purge_ms": int(args.purge_min * 60_000),
+                   "folds": [{"fold": i, "train_rows": sum(b - a for a, b in f["train"]),
+                              "test_rows": f["test"][1] - f["test"][0],
+                              "test_from": int(df["t_start"].iloc[f["test"][0]]),
+                              "test_to": int(df["t_start"].iloc[f["test"][1] - 1])} for i, f in enumerate(folds)]},
+            "search": {k: res[k] for k in ("elapsed_s", "budget_s", "stopped_by_budget", "workers",
+                                           "fits_done", "fits_total")},
+            "candidates": res["candidates"],
+        })
+    else:
+        params = dict(BASELINE)
+        with stage("holdout", rows=len(df)):
+            mae = _holdout_mae(X, y, params)
+        metrics.update({"mae": mae, "params": params, "note": "Too few rows for CV folds → MAE may be optimistic"})
+
+    train_r, (lo, hi) = _holdout_ranges(len(df), folds)
+    X32 = X.to_numpy(dtype=np.float32)
+    X_test, y_test = X32[lo:hi], y.to_numpy()[lo:hi]
+    config = {"kind": "forest", "n_estimators": params.get("n_estimators", 100), "max_depth": params.get("max_depth")}
+    if args.max_latency_ms is not None or args.max_size_mb is not None:
+        tr = np.concatenate([np.arange(a, b) for a, b in train_r])
+        print(f"[train] Compressing: latency ≤ {args.max_latency_ms} ms/row, size ≤ {args.max_size_mb} MB")
+        with stage("compress", rows=len(tr)):
+            config, metrics["compression"] = compress(params, X32[tr], y.to_numpy()[tr], X_test, y_test,
+                                                      args.max_latency_ms, args.max_size_mb, fitted)
+        chosen = next(c for c in metrics["compression"]["candidates"]
+                      if all(c[k] == config[k] for k in config))
+        print(f"[train] Chosen {config}: held-out MAE {chosen['mae']:.3f}, "
+              f"{chosen['latency_ms_row']:.2f} ms/row, {chosen['size_bytes']['forest.npz'] / 1e6:.1f} MB"
+              + ("" if metrics["compression"]["met"] else " (no candidate met the budgets: fastest)"))
+
+    t = time.perf_counter()
+    with stage("fit", rows=len(df)):
+        model = build(config, params, X, y)
+    metrics["refit_s"] = time.perf_counter() - t
+    metrics["model"] = config
+    # Latency / size of what gets saved (its MAE here would be in-sample; see mae above)
+    with stage("measure", rows=len(X_test)):
+        m = measure(model, X_test, y_test)
+    metrics.update({k: m[k] for k in ("latency_ms_row", "latency_ms_row_p99", "batch_ms_per_row",
+                                      "size_bytes", "n_trees", "n_nodes", "max_depth")})
 
     # Save artifacts
     os.makedirs(MODELS_DIR, exist_ok=True)
     out_dir = os.path.join(MODELS_DIR, f"{iso_stamp()}_rf")
     os.makedirs(out_dir, exist_ok=True)
 
-    joblib.dump(model, os.path.join(out_dir, "model.joblib"))
+    with stage("save"):
+        joblib.dump(model, os.path.join(out_dir, "model.joblib"))
+        with open(os.path.join(out_dir, "features_used.json"), "w") as f:
+            json.dump(feature_cols, f, indent=2)
+        export_model(model, out_dir)   # forest.npz: sklearn-free, memory-mapped inference
 
-    with open(os.path.join(out_dir, "features_used.json"), "w") as f:
-        json.dump(feature_cols, f, indent=2)
-
-    with open(os.path.join(out_dir, "metrics.json"), "w") as f:
-        json.dump(
-            {"rows": len(df), "mae": mae, "note": "Tiny data → MAE may be optimistic"},
-            f,
-            indent=2,
-        )
+    with open(os.path.join(out_dir, "metrics.json"), "w") as f:   # last: marks the model dir complete
+        json.dump(metrics, f, indent=2)
 
     print(f"[train] Saved model to {out_dir}")
-    print(f"[train] Test MAE: {mae:.3f}")
+    print(f"[train] Params: {params}")
+    print(f"[train] {'CV' if folds else 'Test'} MAE: " + ("n/a (budget exhausted)" if mae is None else f"{mae:.3f}"))
+    print(f"[train] Latency {metrics['latency_ms_row']:.2f} ms/row, forest.npz {metrics['size_bytes']['forest.npz'] / 1e6:.1f} MB")
     print(f"[train] Features used ({len(feature_cols)}): {feature_cols}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,207 @@
+# src/utils/io.py
+# Compact fixed-width binary format for raw events (alternative to NDJSON).
+# File layout: 8-byte magic + JSON header padded to BIN_HEADER_SIZE, then packed
+# EVENT_DTYPE records appended in flush order. Event type is a small int, the
+# Backspace flag a bit, and btn/special strings are codes into the header's name
+# dictionary (rewritten in place when a new name shows up). Readers np.memmap the
+# record area directly, so nothing is parsed per event.
+
+import os, json, argparse
+import numpy as np
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+BIN_SUFFIX      = ".bin"
+BIN_MAGIC       = b"MFEVBIN1"
+BIN_HEADER_SIZE = 4096
+
+EVENT_DTYPE = np.dtype([
+    ("t", "<i8"),
+    ("x", "<f8"), ("y", "<f8"),
+    ("dx", "<f4"), ("dy", "<f4"),
+    ("type", "u1"), ("flags", "u1"), ("btn", "u1"), ("special", "u1"),
+])
+
+EVENT_TYPES: List[str] = ["key_down", "mouse_move", "mouse_click", "mouse_scroll"]  # code = index + 1
+TYPE_CODES: Dict[str, int] = {name: i + 1 for i, name in enumerate(EVENT_TYPES)}
+FLAG_BACKSPACE = 1
+MAX_NAMES   = 254       # name codes 1..254; 0 = absent
+OTHER_CODE  = 255       # dictionary (or the header holding it) full
+OTHER_NAME  = "<other>"
+
+# ----------------- Header -----------------
+def _header_meta(names: List[str]) -> bytes:
+    return json.dumps({"version": 1, "record_size": EVENT_DTYPE.itemsize,
+                       "types": EVENT_TYPES, "names": names}).encode("utf-8")
+
+def _header_fits(names: List[str]) -> bool:
+    return len(BIN_MAGIC) + len(_header_meta(names)) <= BIN_HEADER_SIZE
+
+def _write_header(f, names: List[str]):
+    meta = _header_meta(names)
+    if len(BIN_MAGIC) + len(meta) > BIN_HEADER_SIZE:
+        raise ValueError("binary header overflow")
+    f.seek(0)
+    f.write(BIN_MAGIC + meta.ljust(BIN_HEADER_SIZE - len(BIN_MAGIC), b" "))
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        raw = f.read(BIN_HEADER_SIZE)
+    if not raw.startswith(BIN_MAGIC):
+        raise ValueError(f"{path} is not a binary event file")
+    return json.loads(raw[len(BIN_MAGIC):].decode("utf-8"))
+
+def name_table(names: List[str]) -> np.ndarray:
+    """Object lookup table code → name (NaN for 0 / unused codes)."""
+    table = np.full(256, np.nan, dtype=object)
+    table[1:1 + len(names)] = names
+    table[OTHER_CODE] = OTHER_NAME
+    return table
+
+# ----------------- Encode / decode -----------------
+def _name_code(value: Any, names: List[str], index: Dict[str, int]) -> int:
+    if value is None:
+        return 0
+    s = str(value)
+    code = index.get(s)
+    if code is None:
+        # Full by count, or the name list would no longer fit in BIN_HEADER_SIZE
+        if len(names) >= MAX_NAMES or not _header_fits(names + [s]):
+            index[s] = OTHER_CODE   # don't re-measure the header for every repeat
+            return OTHER_CODE
+        names.append(s)
+        code = index[s] = len(names)
+    return code
+
+def encode_events(events: List[Dict[str, Any]], names: List[str]) -> np.ndarray:
+    """Pack event dicts into EVENT_DTYPE records; new btn/special names are appended to names."""
+    index = {s: i + 1 for i, s in enumerate(names)}
+    nan = float("nan")
+    cols: Dict[str, list] = {c: [] for c in EVENT_DTYPE.names}
+    for ev in events:
+        cols["t"].append(ev["t"])
+        for c in ("x", "y", "dx", "dy"):
+            v = ev.get(c)
+            cols[c].append(nan if v is None else v)
+        cols["type"].append(TYPE_CODES.get(ev.get("type"), 0))
+        cols["flags"].append(FLAG_BACKSPACE if ev.get("is_backspace") else 0)
+        cols["btn"].append(_name_code(ev.get("btn"), names, index))
+        cols["special"].append(_name_code(ev.get("special"), names, index))
+    rec = np.empty(len(events), dtype=EVENT_DTYPE)
+    for c, values in cols.items():
+        rec[c] = values
+    return rec
+
+def _num(v: float):
+    return int(v) if float(v).is_integer() else float(v)
+
+def decode_events(rec: np.ndarray, names: List[str]) -> Iterator[Dict[str, Any]]:
+    """Inverse of encode_events: event dicts with the keys EventLogger writes."""
+    table = name_table(names)
+    for r in rec.tolist():
+        t, x, y, dx, dy, typ, flags, btn, special = r
+        ev: Dict[str, Any] = {"t": t}
+        if typ:
+            ev["type"] = EVENT_TYPES[typ - 1]
+        if flags & FLAG_BACKSPACE:
+            ev["is_backspace"] = True
+        if special:
+            ev["special"] = table[special]
+        if btn:
+            ev["btn"] = table[btn]
+        for k, v in (("dx", dx), ("dy", dy), ("x", x), ("y", y)):
+            if v == v:  # not NaN
+                ev[k] = _num(v)
+        yield ev
+
+def remap_codes(codes: np.ndarray, local: List[str], names: List[str]) -> np.ndarray:
+    """Translate name codes into `local` to codes into `names` (extended as needed)."""
+    index = {s: i + 1 for i, s in enumerate(names)}
+    table = np.zeros(256, dtype=np.uint8)
+    table[OTHER_CODE] = OTHER_CODE
+    for i, s in enumerate(local):
+        table[i + 1] = _name_code(s, names, index)
+    return table[codes]
+
+# ----------------- Files -----------------
+def append_records(path: str, rec: np.ndarray, names: List[str]):
+    """Append EVENT_DTYPE records (btn/special coded against names), creating the file if needed."""
+    exists = os.path.exists(path) and os.path.getsize(path) >= BIN_HEADER_SIZE
+    file_names = read_header(path)["names"] if exists else []
+    n_before = len(file_names)
+    if names and len(rec):
+        rec = rec.copy()
+        rec["btn"] = remap_codes(rec["btn"], names, file_names)
+        rec["special"] = remap_codes(rec["special"], names, file_names)
+    with open(path, "r+b" if exists else "wb") as f:
+        if not exists or len(file_names) != n_before:
+            _write_header(f, file_names)
+        # A torn record at the end (a crashed write) would shift every record after it
+        size = f.seek(0, os.SEEK_END)
+        whole = BIN_HEADER_SIZE + max(0, size - BIN_HEADER_SIZE) // EVENT_DTYPE.itemsize * EVENT_DTYPE.itemsize
+        if size > whole:
+            f.truncate(whole)
+            f.seek(whole)
+        f.write(rec.tobytes())
+
+def append_binary(path: str, events: List[Dict[str, Any]]):
+    """Append event dicts to a binary event file, creating it (with header) if needed."""
+    names: List[str] = []
+    append_records(path, encode_events(events, names), names)
+
+def open_binary(path: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Memory-map the records of a binary event file → (records, header)."""
+    header = read_header(path)
+    n = (os.path.getsize(path) - BIN_HEADER_SIZE) // EVENT_DTYPE.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=EVENT_DTYPE), header
+    rec = np.memmap(path, dtype=EVENT_DTYPE, mode="r", offset=BIN_HEADER_SIZE, shape=(n,))
+    return rec, header
+
+def _ndjson_lines(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if s:
+                yield json.loads(s)
+
+def ndjson_to_binary(src: str, dst: str, chunk_events: int = 100_000) -> int:
+    """Convert an NDJSON raw log to the binary format; returns the event count."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    batch: List[Dict[str, Any]] = []
+    total = 0
+    for ev in _ndjson_lines(src):
+        batch.append(ev)
+        if len(batch) >= chunk_events:
+            append_binary(dst, batch); total += len(batch); batch = []
+    if batch or not total:
+        append_binary(dst, batch); total += len(batch)
+    return total
+
+def binary_to_ndjson(src: str, dst: str, chunk_events: int = 100_000) -> int:
+    """Convert a binary raw log back to NDJSON; returns the event count."""
+    rec, header = open_binary(src)
+    with open(dst, "w", encoding="utf-8") as f:
+        for i in range(0, len(rec), chunk_events):
+            for ev in decode_events(rec[i:i + chunk_events], header["names"]):
+                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    return len(rec)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert raw event logs between NDJSON and binary.")
+    parser.add_argument("direction", choices=["to-bin", "to-ndjson"])
+    parser.add_argument("files", nargs="+", help="Raw logs to convert (written next to the source)")
+    args = parser.parse_args()
+
+    for src in args.files:
+        stem = os.path.splitext(src)[0]
+        if args.direction == "to-bin":
+            dst = stem + BIN_SUFFIX
+            n = ndjson_to_binary(src, dst)
+        else:
+            dst = stem + ".ndjson"
+            n = binary_to_ndjson(src, dst)
+        print(f"[io] {src} → {dst} ({n} events)")
+
+if __name__ == "__main__":
+    main()
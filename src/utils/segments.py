@@ -0,0 +1,166 @@
+# src/utils/segments.py
+# Segmented raw logs: one capture session as a directory of NDJSON segments plus a
+# sidecar index, instead of one ever-growing events_<stamp>.ndjson.
+#   data/raw/events_<stamp>/
+#     seg_000000.ndjson.gz   closed, compressed in the background
+#     seg_000001.ndjson      active: one buffered handle, one write() per batch
+#     index.json             per segment: file, t_min / t_max, events, bytes (uncompressed)
+# - A segment is closed once it passes max_bytes or max_sec; the next batch opens a new one
+# - A batch counts as committed when index.json (rewritten atomically) includes it:
+#   readers only read each segment up to its indexed bytes
+# - Compression writes seg_*.ndjson.gz next to the segment, points the index at it,
+#   then deletes the original; open_raw() follows a segment that moved in between
+# - covering_segments(dir, t_from, t_to) lists only the segments whose time range overlaps
+#   (windowing.read_raw_range uses it to read an interval without the rest)
+
+import os, gzip, lzma, json, queue, shutil, threading, time
+from typing import Any, BinaryIO, Dict, List, Optional
+
+SEGMENT_INDEX     = "index.json"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_MAX_SEC   = 3600
+WRITE_BUFFER      = 1 << 20
+COMPRESSORS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open)}
+COMPRESS_MODES = ("gzip", "lzma", "none")
+
+def open_raw(path: str) -> BinaryIO:
+    """Open a raw NDJSON file / segment for binary reading, decompressing .gz / .xz."""
+    for suffix, opener in COMPRESSORS.values():
+        if path.endswith(suffix):
+            return opener(path, "rb")
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        for suffix, opener in COMPRESSORS.values():   # compressed since the index was read
+            if os.path.exists(path + suffix):
+                return opener(path + suffix, "rb")
+        raise
+
+def is_segmented(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, SEGMENT_INDEX))
+
+def load_index(session_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(session_dir, SEGMENT_INDEX), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def covering_segments(session_dir: str, t_from: Optional[int] = None, t_to: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Index entries (with absolute "path") of the segments overlapping [t_from, t_to), in order."""
+    out = []
+    for e in load_index(session_dir)["segments"]:
+        if not e["events"]:
+            continue
+        if (t_to is not None and e["t_min"] >= t_to) or (t_from is not None and e["t_max"] < t_from):
+            continue
+        out.append({**e, "path": os.path.join(session_dir, e["file"])})
+    return out
+
+class SegmentWriter:
+    """Group-commit writer for one session directory (writer thread only, plus its compressor)."""
+    def __init__(self, session_dir: str, max_bytes: Optional[int] = SEGMENT_MAX_BYTES,
+                 max_sec: Optional[float] = SEGMENT_MAX_SEC, compress: str = "gzip", fsync: bool = False):
+        if compress not in COMPRESS_MODES:
+            raise ValueError(f"compress must be one of {COMPRESS_MODES}")
+        self.dir = session_dir
+        self.max_bytes = max_bytes
+        self.max_sec = max_sec
+        self.compress = compress
+        self.fsync = fsync
+        self.lock = threading.Lock()        # index entries: writer vs compressor
+        os.makedirs(session_dir, exist_ok=True)
+        self.segments: List[Dict[str, Any]] = (load_index(session_dir)["segments"]
+                                               if is_segmented(session_dir) else [])
+        self._fh: Optional[BinaryIO] = None
+        self._opened_at = 0.0
+        self._queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._compressor = threading.Thread(target=self._compress_loop, daemon=True)
+        self._compressor.start()
+        for i, e in enumerate(self.segments):   # a previous run's segments: close and compress them
+            e["closed"] = True
+            if self.compress != "none" and e["file"].endswith(".ndjson"):
+                self._queue.put(i)
+
+    # -------- Writing --------
+    def _open_segment(self):
+        name = f"seg_{len(self.segments):06d}.ndjson"
+        self._fh = open(os.path.join(self.dir, name), "ab", buffering=WRITE_BUFFER)
+        self._opened_at = time.monotonic()
+        with self.lock:
+            self.segments.append({"file": name, "t_min": None, "t_max": None, "events": 0,
+                                  "bytes": 0, "closed": False})
+
+    def _due(self, extra: int) -> bool:
+        cur = self.segments[-1]
+        if not cur["bytes"]:
+            return False
+        return ((self.max_bytes is not None and cur["bytes"] + extra > self.max_bytes) or
+                (self.max_sec is not None and time.monotonic() - self._opened_at >= self.max_sec))
+
+    def write_batch(self, data: bytes, t_min: int, t_max: int, events: int) -> int:
+        """Append one batch of NDJSON lines with a single write; returns bytes written."""
+        if self._fh is not None and self._due(len(data)):
+            self.rotate()
+        if self._fh is None:
+            self._open_segment()
+        self._fh.write(data)
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        with self.lock:
+            cur = self.segments[-1]
+            cur["t_min"] = t_min if cur["t_min"] is None else min(cur["t_min"], t_min)
+            cur["t_max"] = t_max if cur["t_max"] is None else max(cur["t_max"], t_max)
+            cur["events"] += events
+            cur["bytes"] += len(data)
+            self._save_index()
+        return len(data)
+
+    def rotate(self):
+        """Close the active segment and queue it for compression."""
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        with self.lock:
+            self.segments[-1]["closed"] = True
+            self._save_index()
+        if self.compress != "none":
+            self._queue.put(len(self.segments) - 1)
+
+    def close(self, wait: bool = True):
+        self.rotate()
+        self._queue.put(None)
+        if wait:
+            self._compressor.join()
+
+    def _save_index(self):
+        # caller holds self.lock
+        path = os.path.join(self.dir, SEGMENT_INDEX)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "format": "ndjson", "segments": self.segments}, f)
+        os.replace(tmp, path)
+
+    # -------- Background compression --------
+    def _compress_loop(self):
+        while True:
+            i = self._queue.get()
+            if i is None:
+                return
+            try:
+                self._compress_segment(i)
+            except OSError as e:   # disk full etc.: the segment stays uncompressed and readable
+                print(f"[segments] Compressing {self.segments[i]['file']} failed: {e}")
+
+    def _compress_segment(self, i: int):
+        suffix, opener = COMPRESSORS[self.compress]
+        src = os.path.join(self.dir, self.segments[i]["file"])
+        dst = src + suffix
+        tmp = dst + ".tmp"
+        with open(src, "rb") as fin, opener(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, WRITE_BUFFER)
+        os.replace(tmp, dst)
+        with self.lock:
+            self.segments[i]["file"] += suffix
+            self.segments[i]["compressed_bytes"] = os.path.getsize(dst)
+            self._save_index()
+        os.remove(src)
@@ -0,0 +1,275 @@
+# src/utils/timeutils.py
+# Per-stage instrumentation for the pipeline scripts (make_features, datasetbuilder,
+# train, predict). Off unless a run is started with --trace (or FATIGUE_TRACE=1): stage()
+# then returns one shared no-op context and timed_iter() the iterable itself, so the
+# instrumented code costs a with statement per stage.
+# When on, each stage accumulates over its calls:
+# - wall time, CPU time (this process; pool workers are not counted) and rows/s
+# - peak RSS while it ran (Linux: high-water mark reset at stage entry; elsewhere the
+#   process peak so far)
+# and the run is appended as one JSON line to data/logs/runs.ndjson.
+# --profile STAGE runs that stage under cProfile (→ data/logs/<run>_<stage>.prof, top
+# functions printed); --profiler sample instead samples the main thread's stack every
+# SAMPLE_MS into collapsed-stack lines (flamegraph.pl / speedscope input).
+#
+#   python -m src.features.make_features --trace
+#   python -m src.model.train --trace --profile fit
+#   python -m src.model.train --trace --profile fit --profiler sample
+
+import os, sys, json, time, atexit, argparse, threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+LOG_DIR  = "data/logs"
+RUNS_LOG = os.path.join(LOG_DIR, "runs.ndjson")
+SAMPLE_MS = 5
+PROFILE_TOP = 25
+
+# ----------------- Peak RSS -----------------
+_CLEAR_REFS = "/proc/self/clear_refs"
+_STATUS     = "/proc/self/status"
+
+def _hwm_mb() -> Optional[float]:
+    """Peak resident set size in MB (since the last _reset_hwm where supported)."""
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024   # bytes on macOS, KB elsewhere
+
+def _reset_hwm() -> bool:
+    try:
+        with open(_CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+# ----------------- Profilers -----------------
+class _Sampler:
+    """Samples the stack of the thread that started it; counts collapsed stacks."""
+    def __init__(self, interval_ms: float = SAMPLE_MS):
+        self.interval = interval_ms / 1e3
+        self.counts: Counter = Counter()
+        self._ident = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+# ----------------- Stages -----------------
+class _NullStage:
+    """What stage() returns when tracing is off: accepts and ignores everything."""
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __setattr__(self, name, value):
+        pass
+
+_NULL = _NullStage()
+
+class Stage:
+    """One named stage of a run; re-entering it adds to its totals."""
+    def __init__(self, run: "Run", name: str):
+        self.run = run
+        self.name = name
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.total_rows: Optional[int] = None
+        self.rss_peak_mb: Optional[float] = None
+        self.rows: Optional[int] = None   # set inside the with block (or via stage(..., rows=))
+        self._profiler: Any = None
+
+    def _peak(self, mb: Optional[float]):
+        if mb is not None:
+            self.rss_peak_mb = mb if self.rss_peak_mb is None else max(self.rss_peak_mb, mb)
+
+    def __enter__(self):
+        run = self.run
+        if run.stack:   # the enclosing stage keeps its peak so far before the mark is reset
+            run.stack[-1]._peak(_hwm_mb())
+        run.stack.append(self)
+        run.hwm_reset = _reset_hwm()
+        if run.profile == self.name and self._profiler is None:
+            if run.profiler == "sample":
+                self._profiler = _Sampler()
+                self._profiler.start()
+            else:
+                import cProfile
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s += time.perf_counter() - self._wall0
+        self.cpu_s += time.process_time() - self._cpu0
+        self.calls += 1
+        if self.rows is not None:
+            self.total_rows = (self.total_rows or 0) + int(self.rows)
+            self.rows = None
+        run = self.run
+        if self._profiler is not None:
+            self._stop_profiler()
+        self._peak(_hwm_mb())
+        run.stack.pop()
+        if run.stack:
+            run.stack[-1]._peak(self.rss_peak_mb)
+        return False
+
+    def _stop_profiler(self):
+        prof, self._profiler = self._profiler, None
+        os.makedirs(LOG_DIR, exist_ok=True)
+        base = os.path.join(LOG_DIR, f"{self.run.run_id}_{self.name}")
+        if isinstance(prof, _Sampler):
+            prof.stop()
+            path = base + ".samples.txt"
+            prof.dump(path)
+            print(f"[trace] {sum(prof.counts.values())} samples of '{self.name}' → {path}")
+        else:
+            import io, pstats
+            prof.disable()
+            path = base + ".prof"
+            prof.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            print(out.getvalue())
+            print(f"[trace] cProfile of '{self.name}' → {path} (python -m pstats {path})")
+        self.run.profile_paths.append(path)
+
+    def record(self) -> Dict[str, Any]:
+        return {"stage": self.name, "calls": self.calls, "wall_s": self.wall_s, "cpu_s": self.cpu_s,
+                "rows": self.total_rows,
+                "rows_per_s": self.total_rows / self.wall_s if self.total_rows and self.wall_s > 0 else None,
+                "rss_peak_mb": self.rss_peak_mb, **({"open": True} if self in self.run.stack else {})}
+
+class Run:
+    def __init__(self, name: str, profile: Optional[str] = None, profiler: str = "cprofile",
+                 log_path: str = RUNS_LOG):
+        self.name = name
+        self.run_id = f"{datetime.now(timezone.utc).astimezone().strftime('%Y-%m-%dT%H-%M-%S')}_{name}"
+        self.profile = profile
+        self.profiler = profiler
+        self.log_path = log_path
+        self.stages: Dict[str, Stage] = {}
+        self.stack: List[Stage] = []
+        self.profile_paths: List[str] = []
+        self.hwm_reset = False
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._started = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+    def stage(self, name: str) -> Stage:
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = Stage(self, name)
+        return st
+
+    def finish(self) -> Dict[str, Any]:
+        for st in list(self.stack):   # still open: the run is ending on an exception / exit
+            if st._profiler is not None:
+                st._stop_profiler()
+        rec = {"run": self.run_id, "script": self.name, "argv": sys.argv[1:], "pid": os.getpid(),
+               "started": self._started, "wall_s": time.perf_counter() - self._wall0,
+               "cpu_s": time.process_time() - self._cpu0,
+               "rss_peak_scope": "stage" if self.hwm_reset else "process",
+               "stages": [st.record() for st in self.stages.values()],
+               "profiles": self.profile_paths}
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:   # one line per run
+            f.write(json.dumps(rec) + "\n")
+        for s in rec["stages"]:
+            rate = f", {s['rows_per_s']:,.0f} rows/s" if s["rows_per_s"] else ""
+            rss = f", peak RSS {s['rss_peak_mb']:.0f} MB" if s["rss_peak_mb"] is not None else ""
+            print(f"[trace] {s['stage']:12s} {s['wall_s'] * 1e3:9.1f} ms wall, {s['cpu_s'] * 1e3:9.1f} ms CPU"
+                  f"{rate}{rss}")
+        print(f"[trace] Run log → {self.log_path}")
+        return rec
+
+_run: Optional[Run] = None
+
+def stage(name: str, rows: Optional[int] = None):
+    """`with stage("compute", rows=len(df)):` (or set `.rows` inside the block). No-op unless tracing."""
+    if _run is None:
+        return _NULL
+    st = _run.stage(name)
+    st.rows = rows
+    return st
+
+def timed_iter(it: Iterable[Any], name: str) -> Iterator[Any]:
+    """Charge the time spent producing each item of `it` to stage `name` (its rows: len(item))."""
+    if _run is None:
+        return iter(it)
+    return _timed(iter(it), _run.stage(name))
+
+def _timed(it: Iterator[Any], st: Stage) -> Iterator[Any]:
+    while True:
+        with st:
+            item = next(it, _END)
+            if item is not _END and hasattr(item, "__len__"):
+                st.rows = len(item)
+        if item is _END:
+            return
+        yield item
+
+_END = object()
+
+def tracing() -> bool:
+    return _run is not None
+
+# ----------------- Runs -----------------
+def add_trace_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--trace", action="store_true",
+                        help=f"Record per-stage time / CPU / peak RSS / rows/s to {RUNS_LOG}")
+    parser.add_argument("--profile", metavar="STAGE", help="Profile one stage (implies --trace)")
+    parser.add_argument("--profiler", choices=["cprofile", "sample"], default="cprofile")
+
+def start_run(name: str, args: Optional[argparse.Namespace] = None) -> Optional[Run]:
+    """Start tracing if --trace / --profile (or FATIGUE_TRACE=1); the log is written at exit."""
+    global _run
+    profile = getattr(args, "profile", None) or os.environ.get("FATIGUE_PROFILE") or None
+    enabled = bool(getattr(args, "trace", False) or profile or os.environ.get("FATIGUE_TRACE", "") not in ("", "0"))
+    if not enabled or _run is not None:
+        return _run
+    _run = Run(name, profile, getattr(args, "profiler", None) or os.environ.get("FATIGUE_PROFILER", "cprofile"))
+    atexit.register(end_run)
+    return _run
+
+def end_run() -> Optional[Dict[str, Any]]:
+    global _run
+    run, _run = _run, None
+    return run.finish() if run is not None else None